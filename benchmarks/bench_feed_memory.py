@@ -0,0 +1,81 @@
+"""
+Memory benchmark: buffered vs streaming parsing of the NAV feed.
+
+The feed is served from memory through an httpx mock transport in 64 KiB
+chunks, so only parsing and indexing are measured. Run from the project root:
+
+    python -m benchmarks.bench_feed_memory --sizes 10000 40000 80000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+import httpx
+import src.investment.utils as investment_utils
+from benchmarks.bench_nav_index import make_payload
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_client(body: bytes) -> httpx.AsyncClient:
+    async def chunks():
+        for start in range(0, len(body), CHUNK_SIZE):
+            yield body[start:start + CHUNK_SIZE]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=chunks(), headers={"Content-Type": "application/json"})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def measure(body: bytes, streaming: bool) -> tuple:
+    client = make_client(body)
+    investment_utils.get_http_client = lambda: client
+
+    gc.collect()
+    tracemalloc.start()
+    snapshot = await investment_utils.get_nav_snapshot(streaming=streaming)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await client.aclose()
+    return peak, len(snapshot.index)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 40000, 80000])
+    args = parser.parse_args()
+
+    print(f"{'schemes':>8} {'body MiB':>9} {'buffered MiB':>13} {'streaming MiB':>14} {'stream overhead MiB':>20}")
+
+    for size in args.sizes:
+        body = json.dumps(make_payload(size)).encode("utf-8")
+
+        buffered_peak, _ = await measure(body, streaming=False)
+        streaming_peak, count = await measure(body, streaming=True)
+
+        # the index itself grows with the feed, the difference is the parsing overhead on top of it
+        index_only = await index_size(body)
+
+        print(
+            f"{count:>8} {len(body) / 2 ** 20:>9.2f} {buffered_peak / 2 ** 20:>13.2f} "
+            f"{streaming_peak / 2 ** 20:>14.2f} {(streaming_peak - index_only) / 2 ** 20:>20.2f}"
+        )
+
+
+# memory held by the finished index alone
+async def index_size(body: bytes) -> int:
+    data = json.loads(body)
+    gc.collect()
+    tracemalloc.start()
+    index = investment_utils.NavIndex.from_payload(json.loads(body))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data, index
+    return current
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark: FundSearchIndex build, incremental refresh and query latency.
+
+Run from the project root (needs the same .env as the app):
+
+    python -m benchmarks.bench_fund_search --schemes 40000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from src.investment.nav_index import NavIndex
+from src.investment.search import FundSearchIndex
+
+data_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "data.json")
+
+QUERIES = ["hdfc", "hdfc flexi", "axis bluechip dir", "sbi sm", "icici pru", "nippon india gr",
+           "liquid", "aditya birla sun life bank", "kotak eq", "mirae asset large"]
+
+
+# real scheme names from data.json, repeated with a series suffix until the feed is large enough
+def make_payload(scheme_count: int) -> list:
+    with open(data_file, "r", encoding="utf-8") as file:
+        base = json.load(file)
+
+    return [
+        {
+            **base[code % len(base)],
+            "Scheme_Code": 100000 + code,
+            "Scheme_Name": base[code % len(base)]["Scheme_Name"] + (f" Series {code // len(base)}" if code >= len(base) else "")
+        }
+        for code in range(scheme_count)
+    ]
+
+
+def measure(search_index: FundSearchIndex, queries: list, rounds: int) -> list:
+    timings = []
+
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            search_index.search(query, 10)
+            timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def report(label: str, timings: list) -> None:
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1e6
+    p99 = timings[int(len(timings) * 0.99) - 1] * 1e6
+    print(f"{label:28s} p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--renamed", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = make_payload(args.schemes)
+    index = NavIndex.from_payload(payload)
+
+    start = time.perf_counter()
+    search_index = FundSearchIndex.from_nav_index(index)
+    build_seconds = time.perf_counter() - start
+
+    # a refresh where only navs moved, then one where some schemes were renamed
+    navs_only = NavIndex.from_payload([{**item, "Net_Asset_Value": item["Net_Asset_Value"] + 1} for item in payload])
+    start = time.perf_counter()
+    search_index.apply(search_index.diff(navs_only), navs_only.version)
+    nav_refresh_seconds = time.perf_counter() - start
+
+    renamed_codes = set(random.sample(range(args.schemes), args.renamed))
+    renamed = NavIndex.from_payload([
+        {**item, "Scheme_Name": item["Scheme_Name"] + " (Renamed)"} if position in renamed_codes else item
+        for position, item in enumerate(payload)
+    ])
+    start = time.perf_counter()
+    changes = search_index.diff(renamed)
+    search_index.apply(changes, renamed.version)
+    rename_refresh_seconds = time.perf_counter() - start
+
+    # unique queries miss the result cache, the trie prefix unions are warm after the first round
+    typed = [query[:length] for query in QUERIES for length in range(2, len(query) + 1)]
+    cold = measure(search_index, typed, 1)
+    search_index._results.clear()
+    warm_uncached = []
+    for _ in range(args.rounds // 10):
+        search_index._results.clear()
+        warm_uncached.extend(measure(search_index, typed, 1))
+    cached = measure(search_index, typed, args.rounds)
+
+    print(f"schemes={args.schemes} tokens={len(search_index._postings)} queries={len(typed)}")
+    print(f"full build:                 {build_seconds * 1000:10.1f} ms")
+    print(f"refresh, navs only:         {nav_refresh_seconds * 1000:10.1f} ms  (0 schemes reindexed)")
+    print(f"refresh, {args.renamed} renamed:        {rename_refresh_seconds * 1000:10.1f} ms  ({len(changes)} schemes reindexed)")
+    report("first query per prefix", cold)
+    report("result cache miss", warm_uncached)
+    report("result cache hit", cached)
+
+
+if __name__ == "__main__":
+    main()
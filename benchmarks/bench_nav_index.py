@@ -0,0 +1,58 @@
+"""
+Micro-benchmark: NavIndex lookups vs the old linear find_scheme_code scan.
+
+Run from the project root (needs the same .env as the app):
+
+    python -m benchmarks.bench_nav_index --schemes 40000 --lookups 2000
+"""
+import argparse
+import random
+import timeit
+from src.investment.nav_index import NavIndex
+
+
+# build a synthetic feed shaped like the RapidAPI response
+def make_payload(scheme_count: int) -> list:
+    return [
+        {
+            "Scheme_Code": 100000 + code,
+            "Scheme_Name": f"Scheme {code}",
+            "Net_Asset_Value": round(random.uniform(10, 500), 4),
+            "Date": "24-Feb-2025",
+            "Mutual_Fund_Family": f"Family {code % 50}"
+        }
+        for code in range(scheme_count)
+    ]
+
+
+# the lookup used before NavIndex existed
+def linear_scan(scheme_code, data):
+    return next((scheme for scheme in data if scheme["Scheme_Code"] == scheme_code), None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    payload = make_payload(args.schemes)
+    codes = [random.choice(payload)["Scheme_Code"] for _ in range(args.lookups)]
+
+    build_seconds = timeit.timeit(lambda: NavIndex.from_payload(payload), number=5) / 5
+    index = NavIndex.from_payload(payload)
+
+    scan_seconds = timeit.timeit(lambda: [linear_scan(code, payload) for code in codes], number=1)
+    single_seconds = min(timeit.repeat(lambda: [index.get(code) for code in codes], number=10, repeat=3)) / 10
+    batch_seconds = min(timeit.repeat(lambda: index.get_many(codes), number=10, repeat=3)) / 10
+
+    print(f"schemes={args.schemes} lookups={args.lookups}")
+    print(f"index build:       {build_seconds * 1000:10.3f} ms")
+    print(f"linear scan:       {scan_seconds * 1000:10.3f} ms  ({scan_seconds / args.lookups * 1e6:.2f} us/lookup)")
+    print(f"NavIndex.get:      {single_seconds * 1000:10.3f} ms  ({single_seconds / args.lookups * 1e6:.3f} us/lookup)")
+    print(f"NavIndex.get_many: {batch_seconds * 1000:10.3f} ms  ({batch_seconds / args.lookups * 1e6:.3f} us/lookup)")
+    print(f"speedup (get):     {scan_seconds / single_seconds:10.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+End-to-end benchmark: full NAV revaluation runs against the fake provider and a real Postgres.
+
+The fake provider is started in a subprocess. Holdings are seeded in SQL for
+bench users only, and the provider's scheme codes start at --code-base, clear
+of real AMFI codes. Everything the bench wrote is removed afterwards unless
+--keep is passed. DEV_DATABASE_URL must point at a migrated database. Run
+from the project root:
+
+    python -m benchmarks.bench_nav_pipeline --schemes 40000 --holdings 200000 --runs 3
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import time
+import httpx
+from asyncpg.connection import Connection
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.config import config_obj
+import src.investment.services as investment_services
+import src.investment.utils as investment_utils
+from src.investment.cache import NavSnapshotCache
+from src.investment.services import InvestmentService
+
+BENCH_EMAIL_DOMAIN = "fake-provider.local"
+
+SEED_USERS = text("""
+    INSERT INTO users (user_id, email, password_hash, is_verified, created_at, updated_at)
+    SELECT gen_random_uuid(), 'bench-' || n || '@' || :domain, 'bench', true, now(), now()
+    FROM generate_series(1, :users) AS n
+""")
+
+# holdings spread evenly over the bench users, each on a random scheme of the fake feed
+SEED_HOLDINGS = text("""
+    WITH bench_users AS (
+        SELECT user_id, row_number() OVER (ORDER BY user_id) - 1 AS position
+        FROM users
+        WHERE email LIKE '%@' || :domain
+    ), user_count AS (
+        SELECT count(*) AS total FROM bench_users
+    ), holdings AS (
+        SELECT n, :code_base + floor(random() * :schemes)::int AS scheme_code
+        FROM generate_series(1, :holdings) AS n
+    )
+    INSERT INTO investments (investment_id, user_id, scheme_name, scheme_code, units, nav, date, current_value, fund_family, created_at, updated_at)
+    SELECT gen_random_uuid(), u.user_id, 'Bench Scheme ' || h.scheme_code, h.scheme_code,
+           round((random() * 5000)::numeric, 3)::double precision, 0, '', 0,
+           'Bench Family ' || (h.scheme_code % 40), now(), now()
+    FROM holdings AS h
+    CROSS JOIN user_count AS c
+    JOIN bench_users AS u ON u.position = h.n % c.total
+""")
+
+CLEANUP = [
+    text("DELETE FROM investments WHERE user_id IN (SELECT user_id FROM users WHERE email LIKE '%@' || :domain)"),
+    text("DELETE FROM users WHERE email LIKE '%@' || :domain"),
+    text("DELETE FROM nav_history WHERE scheme_code BETWEEN :code_base AND :code_base + :schemes"),
+    text("DELETE FROM scheme_navs WHERE scheme_code BETWEEN :code_base AND :code_base + :schemes")
+]
+
+
+# statements sent through sqlalchemy plus COPYs issued on the raw asyncpg connection, and the time spent in them
+class StatementCounter:
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.copies = 0
+        self.seconds = 0.0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after)
+
+        copy_records_to_table = Connection.copy_records_to_table
+        counter = self
+
+        async def counted_copy(connection, *args, **kwargs):
+            counter.copies += 1
+            start = time.perf_counter()
+            try:
+                return await copy_records_to_table(connection, *args, **kwargs)
+            finally:
+                counter.seconds += time.perf_counter() - start
+
+        Connection.copy_records_to_table = counted_copy
+
+    def _before(self, connection, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        context.bench_started_at = time.perf_counter()
+
+    def _after(self, connection, cursor, statement, parameters, context, executemany):
+        self.seconds += time.perf_counter() - context.bench_started_at
+
+    @property
+    def total(self) -> int:
+        return self.statements + self.copies
+
+
+def peak_rss_mib() -> float:
+    # linux reports ru_maxrss in KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def start_provider(args) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.fake_provider",
+        "--schemes", str(args.schemes),
+        "--code-base", str(args.code_base),
+        "--latency", str(args.latency),
+        "--error-rate", str(args.error_rate),
+        "--pad-bytes", str(args.pad_bytes),
+        "--port", str(args.port)
+    ]
+    return subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def wait_for_provider(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+
+async def provider_stats(url: str) -> dict:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(url)).json()
+
+
+async def run(args, stats_url: str) -> None:
+    params = {"domain": BENCH_EMAIL_DOMAIN, "code_base": args.code_base, "schemes": args.schemes}
+    engine = create_async_engine(config_obj.DEV_DATABASE_URL)
+
+    async with engine.begin() as connection:
+        for statement in CLEANUP:
+            await connection.execute(statement, params)
+
+        start = time.perf_counter()
+        await connection.execute(SEED_USERS, {"domain": BENCH_EMAIL_DOMAIN, "users": args.users})
+        await connection.execute(SEED_HOLDINGS, {**params, "holdings": args.holdings})
+        seed_seconds = time.perf_counter() - start
+
+    # a live table has statistics from autovacuum, give the freshly seeded one the same
+    async with engine.connect() as connection:
+        await connection.execute(text("ANALYZE users, investments"))
+
+    counter = StatementCounter(engine)
+    service = InvestmentService()
+
+    print(f"schemes={args.schemes} holdings={args.holdings} users={args.users} latency={args.latency}s "
+          f"error_rate={args.error_rate} pad_bytes={args.pad_bytes}")
+    print(f"seeded in {seed_seconds:.1f} s, rss before first run {peak_rss_mib():.1f} MiB")
+    print(f"{'run':>3} {'wall s':>8} {'fetch s':>8} {'db s':>8} {'calls':>6} {'errors':>6} {'stmts':>6} {'changed':>8} "
+          f"{'updated':>8} {'history':>8} {'summaries':>9} {'peak rss MiB':>13}")
+
+    try:
+        for number in range(1, args.runs + 1):
+            before = await provider_stats(stats_url)
+            statements_before, db_seconds_before = counter.total, counter.seconds
+
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                start = time.perf_counter()
+                result = await service.update_nav_for_all_investments(session)
+                wall_seconds = time.perf_counter() - start
+
+            after = await provider_stats(stats_url)
+
+            if "updated" not in result:
+                print(f"{number:>3} failed: {result}")
+                continue
+
+            print(
+                f"{number:>3} {wall_seconds:>8.2f} {result['fetch_seconds']:>8.2f} {counter.seconds - db_seconds_before:>8.2f} "
+                f"{after['requests'] - before['requests']:>6} {after['errors'] - before['errors']:>6} "
+                f"{counter.total - statements_before:>6} {result['changed_schemes']:>8} {result['updated']:>8} "
+                f"{result['history_rows']:>8} {result['summaries_refreshed']:>9} {peak_rss_mib():>13.1f}"
+            )
+    finally:
+        if not args.keep:
+            async with engine.begin() as connection:
+                for statement in CLEANUP:
+                    await connection.execute(statement, params)
+
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--holdings", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--code-base", type=int, default=900000)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--pad-bytes", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--keep", action="store_true", help="leave the bench users, holdings and navs in the database")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    # the app reads the provider url at call time; the bench keeps off the shared rapidapi quota and redis nav cache
+    investment_utils.rapid_api_url = f"{base_url}/latest"
+    investment_utils.nav_provider.limiter = None
+    investment_services.nav_snapshot_cache = NavSnapshotCache(redis=None)
+
+    provider = start_provider(args)
+
+    try:
+        asyncio.run(wait_for_provider(f"{base_url}/stats"))
+        asyncio.run(run(args, f"{base_url}/stats"))
+    finally:
+        provider.terminate()
+        provider.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark: per-row Python valuation vs the vectorized searchsorted engine.
+
+Run from the project root (needs the same .env as the app):
+
+    python -m benchmarks.bench_valuation --schemes 40000 --holdings 1000000
+"""
+import argparse
+import time
+import numpy as np
+from benchmarks.bench_nav_index import make_payload
+from src.investment.nav_index import NavIndex
+from src.investment.valuation import NavColumns, value_holdings
+
+
+# the valuation done before the engine existed, one dict lookup and one round per holding
+def value_per_row(index: NavIndex, scheme_codes: list, units: list) -> float:
+    total = 0.0
+
+    for scheme_code, holding_units in zip(scheme_codes, units):
+        item = index.get(scheme_code)
+        if item is not None:
+            total += round(item["Net_Asset_Value"] * holding_units, 4)
+
+    return total
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--holdings", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    index = NavIndex.from_payload(make_payload(args.schemes))
+
+    # one percent of holdings point at schemes the feed no longer carries
+    scheme_codes = rng.integers(100000, 100000 + int(args.schemes * 1.01), size=args.holdings)
+    units = np.round(rng.uniform(1, 5000, size=args.holdings), 3)
+    code_list, unit_list = scheme_codes.tolist(), units.tolist()
+
+    columns_seconds = best_of(args.repeat, lambda: NavColumns.from_nav_index(index))
+    columns = NavColumns.from_nav_index(index)
+    searchsorted_columns = NavColumns.from_nav_index(index, lookup_table=False)
+
+    row_seconds = best_of(args.repeat, lambda: value_per_row(index, code_list, unit_list))
+    engine_seconds = best_of(args.repeat, lambda: value_holdings(columns, scheme_codes, units))
+    engine_list_seconds = best_of(args.repeat, lambda: value_holdings(columns, code_list, unit_list))
+    searchsorted_seconds = best_of(args.repeat, lambda: value_holdings(searchsorted_columns, scheme_codes, units))
+    sorted_codes = np.sort(scheme_codes)
+    searchsorted_sorted_seconds = best_of(args.repeat, lambda: value_holdings(searchsorted_columns, sorted_codes, units))
+
+    row_total = value_per_row(index, code_list, unit_list)
+    engine_total = value_holdings(columns, scheme_codes, units).total_value
+
+    print(f"schemes={args.schemes} holdings={args.holdings}")
+    print(f"columns build:          {columns_seconds * 1000:10.1f} ms")
+    print(f"per-row python:         {row_seconds * 1000:10.1f} ms  ({args.holdings / row_seconds / 1e6:6.2f} M holdings/s)")
+    print(f"engine, arrays:         {engine_seconds * 1000:10.1f} ms  ({args.holdings / engine_seconds / 1e6:6.2f} M holdings/s)")
+    print(f"engine, from lists:     {engine_list_seconds * 1000:10.1f} ms  ({args.holdings / engine_list_seconds / 1e6:6.2f} M holdings/s)")
+    print(f"searchsorted join:      {searchsorted_seconds * 1000:10.1f} ms  ({args.holdings / searchsorted_seconds / 1e6:6.2f} M holdings/s)")
+    print(f"searchsorted, by code:  {searchsorted_sorted_seconds * 1000:10.1f} ms  ({args.holdings / searchsorted_sorted_seconds / 1e6:6.2f} M holdings/s)")
+    print(f"speedup (arrays):       {row_seconds / engine_seconds:10.1f}x")
+    print(f"lookup table:           {columns._table is not None}")
+    print(f"totals agree:           {abs(row_total - engine_total) < 1e-3 * args.holdings}  ({row_total:.4f} vs {engine_total:.4f})")
+
+
+if __name__ == "__main__":
+    main()
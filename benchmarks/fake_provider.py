@@ -0,0 +1,166 @@
+"""
+Fake NAV provider that answers like RAPID_API_URL, for benchmarks and load tests.
+
+Scheme names, families and categories are cycled from src/data.json, so the
+response has the real shape. Each successful download publishes the next
+day's NAVs. Run from the project root:
+
+    python -m benchmarks.fake_provider --schemes 40000 --latency 0.3 --error-rate 0.05 --port 8765
+
+Then point the app at it with RAPID_API_URL=http://127.0.0.1:8765/latest.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+from datetime import date, timedelta
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+data_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src", "data.json")
+
+CHUNK_SIZE = 64 * 1024
+FIRST_DAY = date(2025, 2, 24)
+
+
+class FakeProvider:
+
+    def __init__(self, schemes: int = 40000, code_base: int = 900000, latency: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, pad_bytes: int = 0, changed_fraction: float = 0.9, bandwidth: float = 0.0,
+                 quota: int = 30000, seed: int = 7):
+        self.code_base = code_base
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.changed_fraction = changed_fraction
+        self.bandwidth = bandwidth
+        self.quota = quota
+        self._random = random.Random(seed)
+
+        with open(data_file, "r", encoding="utf-8") as file:
+            base = json.load(file)
+
+        # the extra field only grows the payload, the app keeps it like any other field it does not read
+        padding = {"Remarks": "x" * pad_bytes} if pad_bytes else {}
+
+        self.schemes = [
+            {
+                **base[position % len(base)],
+                "Scheme_Code": code_base + position,
+                "Net_Asset_Value": round(self._random.uniform(10, 500), 4),
+                "Date": FIRST_DAY.strftime("%d-%b-%Y"),
+                **padding
+            }
+            for position in range(schemes)
+        ]
+
+        self.day = 0
+        self.body = self._encode()
+
+        self.counters = {
+            "requests": 0,
+            "errors": 0,
+            "served": 0,
+            "bytes_sent": 0
+        }
+
+    # next publication, most navs move a little and the rest stay where they were
+    def advance(self) -> None:
+        self.day += 1
+        nav_date = (FIRST_DAY + timedelta(days=self.day)).strftime("%d-%b-%Y")
+
+        for scheme in self.schemes:
+            scheme["Date"] = nav_date
+
+            if self._random.random() < self.changed_fraction:
+                scheme["Net_Asset_Value"] = round(scheme["Net_Asset_Value"] * self._random.uniform(0.98, 1.02), 4)
+
+        self.body = self._encode()
+
+    def _encode(self) -> bytes:
+        return json.dumps(self.schemes, separators=(",", ":")).encode("utf-8")
+
+    async def latest(self, request: Request):
+        self.counters["requests"] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        remaining = max(0, self.quota - self.counters["requests"])
+        headers = {
+            "x-ratelimit-requests-limit": str(self.quota),
+            "x-ratelimit-requests-remaining": str(remaining)
+        }
+
+        if self._random.random() < self.error_rate:
+            self.counters["errors"] += 1
+            return JSONResponse({"message": "upstream unavailable"}, status_code=self.error_status, headers=headers)
+
+        # the real api filters on Scheme_Type, every fake scheme is open ended
+        scheme_type = request.query_params.get("Scheme_Type")
+        body = self.body if scheme_type in (None, "Open") else b"[]"
+
+        self.counters["served"] += 1
+        self.counters["bytes_sent"] += len(body)
+
+        # the next day is prepared once this body is sent, so building it is not charged to the download
+        return StreamingResponse(self._chunks(body), media_type="application/json", headers=headers, background=BackgroundTask(self.advance))
+
+    async def _chunks(self, body: bytes):
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start:start + CHUNK_SIZE]
+
+            if self.bandwidth:
+                await asyncio.sleep(len(chunk) / self.bandwidth)
+
+            yield chunk
+
+    async def stats(self, request: Request):
+        return JSONResponse({"day": self.day, "schemes": len(self.schemes), "body_bytes": len(self.body), **self.counters})
+
+
+def create_app(provider: FakeProvider) -> Starlette:
+    return Starlette(routes=[
+        Route("/latest", provider.latest),
+        Route("/stats", provider.stats)
+    ])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=40000)
+    parser.add_argument("--code-base", type=int, default=900000, help="first scheme code, kept clear of real AMFI codes")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the response starts")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="body bytes per second, 0 for unthrottled")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--pad-bytes", type=int, default=0, help="extra bytes per scheme")
+    parser.add_argument("--changed-fraction", type=float, default=0.9, help="share of navs that move per download")
+    parser.add_argument("--quota", type=int, default=30000)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    provider = FakeProvider(
+        schemes=args.schemes,
+        code_base=args.code_base,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        pad_bytes=args.pad_bytes,
+        changed_fraction=args.changed_fraction,
+        bandwidth=args.bandwidth,
+        quota=args.quota
+    )
+
+    uvicorn.run(create_app(provider), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
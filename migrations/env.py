@@ -10,6 +10,10 @@ from alembic import context
 # import our models
 from src.db.models import User
 from src.db.models import Investment
+from src.db.models import NavStaging
+from src.db.models import SchemeNav
+from src.db.models import NavHistory
+from src.db.models import PortfolioSummary
 from sqlmodel import SQLModel
 from src.config import config_obj
 
@@ -43,6 +47,13 @@ target_metadata = SQLModel.metadata
 # ... etc.
 
 
+# partitions are created by the migrations themselves, keep autogenerate from dropping them
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table" and reflected and compare_to is None and name.startswith("nav_history_"):
+        return False
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -59,6 +70,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -68,7 +80,7 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
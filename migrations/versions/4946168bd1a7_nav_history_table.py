@@ -0,0 +1,49 @@
+"""nav history table
+
+Revision ID: 4946168bd1a7
+Revises: a066ac215c08
+Create Date: 2026-10-18 14:13:48.403932
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4946168bd1a7'
+down_revision: Union[str, None] = 'a066ac215c08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# yearly partitions created up front, anything outside lands in the default partition
+FIRST_PARTITION_YEAR = 2015
+LAST_PARTITION_YEAR = 2035
+
+
+def upgrade() -> None:
+    # created by hand, alembic cannot render INCLUDE on a primary key
+    op.execute("""
+        CREATE TABLE nav_history (
+            scheme_code INTEGER NOT NULL,
+            nav_date DATE NOT NULL,
+            nav FLOAT NOT NULL,
+            PRIMARY KEY (scheme_code, nav_date) INCLUDE (nav)
+        ) PARTITION BY RANGE (nav_date)
+    """)
+
+    for year in range(FIRST_PARTITION_YEAR, LAST_PARTITION_YEAR + 1):
+        op.execute(
+            f"CREATE TABLE nav_history_y{year} PARTITION OF nav_history "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        )
+
+    op.execute("CREATE TABLE nav_history_default PARTITION OF nav_history DEFAULT")
+
+
+def downgrade() -> None:
+    # dropping the parent drops every partition
+    op.drop_table('nav_history')
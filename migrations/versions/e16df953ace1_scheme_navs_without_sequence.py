@@ -0,0 +1,30 @@
+"""scheme navs without sequence
+
+Revision ID: e16df953ace1
+Revises: c2373d1d1d6f
+Create Date: 2026-10-18 16:05:41.203517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e16df953ace1'
+down_revision: Union[str, None] = 'c2373d1d1d6f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # scheme codes come from the feed, a066ac215c08 created the column as serial
+    op.alter_column('scheme_navs', 'scheme_code', server_default=None)
+    op.execute('DROP SEQUENCE IF EXISTS scheme_navs_scheme_code_seq')
+
+
+def downgrade() -> None:
+    op.execute('CREATE SEQUENCE IF NOT EXISTS scheme_navs_scheme_code_seq OWNED BY scheme_navs.scheme_code')
+    op.alter_column('scheme_navs', 'scheme_code', server_default=sa.text("nextval('scheme_navs_scheme_code_seq'::regclass)"))
@@ -1,13 +1,33 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from src.errors import register_all_exceptions
 from src.auth.routes import auth_router
 from src.investment.routes import investment_router
+from src.metrics.routes import metrics_router
 from src.middlewares import register_middlewares
+from src.http_client import close_http_client
+from src.publisher import task_publisher
 
 # version value
 version = 'v1'
 version_prefix =f"/api/{version}"
 
+
+# open shared resources on startup and release them on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # start draining the task publisher buffer to the broker
+    task_publisher.start()
+
+    yield
+
+    # publish what is still buffered before the process goes away
+    await task_publisher.stop()
+
+    # close the pooled outbound http client
+    await close_http_client()
+
+
 # create the fastapi server
 app = FastAPI(
     version=version,
@@ -21,7 +41,8 @@ app = FastAPI(
     },
     openapi_url=f"{version_prefix}/openapi.json",
     docs_url=f"{version_prefix}/docs",
-    redoc_url=f"{version_prefix}/redoc"
+    redoc_url=f"{version_prefix}/redoc",
+    lifespan=lifespan
 )
 
 # register all exceptions
@@ -40,4 +61,9 @@ app.include_router(
     investment_router,
     prefix=f'/api/{version}/investment',
     tags=['investment']
+)
+app.include_router(
+    metrics_router,
+    prefix=f'/api/{version}/metrics',
+    tags=['metrics']
 )
\ No newline at end of file
@@ -7,7 +7,7 @@ from src.errors import InvalidToken, RefreshTokenRequired, AccessTokenRequired
 from src.db.redis_db import check_jti_in_blocklist
 from src.db.main import get_session
 from sqlalchemy.ext.asyncio.session import AsyncSession
-from src.auth.schemas import UserInvestmentSchemaView
+from src.auth.schemas import UserPortfolioSchemaView
 from src.errors import UserNotFound
 
 # create an instance of the user service
@@ -67,7 +67,7 @@ class RefreshTokenBearer(TokenBearer):
 access_token_bearer = AccessTokenBearer()
 
 # get the current user details including investment details
-async def get_current_user(token_details: dict = Depends(access_token_bearer), session: AsyncSession = Depends(get_session)) -> UserInvestmentSchemaView:
+async def get_current_user(token_details: dict = Depends(access_token_bearer), session: AsyncSession = Depends(get_session)) -> UserPortfolioSchemaView:
     # get the email details from token
     user_email = token_details['user']['email']
 
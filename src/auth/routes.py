@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, status
-from src.auth.schemas import UserViewSchema, UserCreateSchema, UserLoginSchema, EmailSchema, PasswordResetRequestSchema, PasswordResetConfirmSchema, UserInvestmentSchemaView
+from src.auth.schemas import UserViewSchema, UserCreateSchema, UserLoginSchema, EmailSchema, PasswordResetRequestSchema, PasswordResetConfirmSchema, UserPortfolioSchemaView
 from src.auth.services import UserService
 from src.config import config_obj
 from src.db.main import get_session
@@ -12,7 +12,9 @@ from src.auth.dependencies import RefreshTokenBearer, AccessTokenBearer, get_cur
 from src.db.redis_db import add_jti_to_blocklist
 from src.mail import mail, create_message
 from fastapi.exceptions import HTTPException
-from src.celery_tasks import send_email
+from src.celery_tasks import send_email, send_emails
+from src.publisher import task_publisher
+from src.outbox import add_outbox_task
 
 # refresh token expiry value
 REFRESH_TOKEN_EXPIRY = 2
@@ -40,10 +42,7 @@ async def create_user(user_data: UserCreateSchema,
     if is_user_exists:
         raise UserAlreadyExists()
 
-    # create the user with email and password
-    user = await user_service.create_user(user_data, session)
-
-    # send the email to the user for account verification
+    # the email to the user for account verification
     token = create_url_safe_token({"email": email})
 
     link = f"http://{config_obj.DOMAIN}/api/v1/auth/verify/{token}"
@@ -56,7 +55,11 @@ async def create_user(user_data: UserCreateSchema,
     emails = [email]
     subject = "Verify Your email"
 
-    send_email.delay(emails, subject, html)
+    # written to the outbox first so it is committed together with the user
+    add_outbox_task(session, send_email.name, emails, subject, html)
+
+    # create the user with email and password
+    user = await user_service.create_user(user_data, session)
 
     return {
         "message": "Account Created! Check email to verify your account!!.",
@@ -177,13 +180,15 @@ async def logout_user(token_details: dict = Depends(access_token_bearer)) -> dic
     )
 
 # route for send email, created for testing purpose
+# there is no transaction to tie the email to here, so it goes straight to the publisher instead of the outbox
 @auth_router.post("/send_mail")
 async def send_mail(emails: EmailSchema, token_details: dict = Depends(access_token_bearer)):
     emails = emails.addresses
     html = "<h1>Welcome to the app</h1>"
     subject = "Welcome to our app"
 
-    send_email.delay(emails, subject, html)
+    # one message per address, sent by the worker in mailer batches instead of one task each
+    await task_publisher.publish(send_emails, [{"recipients": [address], "subject": subject, "body": html} for address in emails])
 
     return {"message": "Email sent successfully"}
 
@@ -213,7 +218,9 @@ async def password_reset_request(email_data: PasswordResetRequestSchema, session
     """
     subject = "Reset Your Password"
 
-    send_email.delay([email], subject, html_message)
+    # relayed by the outbox like the signup email, nothing else is written so it commits on its own
+    add_outbox_task(session, send_email.name, [email], subject, html_message)
+    await session.commit()
 
     return JSONResponse(
         content={
@@ -266,8 +273,8 @@ async def reset_password(token: str, passwords: PasswordResetConfirmSchema, sess
     )
 
 # route for getting the current logged in user
-@auth_router.get('/me', response_model=UserInvestmentSchemaView)
-async def get_current_user_details(current_user: UserViewSchema = Depends(get_current_user)) -> UserInvestmentSchemaView:
+@auth_router.get('/me', response_model=UserPortfolioSchemaView)
+async def get_current_user_details(current_user: UserViewSchema = Depends(get_current_user)) -> UserPortfolioSchemaView:
     return current_user
 
 
@@ -1,8 +1,8 @@
 import uuid
 from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import List
-from src.investment.schemas import InvestmentViewSchema
+from typing import List, Optional
+from src.investment.schemas import InvestmentViewSchema, PortfolioSummarySchema
 
 
 # schemas for user view
@@ -39,4 +39,8 @@ class PasswordResetConfirmSchema(BaseModel):
 
 # schema for user, investment view
 class UserInvestmentSchemaView(UserViewSchema):
-    investments: List[InvestmentViewSchema]
\ No newline at end of file
+    investments: List[InvestmentViewSchema]
+
+# schema for user view with the stored portfolio totals
+class UserPortfolioSchemaView(UserViewSchema):
+    portfolio_summary: Optional[PortfolioSummarySchema] = None
\ No newline at end of file
@@ -3,6 +3,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from src.db.models import User
 from src.auth.schemas import UserViewSchema, UserCreateSchema, UserLoginSchema
 from src.auth.utils import generate_password_hash
+from src.outbox import add_domain_event
 
 
 # all the user related services
@@ -25,8 +26,10 @@ class UserService:
         password = generate_password_hash(user_data_dict['password'])
         user.password_hash = password
 
-        # add user to db
+        # add user to db, the flush assigns the user_id the event carries
         session.add(user)
+        await session.flush()
+        add_domain_event(session, "user.created", {"user_id": str(user.user_id), "email": user.email})
         await session.commit()
         await session.refresh(user)
         return user
@@ -37,6 +40,9 @@ class UserService:
         for key, value in user_data.items():
             setattr(user, key, value)
 
+        # only the field names go in the event, never values such as the password hash
+        add_domain_event(session, "user.updated", {"user_id": str(user.user_id), "fields": sorted(user_data)})
+
         # commit to the db
         await session.commit()
         return user
\ No newline at end of file
@@ -1,10 +1,26 @@
 from celery.schedules import crontab
+from celery.signals import before_task_publish, celeryd_init
 from celery import Celery
+from src.queues import task_queues, task_routes, prefetch_for_queues, QUEUE_ORDER, PRIORITY_STEPS, PRIORITY_SEP, \
+    PUBLISHED_AT_HEADER, DEFAULT_QUEUE
+import time
 
 # create a celery client which connects to redis server
 c_app = Celery("celery")
 c_app.config_from_object("src.config")
 
+# dedicated queues for transactional email, bulk email and nav work, see src/queues.py
+c_app.conf.task_queues = task_queues
+c_app.conf.task_routes = task_routes
+c_app.conf.task_default_queue = DEFAULT_QUEUE
+c_app.conf.task_default_priority = 5
+c_app.conf.task_queue_max_priority = PRIORITY_STEPS[-1]
+c_app.conf.broker_transport_options = {
+    "priority_steps": PRIORITY_STEPS,
+    "sep": PRIORITY_SEP,
+    "queue_order_strategy": "priority"
+}
+
 # celery beat config
 c_app.conf.beat_schedule = {
     "check-investments-every-hour": {
@@ -14,4 +30,23 @@ c_app.conf.beat_schedule = {
 }
 
 # celery timezone
-c_app.conf.timezone = "UTC"
\ No newline at end of file
+c_app.conf.timezone = "UTC"
+
+
+# stamp the publish time so the queue metrics can tell how long the oldest task has waited
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+# a worker started on its own queues, e.g. -Q nav, gets that workload's prefetch
+@celeryd_init.connect
+def configure_worker_prefetch(conf=None, options=None, **kwargs):
+    queues = (options or {}).get("queues") or QUEUE_ORDER
+    if isinstance(queues, str):
+        queues = queues.split(",")
+
+    prefetch = prefetch_for_queues([name.strip() for name in queues])
+    if prefetch is not None and (options or {}).get("prefetch_multiplier") is None:
+        conf.worker_prefetch_multiplier = prefetch
@@ -1,34 +1,160 @@
-from src.mail import mail, create_message
-from asgiref.sync import async_to_sync
+from src.mail import mailer, MailDeliveryError
 from typing import List
+from celery import chord, group
 from src.celery import c_app
-import requests
 from src.config import config_obj
-from celery.exceptions import Retry
+from src.errors import ProviderUnavailable
+from src.investment.services import InvestmentService
+from src.worker import worker_runtime
+from src.outbox import is_duplicate_delivery, confirm_delivery, release_delivery, claim_delivery, confirm_delivery_id, \
+    release_delivery_id
 
-# API URL for NAV updates
-API_URL = f"http://{config_obj.DOMAIN}/api/v1/investment/update-all-navs"
+investment_service = InvestmentService()
 
-@c_app.task()
-def send_email(recipients: List[str], subject: str, body: str):
-    # Celery task to send emails
-    message = create_message(recipients=recipients, subject=subject, body=body)
-    async_to_sync(mail.send_message)(message)
+@c_app.task(bind=True, max_retries=3, default_retry_delay=30)
+def send_email(self, recipients: List[str], subject: str, body: str):
+    # Celery task to send emails, over the worker's smtp connection
+    if is_duplicate_delivery(self):
+        print(f"Email task {self.request.id} already delivered, skipping")
+        return
+
+    mailer.enqueue(recipients, subject, body)
+
+    try:
+        worker_runtime.run(mailer.drain())
+    except MailDeliveryError as e:
+        # out of retries, let a redelivery of the same task try again
+        if self.request.retries >= self.max_retries:
+            release_delivery(self)
+        raise self.retry(exc=e)
+    except Exception:
+        release_delivery(self)
+        raise
+
+    confirm_delivery(self)
     print("Email sent successfully!")
 
-@c_app.task(name="src.celery_tasks.check_investments", autoretry_for=(requests.RequestException,), retry_kwargs={"max_retries": 3, "countdown": 60})
-def check_investments():
-    # Celery task to check investments every 5 minutes.
+@c_app.task(bind=True, max_retries=3, default_retry_delay=30)
+def send_emails(self, emails: List[dict]):
+    # Celery task to send many emails at once, each one a dict of recipients, subject and body
+    # emails coalesced by the outbox relay carry their outbox id, one that already went out is skipped
+    if not self.request.retries:
+        emails = [email for email in emails if "delivery_id" not in email or claim_delivery(email["delivery_id"])]
+
+    delivery_ids = [email["delivery_id"] for email in emails if "delivery_id" in email]
+
+    for email in emails:
+        mailer.enqueue(**email)
+
+    try:
+        batches = worker_runtime.run(mailer.drain())
+    except MailDeliveryError as e:
+        unsent_ids = {email["delivery_id"] for email in e.unsent if "delivery_id" in email}
+
+        for delivery_id in delivery_ids:
+            if delivery_id not in unsent_ids:
+                confirm_delivery_id(delivery_id)
+
+        # out of retries, let a redelivery of the same rows try again
+        if self.request.retries >= self.max_retries:
+            for delivery_id in unsent_ids:
+                release_delivery_id(delivery_id)
+
+        # only what did not go out is retried
+        raise self.retry(exc=e, args=(e.unsent,))
+    except Exception:
+        for delivery_id in delivery_ids:
+            release_delivery_id(delivery_id)
+        raise
+
+    for delivery_id in delivery_ids:
+        confirm_delivery_id(delivery_id)
+
+    print(f"Emails sent in {len(batches)} batches: {batches}")
+    return batches
+
+@c_app.task(bind=True, name="src.celery_tasks.check_investments", autoretry_for=(ProviderUnavailable,),
+            retry_backoff=60, retry_backoff_max=600, retry_jitter=True, retry_kwargs={"max_retries": 3})
+def check_investments(self):
+    # Celery task that revalues every holding, progress is published to the result backend as it goes
+
+    def on_progress(progress: dict) -> None:
+        self.update_state(state="PROGRESS", meta=progress)
+
+    shard_count = config_obj.NAV_REVALUATION_SHARDS
+
+    # a single shard runs the whole pipeline here
+    if shard_count <= 1:
+        async def revalue() -> dict:
+            async with worker_runtime.session() as session:
+                return await investment_service.run_nav_revaluation(session, on_progress=on_progress)
+
+        result = worker_runtime.run(revalue())
+        print(f"NAV update result: {result}")
+        return result
+
+    # otherwise stage the snapshot once and fan the holdings out, the chord callback adds the shards up
+    async def prepare() -> dict:
+        async with worker_runtime.session() as session:
+            return await investment_service.prepare_nav_revaluation(session, on_progress=on_progress)
+
+    prepared = worker_runtime.run(prepare())
+    run_id = prepared["run_id"]
+
+    shards = group(revalue_nav_shard.s(run_id, shard, shard_count) for shard in range(shard_count))
+    finalize = finalize_nav_revaluation.s(prepared).on_error(abandon_nav_revaluation.si(run_id))
+    chord_result = chord(shards)(finalize)
+
+    print(f"NAV update {run_id} dispatched as {shard_count} shards")
+    return {"run_id": run_id, "shards": shard_count, "finalize_task_id": chord_result.id, "staged": prepared["staged"],
+            "changed_schemes": prepared["changed_schemes"]}
+
+@c_app.task(bind=True, name="src.celery_tasks.revalue_nav_shard")
+def revalue_nav_shard(self, run_id: str, shard: int, shard_count: int):
+    # Celery task that revalues one shard of the holdings of a staged run
+
+    def on_progress(progress: dict) -> None:
+        self.update_state(state="PROGRESS", meta={"run_id": run_id, **progress})
+
+    async def revalue() -> dict:
+        async with worker_runtime.session() as session:
+            return await investment_service.revalue_nav_shard(session, run_id, shard, shard_count, on_progress=on_progress)
+
+    return worker_runtime.run(revalue())
+
+@c_app.task(name="src.celery_tasks.finalize_nav_revaluation")
+def finalize_nav_revaluation(shard_results: List[dict], prepared: dict):
+    # Chord callback, runs once every shard went through
+
+    async def finalize() -> dict:
+        async with worker_runtime.session() as session:
+            return await investment_service.finalize_nav_revaluation(session, prepared, shard_results)
+
+    result = worker_runtime.run(finalize())
+    print(f"NAV update result: {result}")
+    return result
+
+@c_app.task(name="src.celery_tasks.abandon_nav_revaluation")
+def abandon_nav_revaluation(run_id: str):
+    # Error callback of the chord, a failed shard leaves the applied navs alone so the next run redoes it
+
+    async def abandon() -> None:
+        async with worker_runtime.session() as session:
+            await investment_service.abandon_nav_revaluation(session, run_id)
+
+    worker_runtime.run(abandon())
+    print(f"NAV update {run_id} failed, staged rows cleared")
+
+@c_app.task(bind=True, name="src.celery_tasks.handle_domain_event")
+def handle_domain_event(self, event_type: str, payload: dict):
+    # Celery task that receives the domain events relayed from the outbox, subscribers hook in here
+    if is_duplicate_delivery(self):
+        return
 
     try:
-        response = requests.post(API_URL, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        print(f"NAV update API response: {data}")
-        return data
-    except requests.RequestException as e:
-        print(f"Error calling NAV update API: {e}")
-        raise Retry(exc=e)
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        raise e
\ No newline at end of file
+        print(f"Domain event {event_type}: {payload}")
+    except Exception:
+        release_delivery(self)
+        raise
+
+    confirm_delivery(self)
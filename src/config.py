@@ -1,3 +1,4 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -18,10 +19,51 @@ class Settings(BaseSettings):
     MAIL_SSL_TLS: bool = False
     USE_CREDENTIALS: bool = True
     VALIDATE_CERTS: bool = True
+    MAIL_BATCH_SIZE: int = 50
+    MAIL_TIMEOUT: float = 30.0
+    MAIL_MAX_RECONNECTS: int = 3
     DOMAIN: str
     RAPID_API_URL: str
     RAPID_API_KEY: str
     RAPID_API_HOST: str
+    NAV_FEED_STREAMING: bool = True
+    NAV_REVALUATION_CHUNK_SIZE: int = 1000
+    NAV_REVALUATION_SHARDS: int = 4
+    NAV_CACHE_TTL: float = 300.0
+    NAV_CACHE_STALE_TTL: float = 3600.0
+    NAV_CACHE_MAX_ENTRIES: int = 4
+    NAV_CACHE_CHECK_INTERVAL: float = 5.0
+    SINGLE_FLIGHT_LOCK_TTL: float = 45.0
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 0.1
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 20
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_CLIENT_HTTP2: bool = False
+    HTTP_CLIENT_CONNECT_TIMEOUT: float = 5.0
+    HTTP_CLIENT_READ_TIMEOUT: float = 30.0
+    HTTP_CLIENT_WRITE_TIMEOUT: float = 10.0
+    HTTP_CLIENT_POOL_TIMEOUT: float = 5.0
+    NAV_PROVIDER_MAX_CONCURRENCY: int = 4
+    NAV_PROVIDER_MAX_PENDING: int = 32
+    NAV_PROVIDER_ACQUIRE_TIMEOUT: float = 10.0
+    NAV_PROVIDER_MAX_ATTEMPTS: int = 3
+    NAV_PROVIDER_BACKOFF_BASE: float = 0.5
+    NAV_PROVIDER_BACKOFF_MAX: float = 8.0
+    NAV_PROVIDER_FAILURE_THRESHOLD: int = 5
+    NAV_PROVIDER_RECOVERY_TIMEOUT: float = 30.0
+    # the token bucket divides by the rate, a rate of 0 is refused at startup rather than on the first call
+    NAV_PROVIDER_RATE_PER_SECOND: float = Field(default=5.0, gt=0)
+    NAV_PROVIDER_BURST: int = Field(default=5, ge=1)
+    NAV_PROVIDER_DAILY_QUOTA: int = 1000
+    NAV_PROVIDER_MONTHLY_QUOTA: int = 30000
+    TASK_PUBLISHER_MAX_BUFFER: int = 1000
+    TASK_PUBLISHER_BATCH_SIZE: int = 100
+    TASK_PUBLISHER_LINGER: float = 0.005
+    TASK_PUBLISHER_ENQUEUE_TIMEOUT: float = 1.0
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_POLL_INTERVAL: float = 0.5
+    OUTBOX_RETENTION_HOURS: float = 24.0
+    OUTBOX_PURGE_INTERVAL: float = 300.0
 
     # config the model what to get from the env file
     model_config = SettingsConfigDict(
@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Column, Relationship
+from sqlalchemy import PrimaryKeyConstraint, ForeignKey, Index, text
 from datetime import date, datetime
 import uuid
 import sqlalchemy.dialects.postgresql as pg
@@ -41,8 +42,12 @@ class User(SQLModel, table=True):
             onupdate=datetime.now
         )
     )
+    # holdings are queried when needed, totals come from the one row portfolio summary
     investments: List['Investment'] = Relationship(
-        back_populates='user', sa_relationship_kwargs={'lazy': 'selectin'}
+        back_populates='user', sa_relationship_kwargs={'lazy': 'raise'}
+    )
+    portfolio_summary: Optional['PortfolioSummary'] = Relationship(
+        sa_relationship_kwargs={'lazy': 'joined', 'uselist': False, 'cascade': 'all, delete-orphan', 'passive_deletes': True}
     )
 
 
@@ -62,10 +67,11 @@ class Investment(SQLModel, table=True):
     )
     user_id: Optional[uuid.UUID] = Field(
         default=None,
-        foreign_key='users.user_id'
+        foreign_key='users.user_id',
+        index=True
     )
     scheme_name: str
-    scheme_code: int
+    scheme_code: int = Field(index=True)
     units: float
     nav: float
     date: str
@@ -85,3 +91,148 @@ class Investment(SQLModel, table=True):
             onupdate=datetime.now
         )
     )
+
+
+# scratch table the nav revaluation copies a feed snapshot into before the set based update
+class NavStaging(SQLModel, table=True):
+
+    # define the table name, unlogged since the rows only live for one run
+    __tablename__ = 'nav_staging'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
+
+    # define the required fields
+    run_id: uuid.UUID = Field(
+        sa_column=Column(
+            pg.UUID(as_uuid=True),
+            primary_key=True,
+            nullable=False
+        )
+    )
+    scheme_code: int = Field(primary_key=True)
+    nav: float
+    nav_date: str
+    changed: bool = Field(default=True, sa_column_kwargs={'server_default': 'true'})
+
+
+# last (nav, date) applied to the holdings of each scheme, used to skip schemes whose nav did not move
+class SchemeNav(SQLModel, table=True):
+
+    # define the table name
+    __tablename__ = 'scheme_navs'
+
+    # define the required fields, scheme codes come from the feed so no serial sequence
+    scheme_code: int = Field(primary_key=True, sa_column_kwargs={'autoincrement': False})
+    nav: float
+    nav_date: str
+    updated_at: datetime = Field(
+        sa_column=Column(
+            pg.TIMESTAMP(timezone=True),
+            default=datetime.now,
+            onupdate=datetime.now
+        )
+    )
+
+
+# nav time series, range partitioned by nav_date
+class NavHistory(SQLModel, table=True):
+
+    # define the table name, the migration adds INCLUDE (nav) to the key so range reads are index only
+    __tablename__ = 'nav_history'
+    __table_args__ = (
+        PrimaryKeyConstraint('scheme_code', 'nav_date'),
+        {'postgresql_partition_by': 'RANGE (nav_date)'}
+    )
+
+    # define the required fields
+    scheme_code: int
+    nav_date: date
+    nav: float
+
+
+# per user totals kept in step with the holdings, so reads never sum every investment
+class PortfolioSummary(SQLModel, table=True):
+
+    # define the table name
+    __tablename__ = 'portfolio_summary'
+
+    # define the required fields
+    user_id: uuid.UUID = Field(
+        sa_column=Column(
+            pg.UUID(as_uuid=True),
+            ForeignKey('users.user_id', ondelete='CASCADE'),
+            primary_key=True,
+            nullable=False
+        )
+    )
+    total_value: float = Field(default=0.0)
+    holding_count: int = Field(default=0)
+
+    # fund family -> {"value": ..., "holdings": ...}
+    family_exposure: dict = Field(
+        default_factory=dict,
+        sa_column=Column(
+            pg.JSONB,
+            nullable=False,
+            server_default='{}'
+        )
+    )
+    updated_at: datetime = Field(
+        sa_column=Column(
+            pg.TIMESTAMP(timezone=True),
+            default=datetime.now,
+            onupdate=datetime.now
+        )
+    )
+
+
+# tasks and domain events written in the same transaction as the change that caused them, relayed to celery afterwards
+class OutboxMessage(SQLModel, table=True):
+
+    # define the table name, the relay only ever scans the unpublished rows
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        Index('ix_outbox_pending', 'created_at', postgresql_where=text('published_at IS NULL')),
+    )
+
+    # define the required fields, the id is also the celery task id
+    outbox_id: uuid.UUID = Field(
+        sa_column=Column(
+            pg.UUID(as_uuid=True),
+            primary_key=True,
+            default=uuid.uuid4,
+            nullable=False
+        )
+    )
+    task_name: str
+    args: list = Field(
+        default_factory=list,
+        sa_column=Column(
+            pg.JSONB,
+            nullable=False,
+            server_default='[]'
+        )
+    )
+    kwargs: dict = Field(
+        default_factory=dict,
+        sa_column=Column(
+            pg.JSONB,
+            nullable=False,
+            server_default='{}'
+        )
+    )
+    attempts: int = Field(default=0)
+    last_error: Optional[str] = Field(default=None)
+    created_at: datetime = Field(
+        sa_column=Column(
+            pg.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=text('clock_timestamp()')
+        )
+    )
+    published_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(
+            pg.TIMESTAMP(timezone=True),
+            nullable=True
+        )
+    )
@@ -9,6 +9,23 @@ token_blocklist = aioredis.from_url(
     decode_responses=True
 )
 
+# the nav cache stores compressed bytes, so this client does not decode responses
+nav_cache_store = aioredis.from_url(
+    config_obj.REDIS_URL
+)
+
+# outbound rate limit bucket and quota counters of the data provider
+provider_quota_store = aioredis.from_url(
+    config_obj.REDIS_URL,
+    decode_responses=True
+)
+
+# the celery broker, only read for queue depth and latency
+broker_store = aioredis.from_url(
+    config_obj.REDIS_URL,
+    decode_responses=True
+)
+
 
 # function to add jti to blocklist in redis
 async def add_jti_to_blocklist(jti: str) -> None:
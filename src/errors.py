@@ -76,6 +76,48 @@ class SchemeCodeAlreadyExists(InvestmentException):
     """
     pass
 
+
+class InvalidDateRange(InvestmentException):
+    """
+    Raised when the start date of a range is after its end date.
+    """
+    pass
+
+
+class InvalidCatalogueField(InvestmentException):
+    """
+    Raised when the catalogue is asked to project a field the feed does not carry.
+    """
+    pass
+
+
+class ProviderUnavailable(InvestmentException):
+    """
+    Raised when the nav provider is failing, its circuit is open or every slot for it is taken.
+    """
+    pass
+
+
+class QuotaExceeded(InvestmentException):
+    """
+    Raised when the daily or monthly request quota of the nav provider is spent.
+    """
+    pass
+
+
+class TaskException(Exception):
+    """
+    Raised when a background task cannot be handed to the queue.
+    """
+    pass
+
+
+class PublisherBusy(TaskException):
+    """
+    Raised when the task publisher buffer stays full past the enqueue timeout.
+    """
+    pass
+
 # create the exception handler below
 def create_exception_handler(status_code: int,
                              initial_detail: Any) -> Callable[[Request, Exception], JSONResponse]:
@@ -191,4 +233,59 @@ def register_all_exceptions(app: FastAPI):
                 "error_code": "investment_already_exists_for_this_scheme_code"
             }
         )
+    )
+
+    app.add_exception_handler(
+        InvalidDateRange,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "Start date must not be after end date!!.",
+                "error_code": "invalid_date_range"
+            }
+        )
+    )
+
+    app.add_exception_handler(
+        InvalidCatalogueField,
+        create_exception_handler(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            initial_detail={
+                "message": "One or more requested fields do not exist in the fund catalogue!!.",
+                "error_code": "invalid_catalogue_field"
+            }
+        )
+    )
+
+    app.add_exception_handler(
+        ProviderUnavailable,
+        create_exception_handler(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            initial_detail={
+                "message": "The fund data provider is unavailable, please try again later!!.",
+                "error_code": "provider_unavailable"
+            }
+        )
+    )
+
+    app.add_exception_handler(
+        QuotaExceeded,
+        create_exception_handler(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            initial_detail={
+                "message": "The fund data provider quota is used up for now, please try again later!!.",
+                "error_code": "provider_quota_exceeded"
+            }
+        )
+    )
+
+    app.add_exception_handler(
+        PublisherBusy,
+        create_exception_handler(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            initial_detail={
+                "message": "Too many background tasks are waiting, please try again later!!.",
+                "error_code": "publisher_busy"
+            }
+        )
     )
\ No newline at end of file
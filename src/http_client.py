@@ -0,0 +1,166 @@
+from src.config import config_obj
+import asyncio
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# transport wrapper which counts requests and new connections so the pool can be sized under load
+class PoolStatsTransport(httpx.AsyncBaseTransport):
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport):
+        self._transport = transport
+        self.requests_total = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests_total += 1
+
+        # httpcore reports connection setup through the trace extension
+        if "trace" not in request.extensions:
+            request.extensions["trace"] = self._trace
+
+        return await self._transport.handle_async_request(request)
+
+    async def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def stats(self) -> dict:
+        # the httpcore pool is not public api, fall back to zeros if its shape changes
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        pending = list(getattr(pool, "_requests", []))
+
+        in_use = sum(1 for connection in connections if not connection.is_idle())
+        queued = sum(1 for request in pending if request.is_queued())
+
+        reuse_ratio = 0.0
+        if self.requests_total:
+            reuse_ratio = max(0.0, 1 - self.connections_opened / self.requests_total)
+
+        return {
+            "requests_total": self.requests_total,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "connections_open": len(connections),
+            "connections_in_use": in_use,
+            "connections_idle": len(connections) - in_use,
+            "requests_queued": queued,
+            "reuse_ratio": round(reuse_ratio, 4)
+        }
+
+
+# check the optional h2 dependency before asking httpx for http/2
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_transport() -> PoolStatsTransport:
+    http2 = config_obj.HTTP_CLIENT_HTTP2
+
+    if http2 and not http2_available():
+        logger.warning("HTTP_CLIENT_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=config_obj.HTTP_CLIENT_MAX_CONNECTIONS,
+        max_keepalive_connections=config_obj.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config_obj.HTTP_CLIENT_KEEPALIVE_EXPIRY
+    )
+
+    return PoolStatsTransport(
+        httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+    )
+
+
+def create_http_client(transport: httpx.AsyncBaseTransport) -> httpx.AsyncClient:
+    # every phase gets its own budget instead of one catch-all timeout
+    timeout = httpx.Timeout(
+        connect=config_obj.HTTP_CLIENT_CONNECT_TIMEOUT,
+        read=config_obj.HTTP_CLIENT_READ_TIMEOUT,
+        write=config_obj.HTTP_CLIENT_WRITE_TIMEOUT,
+        pool=config_obj.HTTP_CLIENT_POOL_TIMEOUT
+    )
+
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+# process wide client, created lazily and closed by the app lifespan
+http_client: httpx.AsyncClient | None = None
+http_client_transport: PoolStatsTransport | None = None
+http_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+# clients replaced after a loop change whose loop was no longer running, closed with the current client
+retired_http_clients: list[httpx.AsyncClient] = []
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global http_client, http_client_transport, http_client_loop
+
+    loop = asyncio.get_running_loop()
+
+    # connections belong to the loop that opened them, so a new loop gets a new client
+    if http_client is None or http_client.is_closed or http_client_loop is not loop:
+        if http_client is not None and not http_client.is_closed:
+            retire_http_client(http_client, http_client_loop)
+
+        http_client_transport = create_http_transport()
+        http_client = create_http_client(http_client_transport)
+        http_client_loop = loop
+
+    return http_client
+
+
+# close a replaced client on its own loop when that loop still runs, otherwise keep it for close_http_client
+def retire_http_client(client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop | None) -> None:
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    else:
+        retired_http_clients.append(client)
+
+
+async def close_http_client() -> None:
+    global http_client, http_client_transport, http_client_loop
+
+    if http_client is not None and not http_client.is_closed:
+        await http_client.aclose()
+
+    while retired_http_clients:
+        client = retired_http_clients.pop()
+
+        try:
+            await client.aclose()
+        except Exception as e:
+            # its loop is gone, the sockets are released with the client
+            logger.debug("could not close a retired http client: %s", e)
+
+    http_client = None
+    http_client_transport = None
+    http_client_loop = None
+
+
+# pool statistics for the metrics endpoint
+def get_http_client_stats() -> dict:
+    stats = {
+        "max_connections": config_obj.HTTP_CLIENT_MAX_CONNECTIONS,
+        "max_keepalive_connections": config_obj.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        "http2": config_obj.HTTP_CLIENT_HTTP2 and http2_available()
+    }
+
+    if http_client is None or http_client.is_closed:
+        return {**stats, "active": False}
+
+    return {**stats, "active": True, **http_client_transport.stats()}
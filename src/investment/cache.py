@@ -0,0 +1,231 @@
+from src.config import config_obj
+from src.investment.nav_index import NavIndex, set_current_nav_index
+from redis.exceptions import RedisError
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+from typing import Awaitable, Callable, Optional
+import asyncio
+import json
+import logging
+import math
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# redis keys are namespaced so the cache can share the broker database
+KEY_PREFIX = "nav-cache:"
+
+# small key next to each entry holding its fetched_at, read before the entry itself
+FETCHED_AT_SUFFIX = ":fetched-at"
+
+# loads a fresh index from upstream when the cache cannot serve one
+Loader = Callable[[], Awaitable[NavIndex]]
+
+
+# compact form kept in redis, compressed json without whitespace
+def dump_nav_index(index: NavIndex, fetched_at: float) -> bytes:
+    payload = {
+        "as_of": index.as_of.isoformat(),
+        "fetched_at": fetched_at,
+        "schemes": list(index.items())
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def load_nav_index(data: bytes) -> "CacheEntry":
+    payload = json.loads(zlib.decompress(data))
+    index = NavIndex.from_payload(payload["schemes"], as_of=datetime.fromisoformat(payload["as_of"]))
+    return CacheEntry(index, payload["fetched_at"])
+
+
+class CacheEntry:
+
+    def __init__(self, index: NavIndex, fetched_at: float):
+        self.index = index
+        self.fetched_at = fetched_at
+
+    # wall clock age, fetched_at is shared through redis so it cannot be a monotonic reading
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+# in-process lru in front of a shared redis tier, stale entries are served while one background refresh runs
+class NavSnapshotCache:
+
+    def __init__(self, redis=None, ttl: Optional[float] = None, stale_ttl: Optional[float] = None, max_entries: Optional[int] = None, flight=None,
+                 check_interval: Optional[float] = None):
+        self._redis = redis
+        self._flight = flight
+        self.ttl = config_obj.NAV_CACHE_TTL if ttl is None else ttl
+        self.stale_ttl = config_obj.NAV_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        self.max_entries = config_obj.NAV_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.check_interval = config_obj.NAV_CACHE_CHECK_INTERVAL if check_interval is None else check_interval
+
+        self._local = OrderedDict()
+        self._checked_at = {}
+        self._refreshing = {}
+
+        self.counters = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "redis_errors": 0
+        }
+
+    # get the index cached under key, calling loader only when nothing usable is cached
+    async def get(self, key: str, loader: Loader) -> NavIndex:
+        entry = self._local.get(key)
+        tier = "local_hits"
+
+        if entry is not None:
+            self._local.move_to_end(key)
+
+        # another worker may already have refreshed what this process holds, looked up at most once per check_interval
+        if entry is None or (entry.age() >= self.ttl and self._due_for_check(key)):
+            shared = await self._get_shared(key, newer_than=None if entry is None else entry.fetched_at)
+
+            if shared is not None:
+                entry = shared
+                tier = "redis_hits"
+                self._put_local(key, entry)
+                set_current_nav_index(entry.index)
+
+        if entry is not None:
+            age = entry.age()
+
+            if age < self.ttl:
+                self.counters[tier] += 1
+                return entry.index
+
+            if age < self.ttl + self.stale_ttl:
+                self.counters["stale_hits"] += 1
+                self._schedule_refresh(key, loader)
+                return entry.index
+
+        self.counters["misses"] += 1
+        return await self._load(key, loader)
+
+    # store a freshly fetched index in both tiers
+    async def put(self, key: str, index: NavIndex, fetched_at: Optional[float] = None) -> None:
+        entry = CacheEntry(index, time.time() if fetched_at is None else fetched_at)
+        self._put_local(key, entry)
+
+        if self._redis is None:
+            return
+
+        try:
+            data = await asyncio.to_thread(dump_nav_index, entry.index, entry.fetched_at)
+            expiry = math.ceil(self.ttl + self.stale_ttl)
+
+            # the entry goes first, a reader that sees the new fetched_at always finds the entry it belongs to
+            await self._redis.set(KEY_PREFIX + key, data, ex=expiry)
+            await self._redis.set(KEY_PREFIX + key + FETCHED_AT_SUFFIX, repr(entry.fetched_at), ex=expiry)
+        except (RedisError, OSError) as e:
+            self.counters["redis_errors"] += 1
+            logger.warning("Could not write %s to the redis nav cache: %s", key, e)
+
+    def clear(self) -> None:
+        self._local.clear()
+        self._checked_at.clear()
+
+    def stats(self) -> dict:
+        served = self.counters["local_hits"] + self.counters["redis_hits"] + self.counters["stale_hits"]
+        lookups = served + self.counters["misses"]
+
+        stats = {
+            **self.counters,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+            "entries": {
+                key: {"age_seconds": round(entry.age(), 3), "scheme_count": len(entry.index)}
+                for key, entry in self._local.items()
+            }
+        }
+
+        if self._flight is not None:
+            stats["single_flight"] = self._flight.stats()
+
+        return stats
+
+    def _put_local(self, key: str, entry: CacheEntry) -> None:
+        self._local[key] = entry
+        self._local.move_to_end(key)
+
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def _due_for_check(self, key: str) -> bool:
+        now = time.monotonic()
+
+        if now - self._checked_at.get(key, -math.inf) < self.check_interval:
+            return False
+
+        self._checked_at[key] = now
+        return True
+
+    # the shared entry when it was fetched after newer_than; only the small fetched_at key is read otherwise
+    async def _get_shared(self, key: str, newer_than: Optional[float] = None) -> Optional[CacheEntry]:
+        if self._redis is None:
+            return None
+
+        try:
+            fetched_at = await self._redis.get(KEY_PREFIX + key + FETCHED_AT_SUFFIX)
+
+            if fetched_at is None or (newer_than is not None and float(fetched_at) <= newer_than):
+                return None
+
+            data = await self._redis.get(KEY_PREFIX + key)
+        except (RedisError, OSError) as e:
+            # redis being down degrades to the local tier, it never fails the request
+            self.counters["redis_errors"] += 1
+            logger.warning("Could not read %s from the redis nav cache: %s", key, e)
+            return None
+
+        if data is None:
+            return None
+
+        return await asyncio.to_thread(load_nav_index, data)
+
+    async def _load(self, key: str, loader: Loader) -> NavIndex:
+        if self._flight is None:
+            return await self._fetch(key, loader)
+
+        # misses and refreshes racing on the same key share one fetch, workers that lose wait for the winner's entry
+        return await self._flight.do(key, partial(self._fetch, key, loader), wait_for=partial(self._get_fresh_shared, key))
+
+    async def _fetch(self, key: str, loader: Loader) -> NavIndex:
+        index = await loader()
+        await self.put(key, index)
+        return index
+
+    # the shared entry once another worker has stored a fresh one, None until then
+    async def _get_fresh_shared(self, key: str) -> Optional[NavIndex]:
+        entry = await self._get_shared(key, newer_than=time.time() - self.ttl)
+
+        if entry is None:
+            return None
+
+        self._put_local(key, entry)
+        set_current_nav_index(entry.index)
+        return entry.index
+
+    # at most one refresh per key runs in this process
+    def _schedule_refresh(self, key: str, loader: Loader) -> None:
+        task = self._refreshing.get(key)
+
+        if task is None or task.done():
+            self._refreshing[key] = asyncio.create_task(self._refresh(key, loader))
+
+    async def _refresh(self, key: str, loader: Loader) -> None:
+        try:
+            await self._load(key, loader)
+            self.counters["refreshes"] += 1
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            logger.warning("Background refresh of %s failed: %s", key, e)
@@ -0,0 +1,145 @@
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+from bisect import bisect_right
+import threading
+
+# fields with a secondary index, their values are matched case-insensitively
+FILTER_FIELDS = ("Mutual_Fund_Family", "Scheme_Type", "Scheme_Category")
+
+
+# feed payload indexed by Scheme_Code, built once and shared by routes, services and celery tasks
+class NavIndex:
+
+    def __init__(self, schemes: dict, as_of: Optional[datetime] = None):
+        self._schemes = schemes
+        self.as_of = as_of or datetime.now(timezone.utc)
+
+        # version is derived from as_of so every worker holding the same snapshot agrees on it
+        self.version = int(self.as_of.timestamp() * 1000)
+
+        # built once per snapshot by build_secondary_indexes, the lock keeps concurrent callers from building twice
+        self._sorted_codes = None
+        self._secondary = None
+        self._postings = None
+        self.field_names = None
+        self._build_lock = threading.Lock()
+
+    # build the index from the list returned by RapidAPI or stored in data.json
+    @classmethod
+    def from_payload(cls, data: Iterable[dict], as_of: Optional[datetime] = None) -> "NavIndex":
+        return cls({item["Scheme_Code"]: item for item in data}, as_of=as_of)
+
+    def __len__(self) -> int:
+        return len(self._schemes)
+
+    def __contains__(self, scheme_code) -> bool:
+        return scheme_code in self._schemes
+
+    # get a single scheme, None if the feed does not carry it
+    def get(self, scheme_code) -> Optional[dict]:
+        return self._schemes.get(scheme_code)
+
+    # get many schemes at once, codes missing from the feed are left out
+    def get_many(self, scheme_codes: Iterable) -> dict:
+        schemes = self._schemes
+        return {code: schemes[code] for code in scheme_codes if code in schemes}
+
+    def scheme_codes(self) -> List:
+        return list(self._schemes)
+
+    def items(self):
+        return self._schemes.values()
+
+    @property
+    def has_secondary_indexes(self) -> bool:
+        return self._secondary is not None
+
+    # sorted scheme codes per filter value with a set of the same codes for membership tests,
+    # plus the sorted code list used as the pagination keyset
+    def build_secondary_indexes(self) -> None:
+        with self._build_lock:
+            if self._secondary is not None:
+                return
+
+            secondary = {field: {} for field in FILTER_FIELDS}
+            field_names = set()
+            sorted_codes = sorted(self._schemes)
+
+            for code in sorted_codes:
+                item = self._schemes[code]
+                field_names.update(item)
+
+                for field in FILTER_FIELDS:
+                    value = item.get(field)
+                    if isinstance(value, str):
+                        secondary[field].setdefault(value.casefold(), []).append(code)
+
+            self._postings = {
+                field: {value: frozenset(codes) for value, codes in values.items()}
+                for field, values in secondary.items()
+            }
+            self._sorted_codes = sorted_codes
+            self.field_names = frozenset(field_names)
+            # set last, has_secondary_indexes is what readers check
+            self._secondary = secondary
+
+    # sorted codes matching every filter, answered from the secondary indexes
+    def filter_codes(self, filters: dict) -> List:
+        if not self.has_secondary_indexes:
+            self.build_secondary_indexes()
+
+        matches = [
+            (field, value.casefold())
+            for field, value in filters.items()
+            if value is not None
+        ]
+
+        if not matches:
+            return self._sorted_codes
+
+        # walk the most selective sorted list and probe the others' sets, order is kept from the sorted list
+        matches.sort(key=lambda match: len(self._postings[match[0]].get(match[1], ())))
+        field, value = matches[0]
+        codes = self._secondary[field].get(value, [])
+
+        for field, value in matches[1:]:
+            other = self._postings[field].get(value, frozenset())
+            codes = [code for code in codes if code in other]
+
+        return codes
+
+    # one page of codes after the cursor, and the cursor of the next page
+    @staticmethod
+    def page(codes: List, cursor=None, limit: int = 100):
+        start = 0 if cursor is None else bisect_right(codes, cursor)
+        page = codes[start:start + limit]
+        next_cursor = page[-1] if page and start + limit < len(codes) else None
+        return page, next_cursor
+
+    # response shape used by the fund data endpoints
+    def to_fund_details(self) -> dict:
+        return {
+            "scheme_codes": self.scheme_codes(),
+            "fund_details": {
+                code: {k: v for k, v in item.items() if k != "Scheme_Code"}
+                for code, item in self._schemes.items()
+            }
+        }
+
+
+# latest index built in this process
+current_nav_index: Optional[NavIndex] = None
+
+
+def get_current_nav_index() -> Optional[NavIndex]:
+    return current_nav_index
+
+
+def set_current_nav_index(index: NavIndex) -> NavIndex:
+    global current_nav_index
+
+    # never replace a newer snapshot with an older one
+    if current_nav_index is None or index.version >= current_nav_index.version:
+        current_nav_index = index
+
+    return index
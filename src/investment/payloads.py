@@ -0,0 +1,111 @@
+from fastapi import Request, Response, status
+from typing import Optional, Tuple
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# compression levels used once per snapshot, they trade build time against bytes on every response
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+# a response body encoded once per snapshot, with pre-compressed variants and their strong etags
+class EncodedPayload:
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzip = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        self.brotli = brotli.compress(body, quality=BROTLI_QUALITY) if brotli is not None else None
+
+        # each content coding is its own representation, so each gets its own strong etag
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {
+            None: f'"{digest}"',
+            "gzip": f'"{digest}-gzip"',
+            "br": f'"{digest}-br"'
+        }
+
+    @classmethod
+    def from_data(cls, data) -> "EncodedPayload":
+        # same bytes JSONResponse would produce, only encoded once
+        return cls(json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8"))
+
+    # pick the smallest variant the client accepts
+    def select(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        accepted = parse_accept_encoding(accept_encoding)
+
+        if self.brotli is not None and accepted.get("br", accepted.get("*", 0)) > 0:
+            return self.brotli, "br"
+
+        if accepted.get("gzip", accepted.get("*", 0)) > 0:
+            return self.gzip, "gzip"
+
+        return self.body, None
+
+    def stats(self) -> dict:
+        return {
+            "bytes": len(self.body),
+            "gzip_bytes": len(self.gzip),
+            "br_bytes": len(self.brotli) if self.brotli is not None else None,
+            "etag": self.etags[None]
+        }
+
+
+# coding -> q value, codings with q=0 are refused
+def parse_accept_encoding(header: str) -> dict:
+    accepted = {}
+
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+
+        if not coding:
+            continue
+
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+
+        accepted[coding] = quality
+
+    return accepted
+
+
+def etag_matches(if_none_match: Optional[str], payload: EncodedPayload) -> bool:
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    # weak comparison, as If-None-Match requires
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return not tags.isdisjoint(payload.etags.values())
+
+
+# serve the cached bytes, or 304 when the client already holds them
+def payload_response(payload: EncodedPayload, request: Request) -> Response:
+    body, coding = payload.select(request.headers.get("accept-encoding", ""))
+
+    headers = {
+        "ETag": payload.etags[coding],
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache"
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), payload):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,207 @@
+from src.config import config_obj
+from src.errors import ProviderUnavailable, QuotaExceeded
+from src.db.redis_db import provider_quota_store
+from redis.exceptions import RedisError
+from datetime import datetime, timezone
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# redis keys shared by every api and celery worker that calls the provider
+KEY_PREFIX = "provider-quota:"
+
+DAY_KEY_TTL = 2 * 24 * 3600
+MONTH_KEY_TTL = 32 * 24 * 3600
+
+# provider headers worth keeping, rapidapi reports what is left of the plan on every response
+REPORTED_HEADERS = {
+    "x-ratelimit-requests-limit": "limit",
+    "x-ratelimit-requests-remaining": "remaining",
+    "x-ratelimit-requests-reset": "reset"
+}
+
+# refill the bucket from redis time, then take one token and count it against the day and the month
+# returns {status, wait_ms, day_used, month_used}: 1 granted, 0 wait, -1 daily quota spent, -2 monthly quota spent
+TAKE_TOKEN_SCRIPT = """
+local now = redis.call("TIME")
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local daily_limit = tonumber(ARGV[3])
+local monthly_limit = tonumber(ARGV[4])
+
+local day_used = tonumber(redis.call("GET", KEYS[2]) or "0")
+local month_used = tonumber(redis.call("GET", KEYS[3]) or "0")
+
+if daily_limit > 0 and day_used >= daily_limit then
+    return {-1, 0, day_used, month_used}
+end
+if monthly_limit > 0 and month_used >= monthly_limit then
+    return {-2, 0, day_used, month_used}
+end
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now_ms
+tokens = math.min(burst, tokens + math.max(0, now_ms - ts) * rate / 1000)
+
+if tokens < 1 then
+    return {0, math.ceil((1 - tokens) * 1000 / rate), day_used, month_used}
+end
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens - 1), "ts", now_ms)
+redis.call("PEXPIRE", KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+
+day_used = redis.call("INCR", KEYS[2])
+if day_used == 1 then
+    redis.call("EXPIRE", KEYS[2], ARGV[5])
+end
+month_used = redis.call("INCR", KEYS[3])
+if month_used == 1 then
+    redis.call("EXPIRE", KEYS[3], ARGV[6])
+end
+
+return {1, 0, day_used, month_used}
+"""
+
+
+# token bucket in redis gating every outbound provider request, with daily and monthly request quotas
+class ProviderRateLimiter:
+
+    def __init__(self, redis=None, name: str = "rapidapi", rate: float = None, burst: int = None,
+                 daily_quota: int = None, monthly_quota: int = None, max_wait: float = None):
+        self._redis = redis
+        self.name = name
+        self.rate = config_obj.NAV_PROVIDER_RATE_PER_SECOND if rate is None else rate
+        self.burst = config_obj.NAV_PROVIDER_BURST if burst is None else burst
+        self.daily_quota = config_obj.NAV_PROVIDER_DAILY_QUOTA if daily_quota is None else daily_quota
+        self.monthly_quota = config_obj.NAV_PROVIDER_MONTHLY_QUOTA if monthly_quota is None else monthly_quota
+        self.max_wait = config_obj.NAV_PROVIDER_ACQUIRE_TIMEOUT if max_wait is None else max_wait
+
+        # the bucket refills at rate tokens a second and the wait for the next one is divided by it
+        if self.rate <= 0 or self.burst < 1:
+            raise ValueError(f"provider rate limiter {name} needs a rate above 0 and a burst of at least 1")
+
+        self.counters = {
+            "granted": 0,
+            "throttled": 0,
+            "quota_rejections": 0,
+            "redis_errors": 0
+        }
+
+    # quota periods follow the provider's billing clock, utc
+    def keys(self, now: datetime = None) -> tuple:
+        now = now or datetime.now(timezone.utc)
+        prefix = f"{KEY_PREFIX}{self.name}:"
+
+        return (
+            f"{prefix}bucket",
+            f"{prefix}day:{now:%Y-%m-%d}",
+            f"{prefix}month:{now:%Y-%m}"
+        )
+
+    # wait for a token; a spent quota raises QuotaExceeded, a wait longer than max_wait sheds the call
+    async def acquire(self) -> None:
+        if self._redis is None:
+            return
+
+        deadline = time.monotonic() + self.max_wait
+
+        while True:
+            try:
+                status, wait_ms, day_used, month_used = await self._redis.eval(
+                    TAKE_TOKEN_SCRIPT, 3, *self.keys(),
+                    self.rate, self.burst, self.daily_quota, self.monthly_quota, DAY_KEY_TTL, MONTH_KEY_TTL
+                )
+            except (RedisError, OSError) as e:
+                # without redis nothing can be counted, so calls go out rather than the app going down with it
+                self.counters["redis_errors"] += 1
+                logger.warning("provider rate limiter unavailable, letting the call through: %s", e)
+                return
+
+            if status == 1:
+                self.counters["granted"] += 1
+                return
+
+            if status < 0:
+                self.counters["quota_rejections"] += 1
+                logger.warning("provider %s quota spent (day %s/%s, month %s/%s)",
+                               "daily" if status == -1 else "monthly", day_used, self.daily_quota, month_used, self.monthly_quota)
+                raise QuotaExceeded()
+
+            self.counters["throttled"] += 1
+            delay = wait_ms / 1000
+
+            if time.monotonic() + delay > deadline:
+                raise ProviderUnavailable()
+
+            # a little jitter so workers waiting on the same refill do not all retry in the same millisecond
+            await asyncio.sleep(delay + random.uniform(0, delay / 10))
+
+    # keep what the provider says is left, it also counts calls made outside this app
+    async def record_response(self, headers) -> None:
+        if self._redis is None:
+            return
+
+        reported = {field: headers[header] for header, field in REPORTED_HEADERS.items() if header in headers}
+        if not reported:
+            return
+
+        reported["at"] = datetime.now(timezone.utc).isoformat()
+
+        try:
+            await self._redis.hset(f"{KEY_PREFIX}{self.name}:reported", mapping=reported)
+        except (RedisError, OSError) as e:
+            self.counters["redis_errors"] += 1
+            logger.warning("could not record provider quota headers: %s", e)
+
+    # remaining budget for the quota endpoint
+    async def quota(self) -> dict:
+        bucket_key, day_key, month_key = self.keys()
+        report = {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            **self.counters
+        }
+
+        if self._redis is None:
+            return report
+
+        try:
+            day_used, month_used = await self._redis.mget(day_key, month_key)
+            tokens, ts = await self._redis.hmget(bucket_key, "tokens", "ts")
+            reported = await self._redis.hgetall(f"{KEY_PREFIX}{self.name}:reported")
+        except (RedisError, OSError) as e:
+            self.counters["redis_errors"] += 1
+            logger.warning("could not read provider quota counters: %s", e)
+            return {**report, "available": False}
+
+        # the bucket is only written when a token is taken, refill it up to now for the report
+        tokens = float(self.burst) if tokens is None else min(self.burst, float(tokens) + max(0.0, time.time() * 1000 - float(ts)) * self.rate / 1000)
+
+        return {
+            **report,
+            "available": True,
+            "tokens": round(tokens, 3),
+            "day": quota_usage(day_used, self.daily_quota),
+            "month": quota_usage(month_used, self.monthly_quota),
+            "provider_reported": reported
+        }
+
+
+# a limit of zero means the period is not capped
+def quota_usage(used, limit: int) -> dict:
+    used = int(used or 0)
+
+    return {
+        "used": used,
+        "limit": limit or None,
+        "remaining": max(0, limit - used) if limit else None
+    }
+
+
+# the rapidapi plan is shared by every worker, so is its bucket
+nav_rate_limiter = ProviderRateLimiter(redis=provider_quota_store)
@@ -0,0 +1,266 @@
+from src.config import config_obj
+from src.errors import ProviderUnavailable, QuotaExceeded
+from src.investment.quota import ProviderRateLimiter, nav_rate_limiter
+import asyncio
+import httpx
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# upstream statuses worth another attempt, anything else is an answer and is returned to the caller
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+# a non 200 answer from the provider, retried only when the status says the provider may recover
+class ProviderStatusError(Exception):
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"provider returned {status_code}")
+        self.status_code = status_code
+        self.detail = detail
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in RETRY_STATUS_CODES
+
+
+# timeouts, refused connections and 429/5xx answers are failures of the provider, not of the request
+def is_provider_failure(exc: BaseException) -> bool:
+    if isinstance(exc, ProviderStatusError):
+        return exc.retryable
+    return isinstance(exc, httpx.TransportError)
+
+
+# opens after consecutive provider failures, then lets a single probe through once the cool down is over
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+        self.counters = {
+            "opened": 0,
+            "rejected": 0
+        }
+
+    # whether a call may go out now, a half open breaker admits only the probe
+    def allow(self) -> bool:
+        if self.state == OPEN and self._clock() - self.opened_at >= self.recovery_timeout:
+            self.state = HALF_OPEN
+
+        if self.state == CLOSED:
+            return True
+
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.counters["rejected"] += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info("nav provider recovered, closing the circuit")
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.counters["opened"] += 1
+                logger.warning("nav provider failed %d times in a row, opening the circuit for %.0fs",
+                               self.consecutive_failures, self.recovery_timeout)
+
+            self.state = OPEN
+            self.opened_at = self._clock()
+
+    # a probe that ended without a verdict, e.g. cancelled, frees the slot for the next one
+    def release_probe(self) -> None:
+        self._probe_in_flight = False
+
+    @property
+    def retry_after(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (self._clock() - self.opened_at))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_after": round(self.retry_after, 3),
+            **self.counters
+        }
+
+
+# every call to the nav provider goes through here: bounded concurrency, jittered retries and the breaker
+class ProviderClient:
+
+    def __init__(self, max_concurrency: int = None, max_pending: int = None, acquire_timeout: float = None,
+                 max_attempts: int = None, backoff_base: float = None, backoff_max: float = None,
+                 breaker: CircuitBreaker = None, limiter: ProviderRateLimiter = None):
+        self.max_concurrency = config_obj.NAV_PROVIDER_MAX_CONCURRENCY if max_concurrency is None else max_concurrency
+        self.max_pending = config_obj.NAV_PROVIDER_MAX_PENDING if max_pending is None else max_pending
+        self.acquire_timeout = config_obj.NAV_PROVIDER_ACQUIRE_TIMEOUT if acquire_timeout is None else acquire_timeout
+        self.max_attempts = config_obj.NAV_PROVIDER_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.backoff_base = config_obj.NAV_PROVIDER_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = config_obj.NAV_PROVIDER_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=config_obj.NAV_PROVIDER_FAILURE_THRESHOLD,
+            recovery_timeout=config_obj.NAV_PROVIDER_RECOVERY_TIMEOUT
+        )
+
+        self.limiter = limiter
+
+        # a semaphore belongs to the loop that first waits on it, celery tasks run on fresh loops
+        self._semaphore = None
+        self._semaphore_loop = None
+
+        self.in_flight = 0
+        self.waiting = 0
+
+        self.counters = {
+            "calls": 0,
+            "attempts": 0,
+            "retries": 0,
+            "successes": 0,
+            "failures": 0,
+            "rejected_open": 0,
+            "rejected_busy": 0
+        }
+
+    # run attempt() until it succeeds, fails for good or the breaker opens; attempt makes one request
+    async def call(self, attempt):
+        self.counters["calls"] += 1
+
+        for attempt_number in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                self.counters["rejected_open"] += 1
+                raise ProviderUnavailable()
+
+            try:
+                # every attempt spends a token, retries included, since the provider bills each one;
+                # taken before the slot so a throttled call does not keep a slot from the others while it waits
+                if self.limiter is not None:
+                    await self.limiter.acquire()
+
+                async with self._slot():
+                    self.counters["attempts"] += 1
+                    result = await attempt()
+            except (ProviderUnavailable, QuotaExceeded):
+                self.breaker.release_probe()
+                raise
+            except Exception as exc:
+                if not is_provider_failure(exc):
+                    # the provider answered, the request itself was refused
+                    self.breaker.record_success()
+                    raise
+
+                self.breaker.record_failure()
+                logger.warning("nav provider attempt %d/%d failed: %r", attempt_number, self.max_attempts, exc)
+
+                if attempt_number == self.max_attempts or self.breaker.state == OPEN:
+                    self.counters["failures"] += 1
+                    raise ProviderUnavailable() from exc
+
+                self.counters["retries"] += 1
+                await asyncio.sleep(self.backoff(attempt_number))
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            self.counters["successes"] += 1
+            return result
+
+    # pass the provider's own quota headers to the limiter
+    async def record_response(self, headers) -> None:
+        if self.limiter is not None:
+            await self.limiter.record_response(headers)
+
+    # full jitter, so workers that failed together do not retry together
+    def backoff(self, attempt_number: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt_number - 1)))
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+
+        return self._semaphore
+
+    def _slot(self):
+        return _ProviderSlot(self)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            **self.counters,
+            "circuit": self.breaker.stats()
+        }
+
+
+# one of the provider's concurrency slots, callers beyond max_pending or past acquire_timeout are shed
+class _ProviderSlot:
+
+    def __init__(self, client: ProviderClient):
+        self._client = client
+        self._semaphore = None
+
+    async def __aenter__(self):
+        client = self._client
+        self._semaphore = client._get_semaphore()
+
+        # a free slot is taken without suspending, only callers that would queue count as waiting
+        if self._semaphore.locked():
+            if client.waiting >= client.max_pending:
+                client.counters["rejected_busy"] += 1
+                raise ProviderUnavailable()
+
+            client.waiting += 1
+
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), client.acquire_timeout)
+            except asyncio.TimeoutError:
+                client.counters["rejected_busy"] += 1
+                raise ProviderUnavailable()
+            finally:
+                client.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        client.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._client.in_flight -= 1
+        self._semaphore.release()
+        return False
+
+
+# the process wide nav provider client
+nav_provider = ProviderClient(limiter=nav_rate_limiter)
@@ -0,0 +1,387 @@
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import text, insert
+from src.db.models import NavStaging
+from src.investment.nav_index import NavIndex
+from src.investment.valuation import get_nav_columns
+from src.config import config_obj
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+import time
+import uuid
+
+# columns copied into nav_staging, in record order
+STAGING_COLUMNS = ['run_id', 'scheme_code', 'nav', 'nav_date']
+
+# keyset bounds, generated investment ids are never the nil uuid
+FIRST_INVESTMENT_ID = uuid.UUID(int=0)
+LAST_INVESTMENT_ID = uuid.UUID(int=2 ** 128 - 1)
+
+# flag staged schemes whose (nav, date) is the one already applied to their holdings
+MARK_UNCHANGED_SCHEMES = text("""
+    UPDATE nav_staging AS s
+    SET changed = false
+    FROM scheme_navs AS n
+    WHERE s.run_id = :run_id
+      AND n.scheme_code = s.scheme_code
+      AND n.nav = s.nav
+      AND n.nav_date = s.nav_date
+""")
+
+# a holding is stale when its stored nav, date or value differ from what the staged row gives it
+# holdings of unchanged schemes are checked as well, their values may have been written by a client
+STALE_HOLDING = """
+    (i.nav IS DISTINCT FROM round(s.nav::numeric, 4)::double precision
+     OR i.date IS DISTINCT FROM s.nav_date
+     OR i.current_value IS DISTINCT FROM round((i.units * s.nav)::numeric, 4)::double precision)
+"""
+
+# set based revaluation of the next chunk of stale holdings, walked by investment_id within a shard
+# corrected_user_ids are the owners of stale holdings in unchanged schemes, their summaries are rebuilt as well
+REVALUE_INVESTMENTS_CHUNK = text(f"""
+    WITH chunk AS (
+        SELECT i.investment_id
+        FROM investments AS i
+        JOIN nav_staging AS s
+          ON s.run_id = :run_id AND s.scheme_code = i.scheme_code
+        WHERE i.investment_id > :after_id
+          AND i.investment_id <= :until_id
+          AND {STALE_HOLDING}
+        ORDER BY i.investment_id
+        LIMIT :chunk_size
+    ), updated AS (
+        UPDATE investments AS i
+        SET nav = round(s.nav::numeric, 4)::double precision,
+            date = s.nav_date,
+            current_value = round((i.units * s.nav)::numeric, 4)::double precision,
+            updated_at = now()
+        FROM chunk AS c, nav_staging AS s
+        WHERE i.investment_id = c.investment_id
+          AND s.run_id = :run_id
+          AND s.scheme_code = i.scheme_code
+        RETURNING i.user_id, s.changed
+    )
+    SELECT
+        (SELECT investment_id FROM chunk ORDER BY investment_id DESC LIMIT 1) AS last_id,
+        (SELECT count(*) FROM chunk) AS scanned,
+        (SELECT count(*) FROM updated) AS updated,
+        (SELECT array_agg(DISTINCT user_id) FROM updated WHERE NOT changed) AS corrected_user_ids
+""")
+
+# schemes held by someone but missing from the staged snapshot
+MISSING_SCHEME_CODES = text("""
+    SELECT DISTINCT i.scheme_code
+    FROM investments AS i
+    WHERE NOT EXISTS (
+        SELECT 1 FROM nav_staging AS s
+        WHERE s.run_id = :run_id AND s.scheme_code = i.scheme_code
+    )
+    ORDER BY i.scheme_code
+""")
+
+# provider dates look like 24-Feb-2025, only schemes whose date parses are staged
+NAV_DATE_FORMAT = "%d-%b-%Y"
+
+# append the changed schemes to the nav time series
+APPEND_NAV_HISTORY = text("""
+    INSERT INTO nav_history (scheme_code, nav_date, nav)
+    SELECT scheme_code, to_date(nav_date, 'DD-Mon-YYYY'), nav
+    FROM nav_staging
+    WHERE run_id = :run_id
+      AND changed
+    ON CONFLICT (scheme_code, nav_date) DO UPDATE
+    SET nav = EXCLUDED.nav
+""")
+
+# users holding a scheme whose nav changed in this run, and the owners of stale holdings the shards corrected
+AFFECTED_USERS = """
+    SELECT h.user_id
+    FROM investments AS h
+    JOIN nav_staging AS s
+      ON s.run_id = :run_id AND s.scheme_code = h.scheme_code AND s.changed
+    UNION
+    SELECT unnest(CAST(:corrected_user_ids AS uuid[]))
+"""
+
+# give every affected user a summary row, so the lock below covers users without one as well
+CREATE_MISSING_SUMMARIES = text(f"""
+    INSERT INTO portfolio_summary (user_id, total_value, holding_count, family_exposure, updated_at)
+    SELECT user_id, 0, 0, '{{}}'::jsonb, now()
+    FROM ({AFFECTED_USERS}) AS affected
+    ORDER BY user_id
+    ON CONFLICT (user_id) DO NOTHING
+""")
+
+# hold the affected summaries until commit, investment writes apply their deltas after the rebuild instead of being overwritten by it
+LOCK_PORTFOLIO_SUMMARIES = text(f"""
+    SELECT user_id
+    FROM portfolio_summary
+    WHERE user_id IN ({AFFECTED_USERS})
+    ORDER BY user_id
+    FOR UPDATE
+""")
+
+# rebuild the portfolio summary of every affected user, from their holdings
+# runs as its own statement after the lock, so it reads every investment committed before the lock was granted
+REFRESH_PORTFOLIO_SUMMARIES = text(f"""
+    INSERT INTO portfolio_summary (user_id, total_value, holding_count, family_exposure, updated_at)
+    SELECT f.user_id,
+           round(sum(f.value), 4)::double precision,
+           sum(f.holdings)::integer,
+           jsonb_object_agg(f.fund_family, jsonb_build_object('value', round(f.value, 4), 'holdings', f.holdings)),
+           now()
+    FROM (
+        SELECT i.user_id, i.fund_family, sum(i.current_value::numeric) AS value, count(*) AS holdings
+        FROM investments AS i
+        WHERE i.user_id IN ({AFFECTED_USERS})
+        GROUP BY i.user_id, i.fund_family
+    ) AS f
+    GROUP BY f.user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_value = EXCLUDED.total_value,
+        holding_count = EXCLUDED.holding_count,
+        family_exposure = EXCLUDED.family_exposure,
+        updated_at = EXCLUDED.updated_at
+""")
+
+# remember what was applied, only after every chunk went through so a failed run is retried
+RECORD_APPLIED_NAVS = text("""
+    INSERT INTO scheme_navs (scheme_code, nav, nav_date, updated_at)
+    SELECT scheme_code, nav, nav_date, now()
+    FROM nav_staging
+    WHERE run_id = :run_id AND changed
+    ON CONFLICT (scheme_code) DO UPDATE
+    SET nav = EXCLUDED.nav,
+        nav_date = EXCLUDED.nav_date,
+        updated_at = EXCLUDED.updated_at
+""")
+
+CLEAR_STAGING = text("DELETE FROM nav_staging WHERE run_id = :run_id")
+
+# fresh statistics for the rows just copied in, without them the chunk query joins every staged scheme and sorts
+ANALYZE_STAGING = text("ANALYZE nav_staging")
+
+
+def is_nav_date(value: str) -> bool:
+    try:
+        datetime.strptime(value, NAV_DATE_FORMAT)
+    except (TypeError, ValueError):
+        return False
+
+    return True
+
+
+# rows for nav_staging from the columnar snapshot, which already left out schemes without a numeric nav
+# schemes with a date that does not parse are left out as well, one bad date must not fail the history append
+def nav_staging_records(index: NavIndex, run_id: uuid.UUID) -> List[tuple]:
+    columns = get_nav_columns(index)
+
+    # the feed repeats a handful of dates across every scheme, each one is parsed once
+    valid_dates = {}
+
+    records = []
+    for code, nav, nav_date in zip(columns.codes.tolist(), columns.navs.tolist(), columns.dates.tolist()):
+        valid = valid_dates.get(nav_date)
+
+        if valid is None:
+            valid = valid_dates[nav_date] = is_nav_date(nav_date)
+
+        if valid:
+            records.append((run_id, code, nav, nav_date))
+
+    return records
+
+
+# load the snapshot into nav_staging, with COPY when the driver supports it
+async def stage_nav_snapshot(session: AsyncSession, index: NavIndex, run_id: uuid.UUID) -> int:
+    records = nav_staging_records(index, run_id)
+
+    # start the transaction first so the COPY below is part of it
+    connection = await session.connection()
+    await connection.execute(CLEAR_STAGING, {"run_id": run_id})
+
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+
+    if hasattr(driver_connection, "copy_records_to_table"):
+        await driver_connection.copy_records_to_table(
+            NavStaging.__tablename__,
+            records=records,
+            columns=STAGING_COLUMNS
+        )
+    elif records:
+        await connection.execute(
+            insert(NavStaging),
+            [dict(zip(STAGING_COLUMNS, record)) for record in records]
+        )
+
+    await connection.execute(ANALYZE_STAGING)
+
+    return len(records)
+
+
+# the slice of investment ids a shard owns, ids are random uuids so equal ranges hold about as many holdings
+def shard_bounds(shard: int, shard_count: int) -> tuple:
+    if not 0 <= shard < shard_count:
+        raise ValueError(f"shard {shard} is outside 0..{shard_count - 1}")
+
+    step = 2 ** 128 // shard_count
+    after_id = FIRST_INVESTMENT_ID if shard == 0 else uuid.UUID(int=shard * step)
+    until_id = LAST_INVESTMENT_ID if shard == shard_count - 1 else uuid.UUID(int=(shard + 1) * step)
+
+    return after_id, until_id
+
+
+# stage the snapshot under a new run id and flag the schemes whose nav did not move
+async def prepare_revaluation(session: AsyncSession, index: NavIndex, run_id: uuid.UUID = None) -> dict:
+    run_id = run_id or uuid.uuid4()
+
+    try:
+        staged_count = await stage_nav_snapshot(session, index, run_id)
+
+        # delta against the last applied snapshot, only changed schemes are rewritten
+        connection = await session.connection()
+        result = await connection.execute(MARK_UNCHANGED_SCHEMES, {"run_id": run_id})
+        unchanged_count = result.rowcount
+        await session.commit()
+    except Exception:
+        await clear_revaluation(session, run_id)
+        raise
+
+    return {
+        "run_id": str(run_id),
+        "staged": staged_count,
+        "changed_schemes": staged_count - unchanged_count,
+        "unchanged_schemes": unchanged_count
+    }
+
+
+# revalue one shard of the holdings against a staged run, committing after each chunk so locks and memory stay bounded
+# on_progress, when given, is called with the shard's running counts after every chunk
+async def revalue_shard(session: AsyncSession, run_id, shard: int = 0, shard_count: int = 1, chunk_size: int = None,
+                        on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+    chunk_size = chunk_size or config_obj.NAV_REVALUATION_CHUNK_SIZE
+    after_id, until_id = shard_bounds(shard, shard_count)
+    start_time = time.perf_counter()
+
+    counts = {
+        "shard": shard,
+        "chunks": 0,
+        "scanned": 0,
+        "updated": 0
+    }
+    corrected_user_ids = set()
+
+    while True:
+        connection = await session.connection()
+        result = await connection.execute(
+            REVALUE_INVESTMENTS_CHUNK,
+            {"run_id": run_id, "after_id": after_id, "until_id": until_id, "chunk_size": chunk_size}
+        )
+        last_id, scanned, updated, chunk_user_ids = result.one()
+        await session.commit()
+
+        if last_id is None:
+            break
+
+        counts["chunks"] += 1
+        counts["scanned"] += scanned
+        counts["updated"] += updated
+        corrected_user_ids.update(str(user_id) for user_id in chunk_user_ids or ())
+        after_id = last_id
+
+        if on_progress is not None:
+            on_progress(dict(counts))
+
+        # a short chunk means the end of the shard
+        if scanned < chunk_size:
+            break
+
+    return {
+        **counts,
+        "corrected_user_ids": sorted(corrected_user_ids),
+        "elapsed_seconds": round(time.perf_counter() - start_time, 4)
+    }
+
+
+# once every shard went through: nav history, portfolio summaries and the applied navs, then drop the staged rows
+# corrected_user_ids come from the shards, owners of stale holdings outside the changed schemes
+async def finalize_revaluation(session: AsyncSession, run_id, corrected_user_ids: Iterable[str] = ()) -> dict:
+    affected = {"run_id": run_id, "corrected_user_ids": [uuid.UUID(str(user_id)) for user_id in corrected_user_ids]}
+
+    try:
+        connection = await session.connection()
+        result = await connection.execute(APPEND_NAV_HISTORY, {"run_id": run_id})
+        history_count = result.rowcount
+        await connection.execute(CREATE_MISSING_SUMMARIES, affected)
+        await connection.execute(LOCK_PORTFOLIO_SUMMARIES, affected)
+        result = await connection.execute(REFRESH_PORTFOLIO_SUMMARIES, affected)
+        summary_count = result.rowcount
+        await connection.execute(RECORD_APPLIED_NAVS, {"run_id": run_id})
+        await session.commit()
+
+        connection = await session.connection()
+        result = await connection.execute(MISSING_SCHEME_CODES, {"run_id": run_id})
+        missing_scheme_codes = list(result.scalars().all())
+    finally:
+        await clear_revaluation(session, run_id)
+
+    return {
+        "history_rows": history_count,
+        "summaries_refreshed": summary_count,
+        "missing_scheme_codes": missing_scheme_codes
+    }
+
+
+# staged rows outlive the chunk commits, so a failed run clears them as well
+async def clear_revaluation(session: AsyncSession, run_id) -> None:
+    await session.rollback()
+    connection = await session.connection()
+    await connection.execute(CLEAR_STAGING, {"run_id": run_id})
+    await session.commit()
+
+
+# the whole pipeline in one process: stage, revalue every holding as a single shard, finalize
+# on_progress, when given, is called with the running counts after staging and after every chunk
+async def revalue_investments(session: AsyncSession, index: NavIndex, chunk_size: int = None, on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+    chunk_size = chunk_size or config_obj.NAV_REVALUATION_CHUNK_SIZE
+    prepared = await prepare_revaluation(session, index)
+    run_id = uuid.UUID(prepared["run_id"])
+
+    def report(stage: str, counts: dict) -> None:
+        if on_progress is not None:
+            on_progress({
+                "stage": stage,
+                "run_id": prepared["run_id"],
+                "staged": prepared["staged"],
+                "changed_schemes": prepared["changed_schemes"],
+                "chunks": counts["chunks"],
+                "scanned": counts["scanned"],
+                "updated": counts["updated"]
+            })
+
+    counts = {"chunks": 0, "scanned": 0, "updated": 0}
+    report("staged", counts)
+
+    try:
+        # walked even when no scheme moved, holdings written with stale values are corrected too
+        counts = await revalue_shard(
+            session, run_id, chunk_size=chunk_size,
+            on_progress=lambda shard_counts: report("revaluing", shard_counts)
+        )
+
+        report("recording", counts)
+    except Exception:
+        await clear_revaluation(session, run_id)
+        raise
+
+    finalized = await finalize_revaluation(session, run_id, counts["corrected_user_ids"])
+
+    return {
+        **prepared,
+        "scanned": counts["scanned"],
+        "updated": counts["updated"],
+        "corrected_users": len(counts["corrected_user_ids"]),
+        "chunks": counts["chunks"],
+        "chunk_size": chunk_size,
+        **finalized
+    }
@@ -1,12 +1,15 @@
 from src.investment.services import InvestmentService
 from sqlmodel.ext.asyncio.session import AsyncSession
 from src.db.main import get_session
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Depends, Request, Response, Query
 from src.investment.schemas import InvestmentUpdateSchema, InvestmentCreateSchema, InvestmentViewSchema, \
-    InvestmentDeleteSchema, InvestmentGetSchema
+    InvestmentDeleteSchema, InvestmentGetSchema, NavHistorySchema, FundCatalogueSchema, \
+    FundSearchSchema, PortfolioValuationSchema, PortfolioSummarySchema
 from src.auth.dependencies import AccessTokenBearer
-from typing import List
-from src.errors import InvestmentNotFound, SchemeCodeAlreadyExists
+from typing import List, Optional
+from datetime import date, timedelta
+from src.errors import InvestmentNotFound, SchemeCodeAlreadyExists, InvalidDateRange, InvalidCatalogueField
+from src.investment.payloads import payload_response
 
 
 # create a router
@@ -80,13 +83,93 @@ async def update_all_navs_hourly(session: AsyncSession = Depends(get_session)):
     return is_update_done
 
 
+# list the user's holdings, /me only carries their totals
+@investment_router.get('', response_model=List[InvestmentViewSchema], status_code=status.HTTP_200_OK)
+async def get_all_investments(session: AsyncSession = Depends(get_session), token_details: dict = Depends(access_token_bearer)) -> list:
+    user_id = token_details.get('user')['user_id']
+
+    return await investment_service.get_investments_by_user_id(user_id, session)
+
+
+# the user's stored totals, one row read however many holdings there are
+@investment_router.get('/portfolio/summary', response_model=PortfolioSummarySchema, status_code=status.HTTP_200_OK)
+async def get_portfolio_summary(session: AsyncSession = Depends(get_session), token_details: dict = Depends(access_token_bearer)):
+    user_id = token_details.get('user')['user_id']
+
+    summary = await investment_service.get_portfolio_summary(user_id, session)
+
+    # users without investments have no row yet
+    return summary if summary is not None else PortfolioSummarySchema()
+
+
+# live value of the user's holdings at the latest nav
+@investment_router.get('/portfolio/valuation', response_model=PortfolioValuationSchema, status_code=status.HTTP_200_OK)
+async def get_portfolio_valuation(session: AsyncSession = Depends(get_session), token_details: dict = Depends(access_token_bearer)) -> dict:
+    user_id = token_details.get('user')['user_id']
+
+    return await investment_service.get_portfolio_valuation(user_id, session)
+
+
+# get the nav series of a scheme over a date range, defaults to the last year
+@investment_router.get('/nav-history/{scheme_code}', response_model=NavHistorySchema, status_code=status.HTTP_200_OK)
+async def get_nav_history(scheme_code: int, start_date: Optional[date] = None, end_date: Optional[date] = None, session: AsyncSession = Depends(get_session), token_details: dict = Depends(access_token_bearer)) -> dict:
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=365)
+
+    if start_date > end_date:
+        raise InvalidDateRange()
+
+    navs = await investment_service.get_nav_history(scheme_code, start_date, end_date, session)
+
+    return {
+        "scheme_code": scheme_code,
+        "start_date": start_date,
+        "end_date": end_date,
+        "navs": [{"nav_date": nav_date, "nav": nav} for nav_date, nav in navs]
+    }
+
+
+# browse the fund catalogue a page at a time, cursor is the last Scheme_Code of the previous page
+@investment_router.get('/catalogue', response_model=FundCatalogueSchema, status_code=status.HTTP_200_OK)
+async def get_fund_catalogue(
+        fund_family: Optional[str] = None,
+        scheme_type: Optional[str] = None,
+        scheme_category: Optional[str] = None,
+        fields: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: int = Query(default=100, ge=1, le=1000),
+        token_details: dict = Depends(access_token_bearer)) -> dict:
+    filters = {
+        "Mutual_Fund_Family": fund_family,
+        "Scheme_Type": scheme_type,
+        "Scheme_Category": scheme_category
+    }
+
+    # comma separated projection, Scheme_Code is always returned
+    selected_fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+
+    catalogue = await investment_service.get_fund_catalogue(filters, cursor, limit, selected_fields)
+
+    if catalogue is None:
+        raise InvalidCatalogueField()
+
+    return catalogue
+
+
+# search funds by name or family, the last word is matched as a prefix for autocomplete
+@investment_router.get('/search', response_model=FundSearchSchema, status_code=status.HTTP_200_OK)
+async def search_funds(q: str = Query(min_length=1, max_length=100), limit: int = Query(default=10, ge=1, le=50), token_details: dict = Depends(access_token_bearer)) -> dict:
+    return await investment_service.search_funds(q, limit)
+
+
+# the fund data is encoded once per snapshot, responses reuse those bytes and honour If-None-Match
 @investment_router.get('/get-json-data-RapidAPI', status_code=status.HTTP_200_OK)
-async def get_RapidAPI_data_from_API(token_details: dict = Depends(access_token_bearer)):
-    data = await investment_service.get_data_from_RapidAPI()
-    return data
+async def get_RapidAPI_data_from_API(request: Request, token_details: dict = Depends(access_token_bearer)) -> Response:
+    payload = await investment_service.get_data_from_RapidAPI()
+    return payload_response(payload, request)
 
 
 @investment_router.get('/get-json-data-file', status_code=status.HTTP_200_OK)
-async def get_RapidAPI_data_from_file(token_details: dict = Depends(access_token_bearer)):
-    data = await investment_service.get_data_from_file()
-    return data
\ No newline at end of file
+async def get_RapidAPI_data_from_file(request: Request, token_details: dict = Depends(access_token_bearer)) -> Response:
+    payload = await investment_service.get_data_from_file()
+    return payload_response(payload, request)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 import uuid
-from typing import List
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
 # schema for viewing the investment
 class InvestmentViewSchema(BaseModel):
@@ -35,4 +36,69 @@ class InvestmentDeleteSchema(BaseModel):
 
 
 class InvestmentGetSchema(BaseModel):
-    scheme_code: int
\ No newline at end of file
+    scheme_code: int
+
+
+# schema for one point of a nav series
+class NavHistoryPointSchema(BaseModel):
+    nav_date: date
+    nav: float
+
+# schema for a scheme's nav series over a date range
+class NavHistorySchema(BaseModel):
+    scheme_code: int
+    start_date: date
+    end_date: date
+    navs: List[NavHistoryPointSchema]
+
+
+# schema for one page of the fund catalogue
+class FundCatalogueSchema(BaseModel):
+    snapshot_version: int
+    total: int
+    next_cursor: Optional[int]
+    items: List[dict]
+
+
+# schema for one fund search match
+class FundSearchResultSchema(BaseModel):
+    scheme_code: int
+    scheme_name: str
+    fund_family: str
+    nav: Optional[float]
+    date: Optional[str]
+
+# schema for fund search results
+class FundSearchSchema(BaseModel):
+    query: str
+    snapshot_version: int
+    results: List[FundSearchResultSchema]
+
+
+# schema for one holding valued against the latest snapshot
+class HoldingValuationSchema(BaseModel):
+    scheme_code: int
+    units: float
+    nav: Optional[float]
+    current_value: Optional[float]
+
+# schema for a user's portfolio valued against the latest snapshot
+class PortfolioValuationSchema(BaseModel):
+    snapshot_version: Optional[int]
+    holding_count: int
+    total_value: float
+    missing_scheme_codes: List[int]
+    holdings: List[HoldingValuationSchema]
+
+
+# schema for a user's holdings in one fund family
+class FamilyExposureSchema(BaseModel):
+    value: float
+    holdings: int
+
+# schema for a user's stored portfolio totals
+class PortfolioSummarySchema(BaseModel):
+    total_value: float = 0.0
+    holding_count: int = 0
+    family_exposure: Dict[str, FamilyExposureSchema] = {}
+    updated_at: Optional[datetime] = None
@@ -0,0 +1,331 @@
+from src.investment.nav_index import NavIndex
+from collections import OrderedDict
+from typing import List, Optional
+import asyncio
+import heapq
+import re
+
+# searchable words are runs of letters and digits, matched case-insensitively
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+
+# ranked results kept per query until the index changes
+RESULT_CACHE_SIZE = 1024
+
+# beyond this many changed schemes a fresh build is cheaper than patching the index
+REBUILD_THRESHOLD = 5000
+
+# match sets larger than this share of the index are ranked by scanning the static order instead of sorting
+SCAN_FRACTION = 0.02
+
+
+def tokenize(text) -> List[str]:
+    if not isinstance(text, str):
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchDoc:
+    __slots__ = ("name", "family", "tokens")
+
+    def __init__(self, name: str, family: str):
+        self.name = name
+        self.family = family
+        self.tokens = frozenset(tokenize(name)) | frozenset(tokenize(family))
+
+
+class TrieNode:
+    __slots__ = ("children", "terminal", "codes")
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+
+        # union of the postings below this node, filled on first use and dropped when they shrink
+        self.codes = None
+
+
+# token inverted index over Scheme_Name and Mutual_Fund_Family with a prefix trie for the word being typed
+class FundSearchIndex:
+
+    def __init__(self):
+        self.version = None
+        self._docs = {}
+        self._postings = {}
+        self._paths = {}
+        self._root = TrieNode()
+        self._results = OrderedDict()
+
+        # static order, shorter names first, rebuilt lazily after the index changes
+        self._ranked = None
+        self._rank_of = None
+
+        # held while a refresh diffs or patches this index, so two snapshot versions never update it at once
+        self.refresh_lock = asyncio.Lock()
+
+    @classmethod
+    def from_nav_index(cls, index: NavIndex) -> "FundSearchIndex":
+        search_index = cls()
+        docs, postings = search_index._docs, search_index._postings
+
+        # bulk load, postings first and then one trie insert per distinct word
+        for item in index.items():
+            code = item["Scheme_Code"]
+            doc = docs[code] = SearchDoc(item.get("Scheme_Name") or "", item.get("Mutual_Fund_Family") or "")
+
+            for token in doc.tokens:
+                posting = postings.get(token)
+                if posting is None:
+                    posting = postings[token] = set()
+                posting.add(code)
+
+        for token in postings:
+            search_index._path(token)[-1].terminal = True
+
+        search_index._build_rank()
+        search_index.version = index.version
+        return search_index
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # schemes whose searchable fields differ from what is indexed, a nav only refresh yields nothing
+    def diff(self, index: NavIndex) -> dict:
+        docs = self._docs
+        changes = {}
+
+        for item in index.items():
+            code = item["Scheme_Code"]
+            name, family = item.get("Scheme_Name") or "", item.get("Mutual_Fund_Family") or ""
+            doc = docs.get(code)
+
+            if doc is None or doc.name != name or doc.family != family:
+                changes[code] = (name, family)
+
+        for code in docs:
+            if code not in index:
+                changes[code] = None
+
+        return changes
+
+    # apply a diff, code -> (name, family) to index or None to drop
+    def apply(self, changes: dict, version: Optional[int] = None) -> None:
+        for code, fields in changes.items():
+            self._remove(code)
+
+            if fields is not None:
+                self._add(code, *fields)
+
+        if changes:
+            self._results.clear()
+            self._ranked = None
+            self._rank_of = None
+
+        self.version = version
+
+    def get(self, scheme_code) -> Optional[SearchDoc]:
+        return self._docs.get(scheme_code)
+
+    # top matches for a query, every word must match and the last one may be a prefix
+    def search(self, query: str, limit: int = 10) -> List:
+        tokens = tokenize(query)
+
+        if not tokens:
+            return []
+
+        key = (tuple(tokens), limit)
+        cached = self._results.get(key)
+
+        if cached is not None:
+            self._results.move_to_end(key)
+            return cached
+
+        candidates = self._candidates(tokens)
+        ranked = self._rank(candidates, tokens, limit) if candidates else []
+
+        self._results[key] = ranked
+        if len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+
+        return ranked
+
+    def _candidates(self, tokens: List[str]) -> Optional[set]:
+        matches = []
+
+        for token in tokens[:-1]:
+            posting = self._postings.get(token)
+            if posting is None:
+                return None
+            matches.append(posting)
+
+        prefix_codes = self._prefix_codes(tokens[-1])
+        if not prefix_codes:
+            return None
+        matches.append(prefix_codes)
+
+        # intersect from the smallest set so the work is bounded by the most selective word
+        matches.sort(key=len)
+        return matches[0].intersection(*matches[1:])
+
+    # schemes where the last word is complete rank first, then shorter names
+    def _rank(self, candidates: set, tokens: List[str], limit: int) -> List:
+        last = self._postings.get(tokens[-1])
+        exact = candidates & last if last is not None else set()
+
+        ranked = self._top(exact, limit)
+
+        if len(ranked) < limit:
+            ranked += self._top(candidates - exact, limit - len(ranked))
+
+        return ranked
+
+    def _top(self, codes: set, limit: int) -> List:
+        if not codes:
+            return []
+
+        if self._ranked is None:
+            self._build_rank()
+
+        # a small set is cheaper to sort, a large one finds its best members early in the static order
+        if len(codes) <= len(self._ranked) * SCAN_FRACTION:
+            return heapq.nsmallest(limit, codes, key=self._rank_of.__getitem__)
+
+        top = []
+        for code in self._ranked:
+            if code in codes:
+                top.append(code)
+                if len(top) == limit:
+                    break
+
+        return top
+
+    def _build_rank(self) -> None:
+        docs = self._docs
+        self._ranked = sorted(docs, key=lambda code: (len(docs[code].name), code))
+        self._rank_of = {code: position for position, code in enumerate(self._ranked)}
+
+    def _prefix_codes(self, prefix: str) -> Optional[set]:
+        node = self._root
+
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+
+        if node.codes is None:
+            node.codes = self._collect(node, prefix)
+
+        return node.codes
+
+    def _collect(self, node: TrieNode, prefix: str) -> set:
+        codes = set()
+        stack = [(node, prefix)]
+
+        while stack:
+            node, word = stack.pop()
+
+            if node.terminal:
+                codes |= self._postings[word]
+
+            stack.extend((child, word + char) for char, child in node.children.items())
+
+        return codes
+
+    def _path(self, token: str) -> List[TrieNode]:
+        path = self._paths.get(token)
+
+        if path is None:
+            node = self._root
+            path = []
+
+            for char in token:
+                node = node.children.setdefault(char, TrieNode())
+                path.append(node)
+
+            self._paths[token] = path
+
+        return path
+
+    def _add(self, code, name: str, family: str) -> None:
+        doc = SearchDoc(name, family)
+        self._docs[code] = doc
+
+        for token in doc.tokens:
+            posting = self._postings.get(token)
+
+            if posting is None:
+                posting = self._postings[token] = set()
+
+            posting.add(code)
+            path = self._path(token)
+            path[-1].terminal = True
+
+            # growing a union is safe, so cached prefixes are patched instead of dropped
+            for node in path:
+                if node.codes is not None:
+                    node.codes.add(code)
+
+    def _remove(self, code) -> None:
+        doc = self._docs.pop(code, None)
+
+        if doc is None:
+            return
+
+        for token in doc.tokens:
+            posting = self._postings[token]
+            posting.discard(code)
+
+            path = self._path(token)
+
+            if not posting:
+                del self._postings[token]
+                path[-1].terminal = False
+
+            # the scheme may still match these prefixes through another word, recompute on next use
+            for node in path:
+                node.codes = None
+
+
+# search index of the latest snapshot in this process
+current_search_index: Optional[FundSearchIndex] = None
+
+
+def get_current_search_index() -> Optional[FundSearchIndex]:
+    return current_search_index
+
+
+# bring the search index up to the given snapshot, patching it when only a few schemes changed
+async def refresh_search_index(index: NavIndex) -> FundSearchIndex:
+    global current_search_index
+
+    while True:
+        search_index = current_search_index
+
+        if search_index is None:
+            search_index = await asyncio.to_thread(FundSearchIndex.from_nav_index, index)
+
+            # a first build for another snapshot may have finished meanwhile, keep the newer one
+            if current_search_index is None or current_search_index.version < index.version:
+                current_search_index = search_index
+
+            return current_search_index
+
+        async with search_index.refresh_lock:
+            # replaced by a rebuild while we waited, refresh the index that took its place
+            if current_search_index is not search_index:
+                continue
+
+            # another refresh may have brought it this far while we waited
+            if search_index.version >= index.version:
+                return search_index
+
+            # the diff only reads, searches on the loop may run beside it but no other refresh can apply
+            changes = await asyncio.to_thread(search_index.diff, index)
+
+            if len(changes) > REBUILD_THRESHOLD:
+                search_index = await asyncio.to_thread(FundSearchIndex.from_nav_index, index)
+            else:
+                # small patches are applied on the loop, where searches cannot observe them half done
+                search_index.apply(changes, index.version)
+
+            current_search_index = search_index
+            return search_index
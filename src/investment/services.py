@@ -1,12 +1,37 @@
 from sqlmodel.ext.asyncio.session import AsyncSession
 from src.investment.schemas import InvestmentCreateSchema, InvestmentUpdateSchema
 from sqlmodel import select, desc, and_
-from src.db.models import Investment
-from src.investment.utils import get_open_schemes_codes, get_fund_details_from_RapidAPI, read_json_from_file
+from sqlalchemy.dialects.postgresql import insert
+from src.db.models import Investment, NavHistory, PortfolioSummary
+from datetime import date
+from typing import Callable, List, Optional
+from src.investment.utils import get_nav_snapshot, get_fund_details_payload_from_RapidAPI, read_json_payload_from_file, \
+    nav_snapshot_cache, OPEN_SCHEMES_CACHE_KEY, get_catalogue_index, get_cached_nav_index, get_fund_search_index, \
+    get_cached_nav_columns
+from src.investment.valuation import value_holdings
+from src.investment.payloads import EncodedPayload
+from src.outbox import add_domain_event
+from src.investment.revaluation import revalue_investments, prepare_revaluation, revalue_shard, finalize_revaluation, \
+    clear_revaluation
 import json
 import os
+import time
+import uuid
 
 
+# served when the fund data cannot be loaded
+EMPTY_FUND_DETAILS_PAYLOAD = EncodedPayload.from_data({"scheme_codes": [], "fund_details": {}})
+
+
+# payload of the investment domain events written to the outbox
+def investment_event(user_id, investment: Investment) -> dict:
+    return {
+        "user_id": str(user_id),
+        "scheme_code": investment.scheme_code,
+        "units": investment.units,
+        "current_value": investment.current_value
+    }
+
 
 class InvestmentService:
 
@@ -22,6 +47,89 @@ class InvestmentService:
         result = await session.exec(statement)
         return result.first()
 
+    # get the nav series of a scheme between two dates, served from the covering primary key
+    async def get_nav_history(self, scheme_code: int, start_date: date, end_date: date, session: AsyncSession):
+        statement = select(NavHistory.nav_date, NavHistory.nav).where(
+            and_(
+                NavHistory.scheme_code == scheme_code,
+                NavHistory.nav_date >= start_date,
+                NavHistory.nav_date <= end_date
+            )
+        ).order_by(NavHistory.nav_date)
+        result = await session.exec(statement)
+        return result.all()
+
+    # get all investments of a user, newest first
+    async def get_investments_by_user_id(self, user_id: str, session: AsyncSession):
+        statement = select(Investment).where(Investment.user_id == user_id).order_by(desc(Investment.created_at))
+        result = await session.exec(statement)
+        return result.all()
+
+    # get the stored totals of a user, None until the first investment
+    async def get_portfolio_summary(self, user_id: str, session: AsyncSession):
+        return await session.get(PortfolioSummary, user_id)
+
+    # apply one holding's change to the user's totals, inside the caller's transaction
+    async def update_portfolio_summary(self, user_id, fund_family: str, value_delta: float, count_delta: int, session: AsyncSession):
+        # make sure the row exists first, a concurrent first investment of the same user waits here instead of failing
+        await session.execute(
+            insert(PortfolioSummary)
+            .values(user_id=user_id, total_value=0.0, holding_count=0, family_exposure={})
+            .on_conflict_do_nothing(index_elements=["user_id"])
+        )
+
+        # lock the row so concurrent writes for the same user apply one after the other
+        summary = await session.get(PortfolioSummary, user_id, with_for_update=True, populate_existing=True)
+
+        summary.total_value = round((summary.total_value or 0.0) + value_delta, 4)
+        summary.holding_count = (summary.holding_count or 0) + count_delta
+
+        # a new dict so the json column is seen as changed
+        family_exposure = dict(summary.family_exposure or {})
+        family = family_exposure.get(fund_family, {"value": 0.0, "holdings": 0})
+        family = {
+            "value": round(family["value"] + value_delta, 4),
+            "holdings": family["holdings"] + count_delta
+        }
+
+        if family["holdings"] > 0:
+            family_exposure[fund_family] = family
+        else:
+            family_exposure.pop(fund_family, None)
+
+        summary.family_exposure = family_exposure
+        return summary
+
+    # value every holding of a user against the latest snapshot in one vectorized pass
+    async def get_portfolio_valuation(self, user_id: str, session: AsyncSession):
+        statement = select(Investment.scheme_code, Investment.units).where(Investment.user_id == user_id).order_by(Investment.scheme_code)
+        result = await session.exec(statement)
+        rows = result.all()
+
+        columns = await get_cached_nav_columns()
+        valuation = value_holdings(columns, [row[0] for row in rows], [row[1] for row in rows])
+
+        holdings = [
+            {
+                "scheme_code": scheme_code,
+                "units": units,
+                "nav": nav if found else None,
+                "current_value": value if found else None
+            }
+            for scheme_code, units, nav, value, found in zip(
+                valuation.scheme_codes.tolist(), valuation.units.tolist(), valuation.navs.tolist(),
+                valuation.values.tolist(), valuation.found.tolist()
+            )
+        ]
+
+        return {
+            "snapshot_version": valuation.version,
+            "holding_count": len(holdings),
+            "total_value": valuation.total_value,
+            "missing_scheme_codes": valuation.missing_scheme_codes(),
+            "holdings": holdings
+        }
+
     # create an investment
     async def create_an_investment(self, investment_data: InvestmentCreateSchema, user_id: str, session: AsyncSession):
 
@@ -31,8 +139,10 @@ class InvestmentService:
         investment = Investment(**investment_data_dict)
         investment.user_id = user_id
 
-        # add to the db
+        # add to the db, together with the user's totals
         session.add(investment)
+        await self.update_portfolio_summary(user_id, investment.fund_family, investment.current_value, 1, session)
+        add_domain_event(session, "investment.created", investment_event(user_id, investment))
         await session.commit()
         await session.refresh(investment)
 
@@ -50,11 +160,14 @@ class InvestmentService:
 
         # convert investment data into a dictionary
         investment_data_dict = investment_data.model_dump()
+        previous_value = investment.current_value
 
         # update the attributes
         for key, value in investment_data_dict.items():
             setattr(investment, key, value)
 
+        await self.update_portfolio_summary(user_id, investment.fund_family, investment.current_value - previous_value, 0, session)
+        add_domain_event(session, "investment.updated", investment_event(user_id, investment))
         await session.commit()
         await session.refresh(investment)
 
@@ -69,58 +182,166 @@ class InvestmentService:
         if not investment:
             return None
 
-        # delete the investment from db
+        # delete the investment from db, together with its share of the user's totals
         await session.delete(investment)
+        await self.update_portfolio_summary(user_id, investment.fund_family, -investment.current_value, -1, session)
+        add_domain_event(session, "investment.deleted", investment_event(user_id, investment))
         await session.commit()
         return investment
 
     # update all nav values of investments
-    async def update_nav_for_all_investments(self, session: AsyncSession):
+    # download the feed and revalue every holding, failures are raised to the caller
+    async def run_nav_revaluation(self, session: AsyncSession, on_progress: Optional[Callable[[dict], None]] = None):
+
+        start_time = time.perf_counter()
+
+        # download the feed once, every holding is revalued from this snapshot
+        snapshot = await get_nav_snapshot()
+
+        if on_progress is not None:
+            on_progress({"stage": "fetched", **snapshot.stats()})
+
+        # stage the snapshot and revalue all holdings in one set based update
+        result = await revalue_investments(session, snapshot.index, on_progress=on_progress)
+
+        await session.commit()
+
+        # the job always fetches fresh data, hand it to the cache so readers skip the next download
+        await nav_snapshot_cache.put(OPEN_SCHEMES_CACHE_KEY, snapshot.index)
+
+        return {
+            'message': 'All NAVs have been updated successfully.',
+            **result,
+            **snapshot.stats(),
+            'elapsed_seconds': round(time.perf_counter() - start_time, 4)
+        }
 
-        # get all investments
-        investments = await self.get_all_investments(session)
+    # first step of a sharded run: download the feed and stage it, the shards then revalue against the run id
+    async def prepare_nav_revaluation(self, session: AsyncSession, on_progress: Optional[Callable[[dict], None]] = None):
+
+        snapshot = await get_nav_snapshot()
+
+        if on_progress is not None:
+            on_progress({"stage": "fetched", **snapshot.stats()})
+
+        prepared = await prepare_revaluation(session, snapshot.index)
+
+        await nav_snapshot_cache.put(OPEN_SCHEMES_CACHE_KEY, snapshot.index)
+
+        return {**prepared, **snapshot.stats(), 'started_at': time.time()}
+
+    # one shard of a sharded run
+    async def revalue_nav_shard(self, session: AsyncSession, run_id: str, shard: int, shard_count: int,
+                                on_progress: Optional[Callable[[dict], None]] = None):
+        return await revalue_shard(session, uuid.UUID(run_id), shard, shard_count, on_progress=on_progress)
+
+    # last step of a sharded run, the shard counts are added up into the same result as a single process run
+    async def finalize_nav_revaluation(self, session: AsyncSession, prepared: dict, shard_results: List[dict]):
+
+        corrected_user_ids = {user_id for shard_result in shard_results for user_id in shard_result.get('corrected_user_ids', ())}
+        finalized = await finalize_revaluation(session, uuid.UUID(prepared['run_id']), corrected_user_ids)
+
+        # the ids were only needed for the summaries, the report keeps the counts
+        shard_results = sorted(
+            ({key: value for key, value in shard_result.items() if key != 'corrected_user_ids'} for shard_result in shard_results),
+            key=lambda shard_result: shard_result['shard']
+        )
+
+        return {
+            'message': 'All NAVs have been updated successfully.',
+            **{key: value for key, value in prepared.items() if key != 'started_at'},
+            'scanned': sum(shard_result['scanned'] for shard_result in shard_results),
+            'updated': sum(shard_result['updated'] for shard_result in shard_results),
+            'corrected_users': len(corrected_user_ids),
+            'chunks': sum(shard_result['chunks'] for shard_result in shard_results),
+            **finalized,
+            'shards': shard_results,
+            'elapsed_seconds': round(time.time() - prepared['started_at'], 4)
+        }
+
+    # drop the staged rows of a sharded run that did not finish
+    async def abandon_nav_revaluation(self, session: AsyncSession, run_id: str):
+        await clear_revaluation(session, uuid.UUID(run_id))
+
+    async def update_nav_for_all_investments(self, session: AsyncSession):
 
         # update the current nav value and current_value of units
         try:
-            for investment in investments:
-                latest_mutual_fund_info = await get_open_schemes_codes(investment.scheme_code)
-                investment.date = latest_mutual_fund_info['Date']
-                investment.nav = round((latest_mutual_fund_info['Net_Asset_Value']), 4)
-                investment.current_value = round((latest_mutual_fund_info['Net_Asset_Value'] * investment.units), 4)
-                session.add(investment)
-
-            await session.commit()
+            result = await self.run_nav_revaluation(session)
 
             print("Done updating investments every hour...")
 
-            return {
-                'message': 'All NAVs have been updated successfully.'
-            }
+            return result
         except Exception as e:
+            await session.rollback()
             print(f"Exception occurred while updating the NAV details: {str(e)}")
             return {
                 'message': 'Update not successful'
             }
 
 
-    async def get_data_from_RapidAPI(self):
+    # one page of the fund catalogue, None when a projected field is not in the feed
+    async def get_fund_catalogue(self, filters: dict, cursor: Optional[int], limit: int, fields: Optional[List[str]]):
+        index = await get_catalogue_index()
+
+        if fields and not index.field_names.issuperset(fields):
+            return None
+
+        codes = index.filter_codes(filters)
+        page, next_cursor = index.page(codes, cursor, limit)
+
+        items = []
+        for code in page:
+            item = index.get(code)
+
+            if fields:
+                item = {"Scheme_Code": code, **{field: item.get(field) for field in fields}}
+
+            items.append(item)
+
+        return {
+            "snapshot_version": index.version,
+            "total": len(codes),
+            "next_cursor": next_cursor,
+            "items": items
+        }
+
+    # ranked funds whose name or family matches the query, for finding a scheme code
+    async def search_funds(self, query: str, limit: int):
+        index = await get_cached_nav_index()
+        search_index = await get_fund_search_index(index)
+
+        results = []
+        for code in search_index.search(query, limit):
+            doc = search_index.get(code)
+            item = index.get(code) or {}
+
+            results.append({
+                "scheme_code": code,
+                "scheme_name": doc.name,
+                "fund_family": doc.family,
+                "nav": item.get("Net_Asset_Value"),
+                "date": item.get("Date")
+            })
+
+        return {
+            "query": query,
+            "snapshot_version": search_index.version,
+            "results": results
+        }
+
+    async def get_data_from_RapidAPI(self) -> EncodedPayload:
         try:
-            data = await get_fund_details_from_RapidAPI()
+            data = await get_fund_details_payload_from_RapidAPI()
             return data
         except Exception as e:
             print(f"Error reading JSON from file: {str(e)}")
-            return {
-                "scheme_codes": [],
-                "fund_details": {}
-            }
+            return EMPTY_FUND_DETAILS_PAYLOAD
 
-    async def get_data_from_file(self):
+    async def get_data_from_file(self) -> EncodedPayload:
         try:
-            data = await read_json_from_file()
+            data = await read_json_payload_from_file()
             return data
         except Exception as e:
             print(f"Error reading JSON from file: {str(e)}")
-            return {
-                "scheme_codes": [],
-                "fund_details": {}
-            }
\ No newline at end of file
+            return EMPTY_FUND_DETAILS_PAYLOAD
\ No newline at end of file
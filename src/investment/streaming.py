@@ -0,0 +1,121 @@
+import codecs
+import json
+from typing import AsyncIterable, AsyncIterator, List
+
+# largest single array item we are willing to buffer while waiting for its closing brace
+MAX_ITEM_CHARS = 1024 * 1024
+
+# parser states
+EXPECT_ARRAY_START = 0
+EXPECT_FIRST_VALUE = 1
+EXPECT_VALUE = 2
+EXPECT_SEPARATOR = 3
+DONE = 4
+
+WHITESPACE = " \t\n\r"
+
+
+# incremental parser for a top-level json array, items are returned as soon as they are complete
+class JsonArrayStreamParser:
+
+    def __init__(self):
+        # json.loads shares key strings across one document, items decoded one at a time need a shared memo
+        self._keys = {}
+        self._decoder = json.JSONDecoder(object_pairs_hook=self._make_object)
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = EXPECT_ARRAY_START
+        self.item_count = 0
+
+    def _make_object(self, pairs: list) -> dict:
+        keys = self._keys
+        return {keys.setdefault(key, key): value for key, value in pairs}
+
+    # feed the next chunk of body bytes and get back every item it completed
+    def feed(self, chunk: bytes) -> List:
+        self._buffer += self._text_decoder.decode(chunk)
+        return self._parse(final=False)
+
+    # signal the end of the body, raises ValueError if the array was truncated
+    def close(self) -> List:
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        items = self._parse(final=True)
+
+        if self._state != DONE:
+            raise ValueError("JSON array ended before its closing bracket")
+
+        return items
+
+    def _parse(self, final: bool) -> List:
+        buffer = self._buffer
+        position = 0
+        items = []
+
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+
+            if position >= len(buffer):
+                break
+
+            char = buffer[position]
+
+            if self._state == EXPECT_ARRAY_START:
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                position += 1
+                self._state = EXPECT_FIRST_VALUE
+
+            elif self._state == EXPECT_FIRST_VALUE and char == "]":
+                position += 1
+                self._state = DONE
+
+            elif self._state in (EXPECT_FIRST_VALUE, EXPECT_VALUE):
+                try:
+                    item, end = self._decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # the item is still arriving, unless the body is already complete
+                    if final:
+                        raise
+                    break
+
+                # a bare number touching the end of the buffer may continue in the next chunk
+                if end == len(buffer) and not final and not isinstance(item, (dict, list, str)):
+                    break
+
+                items.append(item)
+                self.item_count += 1
+                position = end
+                self._state = EXPECT_SEPARATOR
+
+            elif self._state == EXPECT_SEPARATOR:
+                if char == ",":
+                    self._state = EXPECT_VALUE
+                elif char == "]":
+                    self._state = DONE
+                else:
+                    raise ValueError(f"Unexpected character {char!r} in JSON array")
+                position += 1
+
+            else:
+                raise ValueError("Unexpected data after the JSON array")
+
+        # only the unfinished tail is kept, so memory stays bounded by the largest item
+        self._buffer = buffer[position:]
+
+        if len(self._buffer) > MAX_ITEM_CHARS:
+            raise ValueError("JSON array item exceeds the maximum item size")
+
+        return items
+
+
+# yield array items from an async stream of body chunks
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator:
+    parser = JsonArrayStreamParser()
+
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+
+    for item in parser.close():
+        yield item
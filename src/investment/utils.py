@@ -3,6 +3,25 @@ import httpx
 from fastapi import HTTPException
 import os
 import json
+import time
+import uuid
+import asyncio
+import logging
+import weakref
+from functools import partial
+from datetime import datetime, timezone
+from redis.exceptions import RedisError
+from src.investment.nav_index import NavIndex, set_current_nav_index
+from src.investment.streaming import iter_json_array
+from src.investment.cache import NavSnapshotCache
+from src.investment.payloads import EncodedPayload
+from src.investment.search import FundSearchIndex, get_current_search_index, refresh_search_index
+from src.investment.valuation import NavColumns, nav_columns, get_nav_columns
+from src.investment.resilience import ProviderStatusError, nav_provider
+from src.http_client import get_http_client
+from src.db.redis_db import nav_cache_store
+
+logger = logging.getLogger(__name__)
 
 # rapid api configs
 rapid_api_url = config_obj.RAPID_API_URL
@@ -15,93 +34,412 @@ headers = {
     "x-rapidapi-host": rapid_api_host
 }
 
+# cache key of the open-scheme feed
+OPEN_SCHEMES_CACHE_KEY = "open-schemes"
+
+# redis keys of the cross worker fetch locks
+LOCK_PREFIX = "single-flight:"
+
+# compare and delete, so a worker never releases a lock that expired and was taken by another
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
 # Get the current file directory and construct the file path
 json_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data.json")
 
 
-async def get_open_schemes_codes(scheme_code):
-    # query parameters
-    querystring = {"Scheme_Type": 'Open'}
+# coalesces concurrent calls for the same key into one execution whose result or exception every caller gets
+class SingleFlight:
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(rapid_api_url, headers=headers, params=querystring)
+    def __init__(self, redis=None, lock_ttl: float = None, poll_interval: float = None):
+        self._redis = redis
+        self.lock_ttl = config_obj.SINGLE_FLIGHT_LOCK_TTL if lock_ttl is None else lock_ttl
+        self.poll_interval = config_obj.SINGLE_FLIGHT_POLL_INTERVAL if poll_interval is None else poll_interval
+        self._calls = {}
 
-            # Check for non-200 responses
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error fetching data: {response.text}"
-                )
+        self.counters = {
+            "calls": 0,
+            "executions": 0,
+            "shared": 0,
+            "remote_waits": 0,
+            "remote_results": 0,
+            "lock_errors": 0
+        }
+
+    # run fn once per key across concurrent callers; with redis and wait_for, once across workers as well
+    async def do(self, key: str, fn, wait_for=None):
+        self.counters["calls"] += 1
+        call = self._calls.get(key)
+
+        if call is None:
+            call = asyncio.ensure_future(self._run(key, fn, wait_for))
+            self._calls[key] = call
+            call.add_done_callback(partial(self._forget, key))
+        else:
+            self.counters["shared"] += 1
+
+        # a cancelled caller must not cancel the fetch the others are waiting on
+        return await asyncio.shield(call)
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_flight": len(self._calls)}
+
+    def _forget(self, key: str, call: asyncio.Future) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
 
+        # the exception was handed to the callers, mark it retrieved even if all of them were cancelled
+        if not call.cancelled():
+            call.exception()
+
+    async def _execute(self, fn):
+        self.counters["executions"] += 1
+        return await fn()
+
+    async def _run(self, key: str, fn, wait_for):
+        if self._redis is None or wait_for is None:
+            return await self._execute(fn)
+
+        lock_key = LOCK_PREFIX + key
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = await self._redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except (RedisError, OSError) as e:
+            # without redis every worker fetches for itself, as before
+            self.counters["lock_errors"] += 1
+            logger.warning("Could not take the %s fetch lock: %s", key, e)
+            return await self._execute(fn)
+
+        if not acquired:
+            self.counters["remote_waits"] += 1
+            result = await self._wait_for_holder(lock_key, wait_for)
+
+            if result is not None:
+                self.counters["remote_results"] += 1
+                return result
+
+            # the holder failed or ran past the lock ttl, fetch here instead of failing the callers
+            return await self._execute(fn)
+
+        try:
+            return await self._execute(fn)
+        finally:
             try:
-                data = response.json()  # Ensure JSON is valid
-            except ValueError:
-                raise HTTPException(status_code=500, detail="Invalid JSON response from API")
+                await self._redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except (RedisError, OSError) as e:
+                self.counters["lock_errors"] += 1
+                logger.warning("Could not release the %s fetch lock: %s", key, e)
+
+    # poll the lock until the holder releases it or the lock ttl runs out, then read its result once
+    # the lock is a small key, the result can be large and costly to decode, so it is not read on every poll
+    async def _wait_for_holder(self, lock_key: str, wait_for):
+        deadline = time.monotonic() + self.lock_ttl
 
-            found_scheme = find_scheme_code(scheme_code, data)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
 
-            if found_scheme:
-                return found_scheme
-            else:
+            try:
+                if not await self._redis.exists(lock_key):
+                    return await wait_for()
+            except (RedisError, OSError):
+                self.counters["lock_errors"] += 1
                 return None
-    except httpx.HTTPError as e:
-        raise HTTPException(status_code=500, detail=f"External API Error: {str(e)}")
 
+        return None
 
-async def get_fund_details_from_RapidAPI():
+
+# snapshot of the open-scheme feed, downloaded once and shared by a whole revaluation run
+class NavSnapshot:
+
+    def __init__(self, index: NavIndex, fetch_count: int, bytes_downloaded: int, elapsed: float):
+        self.index = index
+        self.fetch_count = fetch_count
+        self.bytes_downloaded = bytes_downloaded
+        self.elapsed = elapsed
+
+    # get the latest fund info for a scheme code, None if the feed does not carry it
+    def get(self, scheme_code):
+        return self.index.get(scheme_code)
+
+    # fetch statistics reported by the revaluation run
+    def stats(self) -> dict:
+        return {
+            "snapshot_version": self.index.version,
+            "scheme_count": len(self.index),
+            "fetch_count": self.fetch_count,
+            "bytes_downloaded": self.bytes_downloaded,
+            "fetch_seconds": round(self.elapsed, 4)
+        }
+
+
+# shares one upstream download between the hourly job and cache misses in this process
+nav_feed_flight = SingleFlight()
+
+# shares one cache fill across api replicas through a short redis lock
+nav_cache_flight = SingleFlight(redis=nav_cache_store)
+
+# two tier cache in front of the feed for user facing reads
+nav_snapshot_cache = NavSnapshotCache(redis=nav_cache_store, flight=nav_cache_flight)
+
+
+async def get_nav_snapshot(streaming: bool = None) -> NavSnapshot:
+    # streaming keeps peak memory flat, buffered parses the whole body at once
+    if streaming is None:
+        streaming = config_obj.NAV_FEED_STREAMING
+
+    fetch = stream_nav_snapshot if streaming else fetch_nav_snapshot
+
+    # concurrent callers get the snapshot of the download already in flight
+    return await nav_feed_flight.do(OPEN_SCHEMES_CACHE_KEY, fetch)
+
+
+async def fetch_nav_snapshot() -> NavSnapshot:
     # query parameters
     querystring = {"Scheme_Type": 'Open'}
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(rapid_api_url, headers=headers, params=querystring)
+    start_time = time.perf_counter()
+
+    async def attempt() -> NavSnapshot:
+        client = get_http_client()
+        response = await client.get(rapid_api_url, headers=headers, params=querystring)
+        await nav_provider.record_response(response.headers)
+
+        # Check for non-200 responses
+        if response.status_code != 200:
+            raise ProviderStatusError(response.status_code, response.text)
+
+        try:
+            data = response.json()  # Ensure JSON is valid
+        except ValueError:
+            raise HTTPException(status_code=500, detail="Invalid JSON response from API")
+
+        index = set_current_nav_index(NavIndex.from_payload(data))
+
+        return NavSnapshot(
+            index=index,
+            fetch_count=1,
+            bytes_downloaded=len(response.content),
+            elapsed=time.perf_counter() - start_time
+        )
+
+    return await call_nav_provider(attempt)
+
+
+async def stream_nav_snapshot() -> NavSnapshot:
+    # query parameters
+    querystring = {"Scheme_Type": 'Open'}
+
+    start_time = time.perf_counter()
+
+    async def attempt() -> NavSnapshot:
+        client = get_http_client()
+
+        async with client.stream("GET", rapid_api_url, headers=headers, params=querystring) as response:
+            await nav_provider.record_response(response.headers)
 
             # Check for non-200 responses
             if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error fetching data: {response.text}"
-                )
+                await response.aread()
+                raise ProviderStatusError(response.status_code, response.text)
+
+            # items go straight into the index as they arrive, the body is never held whole
+            schemes = {}
 
             try:
-                data = response.json()
+                async for item in iter_json_array(response.aiter_bytes()):
+                    schemes[item["Scheme_Code"]] = item
+            except (ValueError, KeyError, TypeError):
+                raise HTTPException(status_code=500, detail="Invalid JSON response from API")
 
-                scheme_codes = [item["Scheme_Code"] for item in data]
-                fund_details = {item["Scheme_Code"]: {k: v for k, v in item.items() if k != "Scheme_Code"} for item in
-                                data}
+            index = set_current_nav_index(NavIndex(schemes))
 
-                return {
-                    "scheme_codes": scheme_codes,
-                    "fund_details": fund_details
-                }
-            except ValueError:
-                raise HTTPException(status_code=500, detail="Invalid JSON response from API")
+            return NavSnapshot(
+                index=index,
+                fetch_count=1,
+                bytes_downloaded=response.num_bytes_downloaded,
+                elapsed=time.perf_counter() - start_time
+            )
+
+    return await call_nav_provider(attempt)
+
+
+# one download through the provider client; an outage surfaces as ProviderUnavailable, a refusal keeps its status
+async def call_nav_provider(attempt) -> NavSnapshot:
+    try:
+        return await nav_provider.call(attempt)
+    except ProviderStatusError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Error fetching data: {e.detail}"
+        )
     except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"External API Error: {str(e)}")
 
-# Function to search for a Scheme_Code
-def find_scheme_code(scheme_code, data):
-    """Find a scheme by Scheme_Code in API response."""
-    return next((scheme for scheme in data if scheme["Scheme_Code"] == scheme_code), None)
 
+async def load_open_schemes_index() -> NavIndex:
+    snapshot = await get_nav_snapshot()
+    return snapshot.index
 
-async def read_json_from_file():
 
-    try:
-        with open(json_file_path, "r", encoding="utf-8") as file:
+# latest index from the cache, the feed is only downloaded on a miss or a background refresh
+async def get_cached_nav_index() -> NavIndex:
+    return await nav_snapshot_cache.get(OPEN_SCHEMES_CACHE_KEY, load_open_schemes_index)
+
+
+# data.json parsed in a worker thread and reused until the file's mtime or size changes
+class FileNavSnapshot:
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parse_count = 0
+        self._signature = None
+        self._index = None
+        self._fund_details = None
+        self._payload = None
+        self._flight = SingleFlight()
+
+    async def get_index(self) -> NavIndex:
+        await self._refresh()
+        return self._index
+
+    # the cached response is shared between requests, callers must not modify it
+    async def get_fund_details(self) -> dict:
+        await self._refresh()
+        return self._fund_details
+
+    async def get_payload(self) -> EncodedPayload:
+        await self._refresh()
+        return self._payload
+
+    async def _refresh(self) -> None:
+        # a stat is a metadata lookup, cheap enough to run on the loop for every request
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        if signature != self._signature:
+            # requests arriving while the file is parsed wait for that parse instead of starting their own
+            await self._flight.do(str(signature), partial(self._reload, signature))
+
+    async def _reload(self, signature: tuple) -> None:
+        index, fund_details, payload = await asyncio.to_thread(self._parse, signature)
+        self.parse_count += 1
+
+        self._index = index
+        self._fund_details = fund_details
+        self._payload = payload
+        self._signature = signature
+
+    def _parse(self, signature: tuple):
+        with open(self.path, "rb") as file:
             data = json.load(file)
 
-        scheme_codes = [item["Scheme_Code"] for item in data]
-        fund_details = {item["Scheme_Code"]: {k: v for k, v in item.items() if k != "Scheme_Code"} for item in data}
+        # the file's mtime is the snapshot time, so its version only moves when the file does
+        index = NavIndex.from_payload(data, as_of=datetime.fromtimestamp(signature[0] / 1e9, tz=timezone.utc))
+        fund_details = index.to_fund_details()
+        return index, fund_details, EncodedPayload.from_data(fund_details)
 
-        return {
-            "scheme_codes": scheme_codes,
-            "fund_details": fund_details
-        }
+
+file_nav_snapshot = FileNavSnapshot(json_file_path)
+
+
+async def get_open_schemes_codes(scheme_code):
+    index = await get_cached_nav_index()
+    return index.get(scheme_code)
+
+
+async def get_fund_details_from_RapidAPI():
+    index = await get_cached_nav_index()
+    return index.to_fund_details()
+
+
+# cached feed index with its secondary indexes, built off the loop the first time a snapshot is browsed
+async def get_catalogue_index() -> NavIndex:
+    index = await get_cached_nav_index()
+
+    if not index.has_secondary_indexes:
+        await asyncio.to_thread(index.build_secondary_indexes)
+
+    return index
+
+
+# columnar form of the cached snapshot for vectorized valuation, built off the loop once per snapshot
+async def get_cached_nav_columns() -> NavColumns:
+    index = await get_cached_nav_index()
+    columns = nav_columns.get(index)
+
+    if columns is None:
+        columns = await asyncio.to_thread(get_nav_columns, index)
+
+    return columns
+
+
+# one search index update per snapshot even when a burst of searches sees it first
+fund_search_flight = SingleFlight()
+
+
+# search index in step with the cached snapshot, a refresh patches only the schemes whose names changed
+# callers that already hold the snapshot pass it in, so both come from the same version
+async def get_fund_search_index(index: NavIndex = None) -> FundSearchIndex:
+    if index is None:
+        index = await get_cached_nav_index()
+
+    search_index = get_current_search_index()
+
+    if search_index is not None and search_index.version == index.version:
+        return search_index
+
+    return await fund_search_flight.do(str(index.version), partial(refresh_search_index, index))
+
+
+# encoded fund details per index, dropped together with the index
+fund_details_payloads = weakref.WeakKeyDictionary()
+
+# one encode per index even when a burst of requests sees it first
+fund_details_payload_flight = SingleFlight()
+
+
+async def get_fund_details_payload(index: NavIndex) -> EncodedPayload:
+    payload = fund_details_payloads.get(index)
+
+    if payload is None:
+        payload = await fund_details_payload_flight.do(str(id(index)), partial(build_fund_details_payload, index))
+
+    return payload
+
+
+async def build_fund_details_payload(index: NavIndex) -> EncodedPayload:
+    # encoding and compressing a few megabytes takes tens of milliseconds, keep it off the loop
+    payload = await asyncio.to_thread(lambda: EncodedPayload.from_data(index.to_fund_details()))
+    fund_details_payloads[index] = payload
+    return payload
+
+
+async def get_fund_details_payload_from_RapidAPI() -> EncodedPayload:
+    index = await get_cached_nav_index()
+    return await get_fund_details_payload(index)
+
+# Function to search for a Scheme_Code
+def find_scheme_code(scheme_code, index: NavIndex):
+    """Find a scheme by Scheme_Code in a NavIndex."""
+    return index.get(scheme_code)
+
+
+async def read_json_payload_from_file() -> EncodedPayload:
+    return await file_nav_snapshot.get_payload()
+
+
+async def read_json_from_file():
+
+    try:
+        return await file_nav_snapshot.get_fund_details()
     except Exception as e:
         print(f"Error reading JSON from file: {str(e)}")
         return {
             "scheme_codes": [],
             "fund_details": {}
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,126 @@
+from src.investment.nav_index import NavIndex
+from typing import Iterable, Optional
+import numpy as np
+import weakref
+
+# navs and values are stored with four decimals, as the investments table does
+VALUE_DECIMALS = 4
+
+# a direct lookup table is used while the code range is at most this many times the scheme count
+LOOKUP_TABLE_MAX_SPAN_RATIO = 16
+
+
+# the snapshot as columns, scheme codes sorted ascending with their navs and dates alongside
+class NavColumns:
+
+    def __init__(self, codes: np.ndarray, navs: np.ndarray, dates: np.ndarray, version: Optional[int] = None, lookup_table: bool = True):
+        self.codes = codes
+        self.navs = navs
+        self.dates = dates
+        self.version = version
+
+        # amfi codes are dense, so a table indexed by code is smaller than the snapshot and beats binary search
+        self._table = None
+        self._base = 0
+
+        if lookup_table and len(codes):
+            span = int(codes[-1] - codes[0]) + 1
+
+            if span <= LOOKUP_TABLE_MAX_SPAN_RATIO * len(codes):
+                self._base = int(codes[0])
+                self._table = np.full(span, -1, dtype=np.int32)
+                self._table[codes - self._base] = np.arange(len(codes), dtype=np.int32)
+
+    # schemes without an integer code or a numeric nav are left out
+    @classmethod
+    def from_nav_index(cls, index: NavIndex, lookup_table: bool = True) -> "NavColumns":
+        codes, navs, dates = [], [], []
+
+        for item in index.items():
+            code, nav = item["Scheme_Code"], item.get("Net_Asset_Value")
+
+            if isinstance(code, bool) or not isinstance(code, int):
+                continue
+            if isinstance(nav, bool) or not isinstance(nav, (int, float)):
+                continue
+
+            codes.append(code)
+            navs.append(nav)
+            dates.append(item.get("Date") or "")
+
+        codes = np.array(codes, dtype=np.int64)
+        order = np.argsort(codes, kind="stable")
+
+        return cls(
+            codes=codes[order],
+            navs=np.array(navs, dtype=np.float64)[order],
+            dates=np.array(dates, dtype=object)[order],
+            version=index.version,
+            lookup_table=lookup_table
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    # positions of the given codes in the snapshot and whether each one was found
+    def locate(self, scheme_codes: np.ndarray):
+        if not len(self.codes):
+            positions = np.zeros(len(scheme_codes), dtype=np.intp)
+            return positions, np.zeros(len(scheme_codes), dtype=bool)
+
+        if self._table is not None:
+            offsets = scheme_codes - self._base
+            in_range = (offsets >= 0) & (offsets < len(self._table))
+            positions = self._table[np.where(in_range, offsets, 0)]
+            found = in_range & (positions >= 0)
+            return np.where(found, positions, 0), found
+
+        # sparse code ranges fall back to a binary search join
+        positions = np.searchsorted(self.codes, scheme_codes)
+        np.minimum(positions, len(self.codes) - 1, out=positions)
+        return positions, self.codes[positions] == scheme_codes
+
+
+# a batch of holdings valued against one snapshot, holdings of unknown schemes have nan navs and values
+class Valuation:
+
+    def __init__(self, scheme_codes: np.ndarray, units: np.ndarray, navs: np.ndarray, values: np.ndarray, found: np.ndarray, version: Optional[int]):
+        self.scheme_codes = scheme_codes
+        self.units = units
+        self.navs = navs
+        self.values = values
+        self.found = found
+        self.version = version
+
+    @property
+    def total_value(self) -> float:
+        return round(float(self.values[self.found].sum()), VALUE_DECIMALS)
+
+    def missing_scheme_codes(self) -> list:
+        return np.unique(self.scheme_codes[~self.found]).tolist()
+
+
+# revalue any batch of holdings with one vectorized join and one multiply
+def value_holdings(columns: NavColumns, scheme_codes: Iterable, units: Iterable) -> Valuation:
+    scheme_codes = np.asarray(scheme_codes, dtype=np.int64)
+    units = np.asarray(units, dtype=np.float64)
+
+    positions, found = columns.locate(scheme_codes)
+
+    navs = np.where(found, columns.navs[positions] if len(columns) else np.nan, np.nan)
+    values = np.round(units * navs, VALUE_DECIMALS)
+
+    return Valuation(scheme_codes, units, np.round(navs, VALUE_DECIMALS), values, found, columns.version)
+
+
+# columns per snapshot, dropped together with the index
+nav_columns = weakref.WeakKeyDictionary()
+
+
+def get_nav_columns(index: NavIndex) -> NavColumns:
+    columns = nav_columns.get(index)
+
+    if columns is None:
+        columns = nav_columns[index] = NavColumns.from_nav_index(index)
+
+    return columns
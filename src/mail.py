@@ -1,7 +1,14 @@
 from fastapi_mail import FastMail, ConnectionConfig, MessageSchema, MessageType
 from src.config import config_obj
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
-from typing import List
+from typing import List, Optional
+import aiosmtplib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -33,4 +40,204 @@ def create_message(recipients: List[str], subject: str, body: str):
         subtype=MessageType.html
     )
 
-    return message
\ No newline at end of file
+    return message
+
+
+# build the mime message the pooled mailer sends, same html body as create_message
+def build_email_message(recipients: List[str], subject: str, body: str, sender: str = None) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = sender or formataddr((config_obj.MAIL_FROM_NAME, config_obj.MAIL_FROM))
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = subject
+    message.set_content(body, subtype="html")
+
+    return message
+
+
+# raised when the smtp server is unreachable, rejects the login or fails temporarily, unsent holds the messages that did not go out
+class MailDeliveryError(Exception):
+
+    def __init__(self, unsent: List[dict]):
+        super().__init__(f"{len(unsent)} emails could not be delivered")
+        self.unsent = unsent
+
+
+# one smtp connection per worker process, reused across tasks; queued messages are sent over it in batches
+class PooledMailer:
+
+    def __init__(self, hostname: str = None, port: int = None, username: str = None, password: str = None,
+                 start_tls: bool = None, use_tls: bool = None, validate_certs: bool = None, timeout: float = None,
+                 batch_size: int = None, max_reconnects: int = None, sender: str = None):
+        self.hostname = hostname or config_obj.MAIL_SERVER
+        self.port = port or config_obj.MAIL_PORT
+        self.username = config_obj.MAIL_USERNAME if username is None and config_obj.USE_CREDENTIALS else username
+        self.password = config_obj.MAIL_PASSWORD if password is None and config_obj.USE_CREDENTIALS else password
+        self.start_tls = config_obj.MAIL_STARTTLS if start_tls is None else start_tls
+        self.use_tls = config_obj.MAIL_SSL_TLS if use_tls is None else use_tls
+        self.validate_certs = config_obj.VALIDATE_CERTS if validate_certs is None else validate_certs
+        self.timeout = config_obj.MAIL_TIMEOUT if timeout is None else timeout
+        self.batch_size = batch_size or config_obj.MAIL_BATCH_SIZE
+        self.max_reconnects = config_obj.MAIL_MAX_RECONNECTS if max_reconnects is None else max_reconnects
+        self.sender = sender
+
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._lost = False
+        self.pending: List[dict] = []
+        self.last_batch: dict = {}
+
+        self.counters = {
+            "connections": 0,
+            "reconnects": 0,
+            "batches": 0,
+            "sent": 0,
+            "refused": 0
+        }
+
+    # queue an email, nothing is sent until drain; the delivery id rides along so a handed back email keeps it
+    def enqueue(self, recipients: List[str], subject: str, body: str, delivery_id: str = None) -> None:
+        email = {"recipients": recipients, "subject": subject, "body": body}
+
+        if delivery_id is not None:
+            email["delivery_id"] = delivery_id
+
+        self.pending.append(email)
+
+    # send everything queued, batch_size messages at a time over the same connection
+    async def drain(self) -> List[dict]:
+        batches = []
+
+        while self.pending:
+            batch = self.pending[:self.batch_size]
+            batches.append(await self._send_batch(batch))
+            del self.pending[:len(batch)]
+
+        return batches
+
+    async def _send_batch(self, batch: List[dict]) -> dict:
+        start_time = time.perf_counter()
+        reconnects_before = self.counters["reconnects"]
+        sent = 0
+        refused = 0
+        failures = 0
+        position = 0
+
+        while position < len(batch):
+            email = batch[position]
+
+            try:
+                smtp = await self._connection()
+            except (OSError, aiosmtplib.SMTPException) as e:
+                # could not connect, say hello or log in; a bad login will not fix itself, so only retry a dead socket
+                await self.close()
+                self._lost = True
+
+                if not isinstance(e, OSError) or failures >= self.max_reconnects:
+                    raise self._hand_back(position) from e
+
+                failures += 1
+                logger.warning("smtp connection failed, reconnecting (%d/%d): %s", failures, self.max_reconnects, e)
+                continue
+
+            try:
+                await smtp.send_message(build_email_message(email["recipients"], email["subject"], email["body"], self.sender))
+            except OSError as e:
+                # a dropped or timed out connection, reconnect and resend the same message
+                await self.close()
+                self._lost = True
+
+                if failures >= self.max_reconnects:
+                    raise self._hand_back(position) from e
+
+                failures += 1
+                logger.warning("smtp connection lost, reconnecting (%d/%d): %s", failures, self.max_reconnects, e)
+                continue
+            except aiosmtplib.SMTPRecipientsRefused as e:
+                # the server refused every recipient, resending it would not help
+                refused += 1
+                logger.warning("smtp server refused email to %s: %s", email["recipients"], e)
+            except aiosmtplib.SMTPResponseException as e:
+                if e.code < 500:
+                    # a temporary failure, the caller retries this message and the rest later
+                    await self.close()
+                    raise self._hand_back(position) from e
+
+                refused += 1
+                logger.warning("smtp server refused email to %s: %s", email["recipients"], e)
+            except aiosmtplib.SMTPException as e:
+                await self.close()
+                raise self._hand_back(position) from e
+            else:
+                sent += 1
+
+            position += 1
+
+        elapsed = time.perf_counter() - start_time
+
+        self.counters["batches"] += 1
+        self.counters["sent"] += sent
+        self.counters["refused"] += refused
+        self.last_batch = {
+            "size": len(batch),
+            "sent": sent,
+            "refused": refused,
+            "reconnects": self.counters["reconnects"] - reconnects_before,
+            "elapsed_seconds": round(elapsed, 4),
+            "emails_per_second": round(sent / elapsed, 1) if elapsed else None
+        }
+
+        logger.info("email batch: %(sent)d sent, %(refused)d refused in %(elapsed_seconds)ss (%(emails_per_second)s/s)", self.last_batch)
+        return self.last_batch
+
+    # hand what is left back to the caller to retry, sent messages are not repeated
+    def _hand_back(self, position: int) -> MailDeliveryError:
+        unsent = self.pending[position:]
+        self.pending = []
+        return MailDeliveryError(unsent=unsent)
+
+    # the open connection, or a new one when there is none or the server hung up
+    async def _connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is not None and self._smtp.is_connected:
+            return self._smtp
+
+        if self._smtp is not None or self._lost:
+            self.counters["reconnects"] += 1
+
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            validate_certs=self.validate_certs,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+
+        self._smtp = smtp
+        self._lost = False
+        self.counters["connections"] += 1
+        return smtp
+
+    async def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+
+        if smtp is None or not smtp.is_connected:
+            return
+
+        try:
+            await smtp.quit()
+        except (OSError, aiosmtplib.SMTPException):
+            smtp.close()
+
+    def stats(self) -> dict:
+        return {
+            "connected": self._smtp is not None and self._smtp.is_connected,
+            "pending": len(self.pending),
+            **self.counters,
+            "last_batch": self.last_batch
+        }
+
+
+# the mailer of this process, celery workers drive it from their long lived event loop
+mailer = PooledMailer()
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, status, Depends
+from src.auth.dependencies import AccessTokenBearer
+from src.http_client import get_http_client_stats
+from src.investment.utils import nav_snapshot_cache
+from src.investment.resilience import nav_provider
+from src.investment.quota import nav_rate_limiter
+from src.db.redis_db import broker_store
+from src.queues import get_queue_stats
+from src.publisher import task_publisher
+
+
+# create a router
+metrics_router = APIRouter()
+
+# create an instance of token security
+access_token_bearer = AccessTokenBearer()
+
+
+# outbound http connection pool statistics
+@metrics_router.get('/http-client', status_code=status.HTTP_200_OK)
+async def get_http_client_metrics(token_details: dict = Depends(access_token_bearer)) -> dict:
+    return get_http_client_stats()
+
+
+# nav snapshot cache hit, miss and staleness counters
+@metrics_router.get('/nav-cache', status_code=status.HTTP_200_OK)
+async def get_nav_cache_metrics(token_details: dict = Depends(access_token_bearer)) -> dict:
+    return nav_snapshot_cache.stats()
+
+
+# nav provider concurrency, retry and circuit breaker state
+@metrics_router.get('/nav-provider', status_code=status.HTTP_200_OK)
+async def get_nav_provider_metrics(token_details: dict = Depends(access_token_bearer)) -> dict:
+    return nav_provider.stats()
+
+
+# requests left in today's and this month's provider quota, and the shared token bucket
+@metrics_router.get('/nav-provider/quota', status_code=status.HTTP_200_OK)
+async def get_nav_provider_quota(token_details: dict = Depends(access_token_bearer)) -> dict:
+    return await nav_rate_limiter.quota()
+
+
+# tasks waiting in each celery queue and how long the oldest one has waited
+@metrics_router.get('/queues', status_code=status.HTTP_200_OK)
+async def get_queue_metrics(token_details: dict = Depends(access_token_bearer)) -> dict:
+    return await get_queue_stats(broker_store)
+
+
+# tasks buffered in this process on their way to the broker
+@metrics_router.get('/task-publisher', status_code=status.HTTP_200_OK)
+async def get_task_publisher_metrics(token_details: dict = Depends(access_token_bearer)) -> dict:
+    return task_publisher.stats()
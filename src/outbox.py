@@ -0,0 +1,265 @@
+"""
+Transactional outbox relay.
+
+Services write OutboxMessage rows in the same transaction as the change they
+announce. The relay claims pending rows with FOR UPDATE SKIP LOCKED, publishes
+them to celery with the outbox id as task id and marks them published. A run of
+emails in one batch is published as a single send_emails task, each email
+carrying its outbox id. Run as many relays as needed from the project root:
+
+    python -m src.outbox
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from redis.exceptions import RedisError
+from src.celery import c_app
+from src.config import config_obj
+from src.db.models import OutboxMessage
+from src.queues import task_routes
+from typing import List, Optional
+import asyncio
+import logging
+import redis
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+DOMAIN_EVENT_TASK = "src.celery_tasks.handle_domain_event"
+SEND_EMAIL_TASK = "src.celery_tasks.send_email"
+SEND_EMAILS_TASK = "src.celery_tasks.send_emails"
+
+# the positional arguments of send_email, a coalesced email is the dict of them
+EMAIL_FIELDS = ("recipients", "subject", "body")
+
+# oldest pending messages first; rows another relay holds are skipped, not waited for
+CLAIM_PENDING = text("""
+    SELECT outbox_id, task_name, args, kwargs
+    FROM outbox
+    WHERE published_at IS NULL
+    ORDER BY created_at
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+""")
+
+MARK_PUBLISHED = text("""
+    UPDATE outbox
+    SET published_at = now(), attempts = attempts + 1, last_error = NULL
+    WHERE outbox_id = ANY(:outbox_ids)
+""")
+
+MARK_FAILED = text("""
+    UPDATE outbox
+    SET attempts = attempts + 1, last_error = :error
+    WHERE outbox_id = :outbox_id
+""")
+
+PURGE_PUBLISHED = text("""
+    DELETE FROM outbox
+    WHERE published_at < now() - make_interval(hours => :hours)
+""")
+
+# a relay that stopped between publishing and marking re-sends with the same task id, workers drop the repeat
+# a task claims its id for DELIVERY_CLAIM_TTL while it runs and keeps it for DELIVERY_KEY_TTL once it succeeded,
+# so a redelivery after a worker crash or visibility timeout runs once the claim lapses instead of being dropped
+DELIVERY_KEY_PREFIX = "outbox-delivered:"
+DELIVERY_CLAIM_TTL = 10 * 60
+DELIVERY_KEY_TTL = 7 * 24 * 3600
+
+delivery_store = redis.Redis.from_url(config_obj.REDIS_URL)
+
+
+# queue a celery task, it is published only if the caller's transaction commits
+def add_outbox_task(session: AsyncSession, task_name: str, *args, **kwargs) -> OutboxMessage:
+    message = OutboxMessage(task_name=task_name, args=list(args), kwargs=kwargs)
+    session.add(message)
+    return message
+
+
+# record a domain event in the caller's transaction
+def add_domain_event(session: AsyncSession, event_type: str, payload: dict) -> OutboxMessage:
+    return add_outbox_task(session, DOMAIN_EVENT_TASK, event_type, payload)
+
+
+# true when this task id already ran or is running elsewhere, retries of the same task are not repeats
+def is_duplicate_delivery(task) -> bool:
+    if task.request.retries or task.request.id is None:
+        return False
+
+    return not claim_delivery(task.request.id)
+
+
+# the task went through, keep its id long enough to drop any later repeat
+def confirm_delivery(task) -> None:
+    if task.request.id is not None:
+        confirm_delivery_id(task.request.id)
+
+
+# the task failed for good, a redelivery of the same id may run it again
+def release_delivery(task) -> None:
+    if task.request.id is not None:
+        release_delivery_id(task.request.id)
+
+
+# claim one delivery id for the length of a run, false when it already ran or is running elsewhere
+# a coalesced email claims its outbox id, the same key a lone send_email task of that row would use
+def claim_delivery(delivery_id: str) -> bool:
+    try:
+        return bool(delivery_store.set(f"{DELIVERY_KEY_PREFIX}{delivery_id}", 1, nx=True, ex=DELIVERY_CLAIM_TTL))
+    except (RedisError, OSError) as e:
+        logger.warning("could not check outbox delivery of %s: %s", delivery_id, e)
+        return True
+
+
+def confirm_delivery_id(delivery_id: str) -> None:
+    try:
+        delivery_store.set(f"{DELIVERY_KEY_PREFIX}{delivery_id}", 1, ex=DELIVERY_KEY_TTL)
+    except (RedisError, OSError) as e:
+        logger.warning("could not record outbox delivery of %s: %s", delivery_id, e)
+
+
+def release_delivery_id(delivery_id: str) -> None:
+    try:
+        delivery_store.delete(f"{DELIVERY_KEY_PREFIX}{delivery_id}")
+    except (RedisError, OSError) as e:
+        logger.warning("could not release outbox delivery of %s: %s", delivery_id, e)
+
+
+# drains the outbox to the broker in batches
+class OutboxRelay:
+
+    def __init__(self, app=None, batch_size: int = None, poll_interval: float = None, retention_hours: float = None,
+                 purge_interval: float = None):
+        self.app = app or c_app
+        self.batch_size = batch_size or config_obj.OUTBOX_BATCH_SIZE
+        self.poll_interval = config_obj.OUTBOX_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.retention_hours = config_obj.OUTBOX_RETENTION_HOURS if retention_hours is None else retention_hours
+        self.purge_interval = config_obj.OUTBOX_PURGE_INTERVAL if purge_interval is None else purge_interval
+
+        self._purged_at = 0.0
+
+        self.counters = {
+            "batches": 0,
+            "published": 0,
+            "failed": 0,
+            "purged": 0
+        }
+
+    # claim one batch, publish it and mark what went out, all in one transaction; returns the rows claimed
+    async def relay_once(self, session: AsyncSession) -> int:
+        result = await session.execute(CLAIM_PENDING, {"batch_size": self.batch_size})
+        rows = result.all()
+
+        if not rows:
+            await session.commit()
+            return 0
+
+        published, failure = await asyncio.to_thread(self._publish, rows)
+
+        if published:
+            await session.execute(MARK_PUBLISHED, {"outbox_ids": published})
+
+        if failure is not None:
+            outbox_id, error = failure
+            await session.execute(MARK_FAILED, {"outbox_id": outbox_id, "error": error[:500]})
+
+        await session.commit()
+
+        self.counters["batches"] += 1
+        self.counters["published"] += len(published)
+
+        if failure is not None:
+            self.counters["failed"] += 1
+            raise ConnectionError(f"outbox message {failure[0]} could not be published: {failure[1]}")
+
+        return len(rows)
+
+    # runs on a thread, one producer for the batch; stops at the first failure so messages keep their order
+    def _publish(self, rows) -> tuple:
+        published: List = []
+
+        with self.app.producer_or_acquire() as producer:
+            for group in self._coalesce(rows):
+                try:
+                    if len(group) == 1:
+                        outbox_id, task_name, args, kwargs = group[0]
+                        self.app.send_task(task_name, args=args, kwargs=kwargs, task_id=str(outbox_id), producer=producer)
+                    else:
+                        # a run of emails, e.g. a signup burst, goes out as one send_emails task so the worker sends them
+                        # in mailer batches; it keeps the transactional queue and priority of send_email
+                        emails = [{**dict(zip(EMAIL_FIELDS, args)), **kwargs, "delivery_id": str(outbox_id)}
+                                  for outbox_id, _, args, kwargs in group]
+                        self.app.send_task(SEND_EMAILS_TASK, args=[emails], producer=producer, **task_routes[SEND_EMAIL_TASK])
+                except Exception as e:
+                    return published, (group[0][0], repr(e))
+
+                published.extend(outbox_id for outbox_id, *_ in group)
+
+        return published, None
+
+    # consecutive send_email rows are grouped, every other row stands alone
+    @staticmethod
+    def _coalesce(rows) -> List[list]:
+        groups: List[list] = []
+
+        for row in rows:
+            if row[1] == SEND_EMAIL_TASK and groups and groups[-1][-1][1] == SEND_EMAIL_TASK:
+                groups[-1].append(row)
+            else:
+                groups.append([row])
+
+        return groups
+
+    async def purge(self, session: AsyncSession) -> int:
+        result = await session.execute(PURGE_PUBLISHED, {"hours": self.retention_hours})
+        await session.commit()
+
+        self.counters["purged"] += result.rowcount
+        return result.rowcount
+
+    # relay until stop is set, a full batch is followed by the next one straight away
+    async def run(self, engine, stop: Optional[asyncio.Event] = None) -> None:
+        stop = stop or asyncio.Event()
+        delay = self.poll_interval
+
+        while not stop.is_set():
+            try:
+                async with AsyncSession(engine, expire_on_commit=False) as session:
+                    claimed = await self.relay_once(session)
+
+                    if time.monotonic() - self._purged_at >= self.purge_interval:
+                        await self.purge(session)
+                        self._purged_at = time.monotonic()
+
+                delay = self.poll_interval
+            except Exception as e:
+                # broker or database trouble, back off and try the same rows again
+                logger.warning("outbox relay failed: %s", e)
+                claimed = 0
+                delay = min(delay * 2, 30.0)
+
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+
+async def main() -> None:
+    engine = create_async_engine(config_obj.DEV_DATABASE_URL, pool_pre_ping=True)
+    stop = asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    try:
+        await OutboxRelay().run(engine, stop)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
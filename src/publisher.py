@@ -0,0 +1,179 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.celery import c_app
+from src.config import config_obj
+from src.errors import PublisherBusy
+from typing import List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# a task waiting to be published, the future gets the task id once the broker has it
+class _PendingTask:
+
+    __slots__ = ("task", "args", "kwargs", "future")
+
+    def __init__(self, task, args: tuple, kwargs: dict, future: asyncio.Future):
+        self.task = task
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+
+
+# publishes celery tasks for async handlers without blocking the event loop
+# handlers put tasks in a bounded buffer, one background loop drains it in batches over a single pooled producer
+class AsyncTaskPublisher:
+
+    def __init__(self, app=None, max_buffer: int = None, batch_size: int = None, linger: float = None,
+                 enqueue_timeout: float = None):
+        self.app = app or c_app
+        self.max_buffer = max_buffer or config_obj.TASK_PUBLISHER_MAX_BUFFER
+        self.batch_size = batch_size or config_obj.TASK_PUBLISHER_BATCH_SIZE
+        self.linger = config_obj.TASK_PUBLISHER_LINGER if linger is None else linger
+        self.enqueue_timeout = config_obj.TASK_PUBLISHER_ENQUEUE_TIMEOUT if enqueue_timeout is None else enqueue_timeout
+
+        # the broker client is blocking, it runs on one thread so publishes keep their order and share a connection
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._drainer: Optional[asyncio.Task] = None
+        self._loop = None
+
+        self.last_batch: dict = {}
+        self.counters = {
+            "published": 0,
+            "failed": 0,
+            "rejected_full": 0,
+            "batches": 0
+        }
+
+    # the buffer and the drain loop belong to the loop that runs the app
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        if self._drainer is not None and not self._drainer.done() and self._loop is loop:
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-publisher")
+
+        self._queue = asyncio.Queue(maxsize=self.max_buffer)
+        self._loop = loop
+        self._drainer = loop.create_task(self._drain())
+
+    # publish whatever is buffered, then stop the drain loop and release the producer thread
+    async def stop(self) -> None:
+        if self._drainer is not None and not self._drainer.done():
+            await self._queue.join()
+            self._drainer.cancel()
+
+            try:
+                await self._drainer
+            except asyncio.CancelledError:
+                pass
+
+        self._drainer = None
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    # buffer a task for publishing; waits while the buffer is full and gives up after enqueue_timeout
+    # the returned future resolves to the task id, handlers do not need to wait for it
+    async def publish(self, task, *args, **kwargs) -> asyncio.Future:
+        self.start()
+
+        future = self._loop.create_future()
+        pending = _PendingTask(task, args, kwargs, future)
+
+        try:
+            self._queue.put_nowait(pending)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(pending), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.counters["rejected_full"] += 1
+                raise PublisherBusy()
+
+        return future
+
+    async def _drain(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+
+            # tasks that arrive within the linger go out with this one
+            deadline = self._loop.time() + self.linger
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+
+                try:
+                    batch.append(self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout))
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+
+            try:
+                await self._send(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send(self, batch: List[_PendingTask]) -> None:
+        start_time = time.perf_counter()
+
+        try:
+            outcomes = await self._loop.run_in_executor(self._executor, self._publish_batch, batch)
+        except Exception as e:
+            # no producer could be had, every task of the batch failed
+            outcomes = [e] * len(batch)
+
+        failed = 0
+
+        for pending, outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                failed += 1
+                logger.error("could not publish task %s: %s", pending.task.name, outcome)
+
+                if not pending.future.done():
+                    pending.future.set_exception(outcome)
+                    # already logged, handlers that do not wait for the id should not log it again
+                    pending.future.exception()
+            elif not pending.future.done():
+                pending.future.set_result(outcome)
+
+        self.counters["batches"] += 1
+        self.counters["published"] += len(batch) - failed
+        self.counters["failed"] += failed
+        self.last_batch = {
+            "size": len(batch),
+            "failed": failed,
+            "elapsed_seconds": round(time.perf_counter() - start_time, 4)
+        }
+
+    # runs on the publisher thread, one producer from the app's pool for the whole batch
+    def _publish_batch(self, batch: List[_PendingTask]) -> list:
+        outcomes = []
+
+        with self.app.producer_or_acquire() as producer:
+            for pending in batch:
+                try:
+                    result = pending.task.apply_async(pending.args, pending.kwargs, producer=producer)
+                    outcomes.append(result.id)
+                except Exception as e:
+                    outcomes.append(e)
+
+        return outcomes
+
+    def stats(self) -> dict:
+        return {
+            "running": self._drainer is not None and not self._drainer.done(),
+            "buffered": self._queue.qsize() if self._queue is not None else 0,
+            "max_buffer": self.max_buffer,
+            "batch_size": self.batch_size,
+            **self.counters,
+            "last_batch": self.last_batch
+        }
+
+
+# the api process publisher, started and stopped with the app
+task_publisher = AsyncTaskPublisher()
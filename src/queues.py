@@ -0,0 +1,104 @@
+from kombu import Queue
+from redis.exceptions import RedisError
+from typing import List
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# one queue per workload, so a burst of one never sits in front of the others
+EMAIL_TRANSACTIONAL_QUEUE = "email.transactional"
+EMAIL_BULK_QUEUE = "email.bulk"
+NAV_QUEUE = "nav"
+EVENTS_QUEUE = "events"
+DEFAULT_QUEUE = "celery"
+
+# a worker consuming several queues drains them in this order
+QUEUE_ORDER = [EMAIL_TRANSACTIONAL_QUEUE, NAV_QUEUE, EVENTS_QUEUE, EMAIL_BULK_QUEUE, DEFAULT_QUEUE]
+
+# redis keeps one list per priority step, 0 is served first
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEP = ":"
+
+# prefetch multiplier of a worker that only consumes these queues, the long nav tasks are taken one at a time
+QUEUE_PREFETCH = {
+    EMAIL_TRANSACTIONAL_QUEUE: 4,
+    EMAIL_BULK_QUEUE: 8,
+    NAV_QUEUE: 1,
+    EVENTS_QUEUE: 4,
+    DEFAULT_QUEUE: 4
+}
+
+# header stamped on every published task, the age of the oldest one is the queue latency
+PUBLISHED_AT_HEADER = "published_at"
+
+task_queues = [
+    Queue(name, routing_key=name, queue_arguments={"x-max-priority": PRIORITY_STEPS[-1]})
+    for name in QUEUE_ORDER
+]
+
+task_routes = {
+    "src.celery_tasks.send_email": {"queue": EMAIL_TRANSACTIONAL_QUEUE, "priority": 0},
+    "src.celery_tasks.send_emails": {"queue": EMAIL_BULK_QUEUE, "priority": 6},
+    "src.celery_tasks.check_investments": {"queue": NAV_QUEUE, "priority": 3},
+    "src.celery_tasks.revalue_nav_shard": {"queue": NAV_QUEUE, "priority": 3},
+    "src.celery_tasks.finalize_nav_revaluation": {"queue": NAV_QUEUE, "priority": 2},
+    "src.celery_tasks.abandon_nav_revaluation": {"queue": NAV_QUEUE, "priority": 2},
+    "src.celery_tasks.handle_domain_event": {"queue": EVENTS_QUEUE, "priority": 4}
+}
+
+
+# the smallest prefetch of the queues a worker was started with, None when one of them is not known here
+def prefetch_for_queues(queues: List[str]):
+    if not queues or any(name not in QUEUE_PREFETCH for name in queues):
+        return None
+
+    return min(QUEUE_PREFETCH[name] for name in queues)
+
+
+# the redis lists behind a queue, one per priority step
+def priority_keys(name: str) -> List[str]:
+    return [name if step == 0 else f"{name}{PRIORITY_SEP}{step}" for step in PRIORITY_STEPS]
+
+
+# depth and age of the oldest waiting task of every queue, read straight from the broker
+async def get_queue_stats(redis) -> dict:
+    now = time.time()
+    stats = {}
+
+    for name in QUEUE_ORDER:
+        keys = priority_keys(name)
+
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.llen(key)
+                    # kombu pushes on the left and pops from the right, the oldest task is last
+                    pipe.lindex(key, -1)
+                replies = await pipe.execute()
+        except (RedisError, OSError) as e:
+            logger.warning("could not read celery queue %s: %s", name, e)
+            stats[name] = {"available": False}
+            continue
+
+        depths = replies[0::2]
+        oldest = [published_at(message) for message in replies[1::2] if message is not None]
+        oldest = [value for value in oldest if value is not None]
+
+        stats[name] = {
+            "available": True,
+            "depth": sum(depths),
+            "depth_by_priority": {step: depth for step, depth in zip(PRIORITY_STEPS, depths) if depth},
+            "oldest_wait_seconds": round(max(0.0, now - min(oldest)), 3) if oldest else 0.0,
+            "prefetch_multiplier": QUEUE_PREFETCH[name]
+        }
+
+    return stats
+
+
+def published_at(message):
+    try:
+        return json.loads(message)["headers"].get(PUBLISHED_AT_HEADER)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
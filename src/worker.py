@@ -0,0 +1,96 @@
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from celery.concurrency import get_implementation
+from celery.exceptions import ImproperlyConfigured
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from src.config import config_obj
+from src.http_client import close_http_client
+from src.mail import mailer
+from typing import Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# pools that run one task at a time per process, the runtime's loop, engine and smtp connection are not shared across threads
+SUPPORTED_POOLS = ("prefork", "solo")
+
+
+# one event loop and one database engine per celery worker process, reused by every task it runs
+class WorkerRuntime:
+
+    def __init__(self, database_url: str = None):
+        self.database_url = database_url or config_obj.DEV_DATABASE_URL
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.engine: Optional[AsyncEngine] = None
+
+    # pooled connections, the http client and the smtp connection belong to the loop they were opened on, so the loop outlives the task
+    def start(self) -> None:
+        if self.loop is not None and not self.loop.is_closed():
+            return
+
+        self.loop = asyncio.new_event_loop()
+        self.engine = create_async_engine(self.database_url, pool_pre_ping=True)
+
+    # run a coroutine to completion on the worker loop
+    def run(self, coro):
+        # the solo pool never fires worker_process_init, start on first use instead
+        self.start()
+
+        if self.loop.is_running():
+            coro.close()
+            raise RuntimeError(f"the worker runtime is already running a task, run workers with -P {' or -P '.join(SUPPORTED_POOLS)}")
+
+        return self.loop.run_until_complete(coro)
+
+    def session(self) -> AsyncSession:
+        self.start()
+        return AsyncSession(self.engine, expire_on_commit=False)
+
+    def close(self) -> None:
+        if self.loop is None or self.loop.is_closed():
+            return
+
+        try:
+            self.loop.run_until_complete(self.engine.dispose())
+            self.loop.run_until_complete(close_http_client())
+            self.loop.run_until_complete(mailer.close())
+        finally:
+            self.loop.close()
+            self.loop = None
+            self.engine = None
+
+
+worker_runtime = WorkerRuntime()
+
+
+# thread, gevent and eventlet pools would run several tasks at once on the one runtime of the process
+def check_worker_pool(pool_cls) -> None:
+    pool = get_implementation(pool_cls)
+
+    if pool not in {get_implementation(name) for name in SUPPORTED_POOLS}:
+        raise ImproperlyConfigured(f"worker pool {pool.__module__} is not supported, run workers with -P {' or -P '.join(SUPPORTED_POOLS)}")
+
+
+@worker_init.connect
+def reject_unsupported_pool(sender=None, **kwargs):
+    try:
+        check_worker_pool(sender.pool_cls)
+    except ImproperlyConfigured as e:
+        # celery only logs exceptions raised by signal handlers, exiting is what stops the worker
+        logger.critical("%s", e)
+        raise SystemExit(str(e))
+
+
+# a forked child must not reuse the parent's sockets, it opens its own loop and pool
+@worker_process_init.connect
+def start_worker_runtime(**kwargs):
+    worker_runtime.start()
+
+
+@worker_process_shutdown.connect
+def close_worker_runtime(**kwargs):
+    try:
+        worker_runtime.close()
+    except Exception as e:
+        logger.warning("could not close the worker runtime cleanly: %s", e)
@@ -1,5 +1,8 @@
 from src.db.models import User
 from sqlmodel import select
+from unittest.mock import AsyncMock
+from src.investment.utils import NavSnapshot
+from src.investment.nav_index import NavIndex
 
 access_token = None
 
@@ -152,6 +155,69 @@ async def test_integrate_get_investment(client, db_session_integration):
     print("Retrieved Investment:", investment)
 
 
+async def test_integrate_update_all_navs(client, db_session_integration, monkeypatch):
+    global access_token
+    scheme_code = 100044
+
+    # serve a fixed snapshot instead of calling RapidAPI
+    snapshot = NavSnapshot(
+        index=NavIndex.from_payload([
+            {"Scheme_Code": scheme_code, "Net_Asset_Value": 170.5, "Date": "25-Feb-2025"}
+        ]),
+        fetch_count=1,
+        bytes_downloaded=0,
+        elapsed=0.0
+    )
+    monkeypatch.setattr("src.investment.services.get_nav_snapshot", AsyncMock(return_value=snapshot))
+
+    response = await client.post("api/v1/investment/update-all-navs")
+
+    assert response.status_code == 200
+    assert response.json()["updated"] >= 1
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = await client.get(f"api/v1/investment/get-an-investment/{scheme_code}", headers=headers)
+
+    investment = response.json()
+    assert investment["nav"] == 170.5
+    assert investment["date"] == "25-Feb-2025"
+    assert investment["current_value"] == round(170.5 * investment["units"], 4)
+
+
+async def test_integrate_update_all_navs_corrects_stale_holdings(client, db_session_integration, monkeypatch):
+    global access_token
+    scheme_code = 100044
+
+    # same snapshot as the previous run, the scheme's nav has not moved
+    snapshot = NavSnapshot(
+        index=NavIndex.from_payload([
+            {"Scheme_Code": scheme_code, "Net_Asset_Value": 170.5, "Date": "25-Feb-2025"}
+        ]),
+        fetch_count=1,
+        bytes_downloaded=0,
+        elapsed=0.0
+    )
+    monkeypatch.setattr("src.investment.services.get_nav_snapshot", AsyncMock(return_value=snapshot))
+
+    # a client writes a value that does not match the nav
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = await client.patch("api/v1/investment", json={"scheme_code": scheme_code, "units": 10, "current_value": 1.0}, headers=headers)
+    assert response.status_code == 200
+
+    response = await client.post("api/v1/investment/update-all-navs")
+
+    assert response.status_code == 200
+    assert response.json()["changed_schemes"] == 0
+    assert response.json()["updated"] == 1
+    assert response.json()["corrected_users"] == 1
+
+    response = await client.get(f"api/v1/investment/get-an-investment/{scheme_code}", headers=headers)
+    assert response.json()["current_value"] == 1705.0
+
+    response = await client.get("api/v1/investment/portfolio/summary", headers=headers)
+    assert response.json()["total_value"] == 1705.0
+
+
 async def test_integrate_delete_investment(client, db_session_integration):
     global access_token
     scheme_code = 100044
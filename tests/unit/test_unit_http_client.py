@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import pytest
+from src.http_client import get_http_client, close_http_client, get_http_client_stats, retired_http_clients
+
+
+"""
+- [ ] Pooled http client related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_http_client_is_shared():
+    client = get_http_client()
+
+    assert get_http_client() is client
+    assert get_http_client_stats()["active"] is True
+    assert get_http_client_stats()["requests_total"] == 0
+
+    await close_http_client()
+
+    assert client.is_closed
+    assert get_http_client_stats()["active"] is False
+    assert get_http_client() is not client
+
+    await close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_unit_http_client_closes_clients_of_other_loops():
+    async def open_client():
+        return get_http_client()
+
+    # a client opened on a loop that has since finished is kept and closed with the current one
+    stale = await asyncio.to_thread(asyncio.run, open_client())
+
+    assert get_http_client() is not stale
+    assert retired_http_clients == [stale]
+
+    await close_http_client()
+
+    assert stale.is_closed
+    assert retired_http_clients == []
+
+    # a client whose loop still runs in another thread is closed on that loop
+    running_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=running_loop.run_forever, daemon=True)
+    thread.start()
+
+    try:
+        other = asyncio.run_coroutine_threadsafe(open_client(), running_loop).result(5)
+
+        assert get_http_client() is not other
+
+        for _ in range(50):
+            if other.is_closed:
+                break
+            await asyncio.sleep(0.01)
+
+        assert other.is_closed
+        assert retired_http_clients == []
+    finally:
+        running_loop.call_soon_threadsafe(running_loop.stop)
+        thread.join(5)
+        running_loop.close()
+
+    await close_http_client()
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from pydantic import ValidationError
 from src.db.models import Investment
@@ -5,6 +6,7 @@ from src.investment.schemas import InvestmentCreateSchema
 from tests.factories.models_factory import MockInvestment, MockInvestmentUpdate, MockInvestmentDelete, MockInvestmentFetch
 from faker import Faker
 from unittest.mock import AsyncMock
+from sqlalchemy.dialects import postgresql
 from src.config import config_obj
 from datetime import datetime, timedelta
 import jwt
@@ -517,3 +519,761 @@ async def test_get_investment_invalid_token(client, mock_session, monkeypatch):
 
     assert response.status_code == 403
     assert response.json()["detail"] == "Not authenticated"
+
+
+"""
+- [ ] Update NAV of all investments related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_update_nav_fetches_feed_once(mock_session, monkeypatch):
+    from src.investment.services import InvestmentService
+    from src.investment.utils import NavSnapshot
+    from src.investment.nav_index import NavIndex
+
+    snapshot = NavSnapshot(
+        index=NavIndex.from_payload([
+            {"Scheme_Code": 100044, "Net_Asset_Value": 163.694, "Date": "24-Feb-2025"},
+            {"Scheme_Code": 119551, "Net_Asset_Value": 103.523, "Date": "24-Feb-2025"}
+        ]),
+        fetch_count=1,
+        bytes_downloaded=2048,
+        elapsed=0.5
+    )
+    get_nav_snapshot = AsyncMock(return_value=snapshot)
+    revalue_investments = AsyncMock(return_value={"staged": 2, "updated": 3, "missing_scheme_codes": [999999]})
+
+    monkeypatch.setattr("src.investment.services.get_nav_snapshot", get_nav_snapshot)
+    monkeypatch.setattr("src.investment.services.revalue_investments", revalue_investments)
+    monkeypatch.setattr("src.investment.services.nav_snapshot_cache.put", AsyncMock())
+
+    from src.investment.services import nav_snapshot_cache
+
+    result = await InvestmentService().update_nav_for_all_investments(mock_session)
+
+    get_nav_snapshot.assert_awaited_once()
+    revalue_investments.assert_awaited_once_with(mock_session, snapshot.index, on_progress=None)
+    nav_snapshot_cache.put.assert_awaited_once_with("open-schemes", snapshot.index)
+    mock_session.commit.assert_awaited_once()
+    assert result["updated"] == 3
+    assert result["missing_scheme_codes"] == [999999]
+    assert result["fetch_count"] == 1
+    assert result["bytes_downloaded"] == 2048
+
+
+def test_unit_check_investments_task_reports_progress(monkeypatch):
+    from unittest.mock import MagicMock
+    from src.celery_tasks import check_investments
+    from src.worker import WorkerRuntime
+
+    async def run_nav_revaluation(session, on_progress=None):
+        on_progress({"stage": "fetched", "fetch_count": 1})
+        on_progress({"stage": "revaluing", "chunks": 1, "updated": 3})
+        return {"message": "All NAVs have been updated successfully.", "updated": 3}
+
+    runtime = WorkerRuntime()
+    update_state = MagicMock()
+
+    monkeypatch.setattr("src.celery_tasks.worker_runtime", runtime)
+    monkeypatch.setattr("src.celery_tasks.config_obj.NAV_REVALUATION_SHARDS", 1)
+    monkeypatch.setattr("src.celery_tasks.investment_service.run_nav_revaluation", run_nav_revaluation)
+    monkeypatch.setattr(check_investments, "update_state", update_state)
+
+    try:
+        result = check_investments.apply().get()
+        loop = runtime.loop
+
+        # a second run reuses the worker loop and engine
+        check_investments.apply().get()
+        assert runtime.loop is loop
+    finally:
+        runtime.close()
+
+    assert result["updated"] == 3
+    assert update_state.call_args_list[0].kwargs == {"state": "PROGRESS", "meta": {"stage": "fetched", "fetch_count": 1}}
+    assert update_state.call_count == 4
+
+
+def test_unit_worker_runtime_rejects_thread_pools():
+    from types import SimpleNamespace
+    from celery.concurrency.prefork import TaskPool
+    from src.worker import WorkerRuntime, check_worker_pool, reject_unsupported_pool
+
+    check_worker_pool("prefork")
+    check_worker_pool("solo")
+    check_worker_pool(TaskPool)
+
+    # a worker started with a thread pool stops before it takes any task
+    with pytest.raises(SystemExit):
+        reject_unsupported_pool(sender=SimpleNamespace(pool_cls="threads"))
+
+    # a second task reaching the runtime while one runs fails clearly instead of corrupting the loop
+    runtime = WorkerRuntime()
+
+    async def nested():
+        with pytest.raises(RuntimeError, match="-P prefork or -P solo"):
+            runtime.run(asyncio.sleep(0))
+
+    try:
+        runtime.run(nested())
+    finally:
+        runtime.close()
+
+
+def test_unit_check_investments_fans_out_shards(monkeypatch):
+    from unittest.mock import MagicMock
+    from src.celery import c_app
+    from src.celery_tasks import check_investments, revalue_nav_shard
+    from src.investment.services import InvestmentService
+    from src.worker import WorkerRuntime
+
+    prepared = {"run_id": "41c60b24-ad18-49f3-852c-08ec7670b1f0", "staged": 2000, "changed_schemes": 1500, "started_at": 0.0}
+    shards_seen = []
+
+    async def revalue_nav_shard_service(session, run_id, shard, shard_count, on_progress=None):
+        shards_seen.append((run_id, shard, shard_count))
+        return {"shard": shard, "chunks": 1, "scanned": 10 * (shard + 1), "updated": 10 * (shard + 1), "elapsed_seconds": 0.1}
+
+    finalize_revaluation = AsyncMock(return_value={"history_rows": 1500, "summaries_refreshed": 40, "missing_scheme_codes": []})
+    runtime = WorkerRuntime()
+    service = InvestmentService()
+    results = []
+
+    # the chord callback's result lives in the result backend, keep a copy here
+    async def finalize_nav_revaluation(session, prepared, shard_results):
+        results.append(await InvestmentService.finalize_nav_revaluation(service, session, prepared, shard_results))
+        return results[-1]
+
+    monkeypatch.setattr(c_app.conf, "task_always_eager", True)
+    monkeypatch.setattr("src.celery_tasks.worker_runtime", runtime)
+    monkeypatch.setattr("src.celery_tasks.config_obj.NAV_REVALUATION_SHARDS", 3)
+    monkeypatch.setattr("src.celery_tasks.investment_service", service)
+    monkeypatch.setattr(service, "finalize_nav_revaluation", finalize_nav_revaluation)
+    monkeypatch.setattr("src.celery_tasks.investment_service.prepare_nav_revaluation", AsyncMock(return_value=prepared))
+    monkeypatch.setattr("src.celery_tasks.investment_service.revalue_nav_shard", revalue_nav_shard_service)
+    monkeypatch.setattr("src.investment.services.finalize_revaluation", finalize_revaluation)
+    monkeypatch.setattr(check_investments, "update_state", MagicMock())
+    monkeypatch.setattr(revalue_nav_shard, "update_state", MagicMock())
+
+    try:
+        dispatched = check_investments.apply().get()
+    finally:
+        runtime.close()
+
+    assert dispatched["shards"] == 3
+    assert sorted(shards_seen) == [(prepared["run_id"], shard, 3) for shard in range(3)]
+    finalize_revaluation.assert_awaited_once()
+    assert [shard_result["shard"] for shard_result in results[0]["shards"]] == [0, 1, 2]
+    assert results[0]["updated"] == 60
+    assert results[0]["summaries_refreshed"] == 40
+
+
+def test_unit_shard_bounds_cover_every_id():
+    import uuid
+    from src.investment.revaluation import shard_bounds, FIRST_INVESTMENT_ID, LAST_INVESTMENT_ID
+
+    bounds = [shard_bounds(shard, 4) for shard in range(4)]
+
+    assert bounds[0][0] == FIRST_INVESTMENT_ID
+    assert bounds[-1][1] == LAST_INVESTMENT_ID
+    # every shard starts after the id the previous one ends on
+    assert all(bounds[shard][1] == bounds[shard + 1][0] for shard in range(3))
+    assert shard_bounds(0, 1) == (FIRST_INVESTMENT_ID, LAST_INVESTMENT_ID)
+
+    with pytest.raises(ValueError):
+        shard_bounds(4, 4)
+
+
+def test_unit_nav_staging_records_skip_invalid_navs_and_dates():
+    import uuid
+    from src.investment.nav_index import NavIndex
+    from src.investment.revaluation import nav_staging_records
+
+    run_id = uuid.uuid4()
+    index = NavIndex.from_payload([
+        {"Scheme_Code": 100044, "Net_Asset_Value": 163.69437, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 119551, "Net_Asset_Value": "N.A.", "Date": "24-Feb-2025"},
+        {"Scheme_Code": 119552, "Net_Asset_Value": None, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 119553, "Net_Asset_Value": 10.5, "Date": "31-Feb-2025"},
+        {"Scheme_Code": 119554, "Net_Asset_Value": 10.5, "Date": "2025-02-24"},
+        {"Scheme_Code": 119555, "Net_Asset_Value": 10.5},
+        {"Scheme_Code": 119556, "Net_Asset_Value": 12.25, "Date": "24-Feb-2025"}
+    ])
+
+    assert nav_staging_records(index, run_id) == [
+        (run_id, 100044, 163.69437, "24-Feb-2025"),
+        (run_id, 119556, 12.25, "24-Feb-2025")
+    ]
+
+
+"""
+- [ ] NavIndex related tests
+"""
+
+def test_unit_nav_index_lookups():
+    from src.investment.nav_index import NavIndex
+
+    index = NavIndex.from_payload([
+        {"Scheme_Code": 100044, "Scheme_Name": "Liquid Fund", "Net_Asset_Value": 163.694, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 119551, "Scheme_Name": "Banking & PSU Debt Fund", "Net_Asset_Value": 103.523, "Date": "24-Feb-2025"}
+    ])
+
+    assert len(index) == 2
+    assert 100044 in index
+    assert index.get(119551)["Net_Asset_Value"] == 103.523
+    assert index.get(999999) is None
+    assert list(index.get_many([100044, 999999])) == [100044]
+    assert index.to_fund_details()["fund_details"][100044] == {"Scheme_Name": "Liquid Fund", "Net_Asset_Value": 163.694, "Date": "24-Feb-2025"}
+    assert index.version == int(index.as_of.timestamp() * 1000)
+
+
+"""
+- [ ] Streaming NAV feed parser related tests
+"""
+
+def test_unit_stream_parser_matches_json_loads():
+    import json
+    from src.investment.streaming import JsonArrayStreamParser
+
+    payload = [
+        {"Scheme_Code": 100044, "Scheme_Name": "Liquid Fund – \"Retail\" [IDCW]", "Net_Asset_Value": 163.694},
+        {"Scheme_Code": 119551, "Scheme_Name": "Banking, PSU {Debt}", "Net_Asset_Value": 103.523},
+        12345,
+        "plain string"
+    ]
+    body = json.dumps(payload).encode("utf-8")
+
+    # every chunk size down to a single byte must give the same items
+    for chunk_size in (1, 2, 7, 64, len(body)):
+        parser = JsonArrayStreamParser()
+        items = []
+        for start in range(0, len(body), chunk_size):
+            items.extend(parser.feed(body[start:start + chunk_size]))
+        items.extend(parser.close())
+
+        assert items == payload
+
+
+def test_unit_stream_parser_invalid_payloads():
+    from src.investment.streaming import JsonArrayStreamParser
+
+    parser = JsonArrayStreamParser()
+    assert parser.feed(b" [ ] ") == []
+    assert parser.close() == []
+
+    parser = JsonArrayStreamParser()
+    assert parser.feed(b'[{"Scheme_Code": 1}, {"Scheme_') == [{"Scheme_Code": 1}]
+    with pytest.raises(ValueError):
+        parser.close()
+
+    with pytest.raises(ValueError):
+        JsonArrayStreamParser().feed(b'{"Scheme_Code": 1}')
+
+
+@pytest.mark.asyncio
+async def test_unit_revalue_investments_commits_per_chunk(mock_session, monkeypatch):
+    import uuid
+    from unittest.mock import MagicMock
+    from src.investment.nav_index import NavIndex
+    from src.investment.revaluation import revalue_investments, REFRESH_PORTFOLIO_SUMMARIES
+
+    first_chunk_last_id = uuid.uuid4()
+    second_chunk_last_id = uuid.uuid4()
+
+    corrected_user_id = uuid.uuid4()
+
+    chunk_results = [
+        (first_chunk_last_id, 2, 2, [corrected_user_id]),
+        (second_chunk_last_id, 1, 0, None)
+    ]
+
+    # every chunk query returns the next chunk row, the missing scheme query returns one code
+    def make_result(*args, **kwargs):
+        result = MagicMock()
+        result.rowcount = 0
+        result.one.side_effect = lambda: chunk_results.pop(0) if chunk_results else (None, 0, 0, None)
+        result.scalars.return_value.all.return_value = [999999]
+        return result
+
+    connection = AsyncMock()
+    connection.execute.side_effect = make_result
+    mock_session.connection.return_value = connection
+
+    monkeypatch.setattr("src.investment.revaluation.stage_nav_snapshot", AsyncMock(return_value=2))
+
+    progress = []
+    result = await revalue_investments(mock_session, NavIndex.from_payload([]), chunk_size=2, on_progress=progress.append)
+
+    # staged, one per chunk, then recording
+    assert [report["stage"] for report in progress] == ["staged", "revaluing", "revaluing", "recording"]
+    assert progress[1]["scanned"] == 2
+    assert progress[-1]["run_id"] == result["run_id"]
+    assert result["chunks"] == 2
+    assert result["scanned"] == 3
+    assert result["updated"] == 2
+    assert result["missing_scheme_codes"] == [999999]
+
+    # owners of holdings corrected outside the changed schemes get their summaries rebuilt
+    assert result["corrected_users"] == 1
+    summary_calls = [call for call in connection.execute.await_args_list if call.args[0] is REFRESH_PORTFOLIO_SUMMARIES]
+    assert summary_calls[0].args[1]["corrected_user_ids"] == [corrected_user_id]
+    # staging, one per chunk, the applied navs and the final staging cleanup
+    assert mock_session.commit.await_count == 5
+
+
+"""
+- [ ] NAV history related tests
+"""
+
+@pytest.mark.asyncio
+async def test_get_nav_history_success(client, mock_session, monkeypatch):
+    from datetime import date
+
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "12345"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    get_nav_history = AsyncMock(return_value=[(date(2025, 2, 24), 163.694), (date(2025, 2, 25), 164.01)])
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+    monkeypatch.setattr("src.investment.services.InvestmentService.get_nav_history", get_nav_history)
+
+    response = await client.get("/api/v1/investment/nav-history/100044?start_date=2025-02-01&end_date=2025-02-28", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["scheme_code"] == 100044
+    assert response.json()["navs"] == [
+        {"nav_date": "2025-02-24", "nav": 163.694},
+        {"nav_date": "2025-02-25", "nav": 164.01}
+    ]
+    assert get_nav_history.await_args.args[:3] == (100044, date(2025, 2, 1), date(2025, 2, 28))
+
+
+@pytest.mark.asyncio
+async def test_get_nav_history_invalid_range(client, mock_session, monkeypatch):
+
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "12345"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+
+    response = await client.get("/api/v1/investment/nav-history/100044?start_date=2025-03-01&end_date=2025-02-01", headers=headers)
+
+    assert response.status_code == 400
+    assert response.json()["error_code"] == "invalid_date_range"
+
+
+"""
+- [ ] data.json loader related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_file_snapshot_reparses_only_on_change(tmp_path):
+    import os
+    import json as json_module
+    from src.investment.utils import FileNavSnapshot
+
+    path = tmp_path / "data.json"
+    path.write_text(json_module.dumps([{"Scheme_Code": 100044, "Net_Asset_Value": 163.694, "Date": "24-Feb-2025"}]))
+
+    snapshot = FileNavSnapshot(str(path))
+
+    first = await snapshot.get_fund_details()
+    second = await snapshot.get_fund_details()
+
+    assert first is second
+    assert first["scheme_codes"] == [100044]
+    assert snapshot.parse_count == 1
+
+    path.write_text(json_module.dumps([
+        {"Scheme_Code": 100044, "Net_Asset_Value": 163.694, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 119551, "Net_Asset_Value": 103.523, "Date": "24-Feb-2025"}
+    ]))
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+
+    third = await snapshot.get_fund_details()
+
+    assert third["scheme_codes"] == [100044, 119551]
+    assert (await snapshot.get_index()).get(119551)["Net_Asset_Value"] == 103.523
+    assert snapshot.parse_count == 2
+
+
+"""
+- [ ] Fund data payload related tests
+"""
+
+def test_unit_encoded_payload_variants():
+    import gzip
+    import json as json_module
+    from src.investment.payloads import EncodedPayload
+
+    data = {"scheme_codes": [100044], "fund_details": {100044: {"Scheme_Name": "Fund A", "Net_Asset_Value": 163.694}}}
+    payload = EncodedPayload.from_data(data)
+
+    assert json_module.loads(payload.body) == json_module.loads(json_module.dumps(data))
+    assert gzip.decompress(payload.gzip) == payload.body
+    assert payload.select("gzip;q=1, br;q=0") == (payload.gzip, "gzip")
+    assert payload.select("identity") == (payload.body, None)
+    assert payload.select("") == (payload.body, None)
+    assert EncodedPayload.from_data(data).etags == payload.etags
+
+
+@pytest.mark.asyncio
+async def test_get_json_data_file_etag(client, mock_session, monkeypatch):
+    from src.investment.payloads import EncodedPayload
+
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "12345"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    payload = EncodedPayload.from_data({"scheme_codes": [100044], "fund_details": {100044: {"Scheme_Name": "Fund A"}}})
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+    monkeypatch.setattr("src.investment.services.InvestmentService.get_data_from_file", AsyncMock(return_value=payload))
+
+    headers = {"Authorization": f"Bearer {fake_token}", "Accept-Encoding": "gzip"}
+    response = await client.get("/api/v1/investment/get-json-data-file", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == payload.etags["gzip"]
+    assert response.json() == {"scheme_codes": [100044], "fund_details": {"100044": {"Scheme_Name": "Fund A"}}}
+
+    headers["If-None-Match"] = response.headers["etag"]
+    response = await client.get("/api/v1/investment/get-json-data-file", headers=headers)
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+"""
+- [ ] Fund catalogue related tests
+"""
+
+def make_catalogue_index():
+    from src.investment.nav_index import NavIndex
+
+    return NavIndex.from_payload([
+        {"Scheme_Code": 300, "Scheme_Name": "C", "Net_Asset_Value": 30.0, "Mutual_Fund_Family": "Axis Mutual Fund", "Scheme_Type": "Open Ended Schemes", "Scheme_Category": "Debt Scheme"},
+        {"Scheme_Code": 100, "Scheme_Name": "A", "Net_Asset_Value": 10.0, "Mutual_Fund_Family": "Axis Mutual Fund", "Scheme_Type": "Open Ended Schemes", "Scheme_Category": "Equity Scheme"},
+        {"Scheme_Code": 200, "Scheme_Name": "B", "Net_Asset_Value": 20.0, "Mutual_Fund_Family": "HDFC Mutual Fund", "Scheme_Type": "Open Ended Schemes", "Scheme_Category": "Equity Scheme"},
+        {"Scheme_Code": 400, "Scheme_Name": "D", "Net_Asset_Value": 40.0, "Mutual_Fund_Family": "Axis Mutual Fund", "Scheme_Type": "Open Ended Schemes", "Scheme_Category": "Equity Scheme"}
+    ])
+
+
+def test_unit_nav_index_filters_and_pages():
+    index = make_catalogue_index()
+    index.build_secondary_indexes()
+
+    assert index.filter_codes({"Mutual_Fund_Family": None}) == [100, 200, 300, 400]
+    assert index.filter_codes({"Mutual_Fund_Family": "axis mutual fund"}) == [100, 300, 400]
+    assert index.filter_codes({"Mutual_Fund_Family": "Axis Mutual Fund", "Scheme_Category": "Equity Scheme"}) == [100, 400]
+    assert index.filter_codes({"Mutual_Fund_Family": "Unknown"}) == []
+
+    codes = index.filter_codes({})
+    assert index.page(codes, None, 3) == ([100, 200, 300], 300)
+    assert index.page(codes, 300, 3) == ([400], None)
+
+
+def test_unit_nav_index_builds_secondary_indexes_once():
+    from concurrent.futures import ThreadPoolExecutor
+
+    index = make_catalogue_index()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: index.filter_codes({"Scheme_Category": "equity scheme", "Mutual_Fund_Family": "Axis Mutual Fund"}), range(32)))
+
+    assert all(result == [100, 400] for result in results)
+
+    # a later build keeps the lists callers already hold
+    sorted_codes = index.filter_codes({})
+    index.build_secondary_indexes()
+    assert index.filter_codes({}) is sorted_codes
+
+
+@pytest.mark.asyncio
+async def test_get_fund_catalogue(client, mock_session, monkeypatch):
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "12345"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    index = make_catalogue_index()
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+    monkeypatch.setattr("src.investment.utils.get_cached_nav_index", AsyncMock(return_value=index))
+
+    response = await client.get("/api/v1/investment/catalogue?fund_family=Axis Mutual Fund&fields=Scheme_Name,Net_Asset_Value&limit=2", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["total"] == 3
+    assert response.json()["next_cursor"] == 300
+    assert response.json()["items"] == [
+        {"Scheme_Code": 100, "Scheme_Name": "A", "Net_Asset_Value": 10.0},
+        {"Scheme_Code": 300, "Scheme_Name": "C", "Net_Asset_Value": 30.0}
+    ]
+
+    response = await client.get("/api/v1/investment/catalogue?fund_family=Axis Mutual Fund&cursor=300&limit=2", headers=headers)
+
+    assert response.json()["next_cursor"] is None
+    assert [item["Scheme_Code"] for item in response.json()["items"]] == [400]
+
+    response = await client.get("/api/v1/investment/catalogue?fields=Fund_Manager", headers=headers)
+
+    assert response.status_code == 400
+    assert response.json()["error_code"] == "invalid_catalogue_field"
+
+
+"""
+- [ ] Fund search related tests
+"""
+
+def make_search_payload():
+    return [
+        {"Scheme_Code": 1, "Scheme_Name": "HDFC Flexi Cap Fund - Direct Plan - Growth", "Mutual_Fund_Family": "HDFC Mutual Fund", "Net_Asset_Value": 1800.5, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 2, "Scheme_Name": "HDFC Liquid Fund - Growth", "Mutual_Fund_Family": "HDFC Mutual Fund", "Net_Asset_Value": 4900.1, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 3, "Scheme_Name": "Axis Bluechip Fund - Direct Growth", "Mutual_Fund_Family": "Axis Mutual Fund", "Net_Asset_Value": 58.2, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 4, "Scheme_Name": "Axis Flexi Cap Fund - Regular Growth", "Mutual_Fund_Family": "Axis Mutual Fund", "Net_Asset_Value": 22.7, "Date": "24-Feb-2025"}
+    ]
+
+
+def test_unit_fund_search_ranks_matches():
+    from src.investment.nav_index import NavIndex
+    from src.investment.search import FundSearchIndex
+
+    search_index = FundSearchIndex.from_nav_index(NavIndex.from_payload(make_search_payload()))
+
+    assert search_index.search("hdfc") == [2, 1]
+    assert search_index.search("flexi cap") == [4, 1]
+    assert search_index.search("axis fle") == [4]
+    assert search_index.search("blue", limit=1) == [3]
+    assert search_index.search("ICICI") == []
+    assert search_index.search("  - ") == []
+
+
+def test_unit_fund_search_incremental_refresh():
+    from src.investment.nav_index import NavIndex
+    from src.investment.search import FundSearchIndex
+
+    payload = make_search_payload()
+    search_index = FundSearchIndex.from_nav_index(NavIndex.from_payload(payload))
+    assert search_index.search("liquid") == [2]
+
+    # a nav only refresh changes nothing in the index
+    moved = [{**item, "Net_Asset_Value": item["Net_Asset_Value"] + 1} for item in payload]
+    assert search_index.diff(NavIndex.from_payload(moved)) == {}
+
+    # a rename and a delisting are patched in place
+    renamed = [{**payload[1], "Scheme_Name": "HDFC Overnight Fund - Growth"}, *payload[2:]]
+    changes = search_index.diff(NavIndex.from_payload(renamed))
+    assert changes == {2: ("HDFC Overnight Fund - Growth", "HDFC Mutual Fund"), 1: None}
+
+    search_index.apply(changes)
+
+    assert search_index.search("liquid") == []
+    assert search_index.search("hdfc") == [2]
+    assert search_index.search("over") == [2]
+    assert search_index.search("flexi") == [4]
+    assert len(search_index) == 3
+
+
+@pytest.mark.asyncio
+async def test_unit_fund_search_refreshes_one_version_at_a_time(monkeypatch):
+    from datetime import timezone
+    from src.investment import search
+    from src.investment.nav_index import NavIndex
+
+    monkeypatch.setattr("src.investment.search.current_search_index", None)
+
+    payload = make_search_payload()
+    as_of = datetime(2025, 2, 24, tzinfo=timezone.utc)
+    first = NavIndex.from_payload(payload, as_of=as_of)
+    second = NavIndex.from_payload([{**payload[1], "Scheme_Name": "HDFC Overnight Fund - Growth"}, *payload[2:]], as_of=as_of + timedelta(hours=1))
+    third = NavIndex.from_payload([{**payload[1], "Scheme_Name": "HDFC Money Market Fund - Growth"}, *payload[2:]], as_of=as_of + timedelta(hours=2))
+
+    search_index = await search.refresh_search_index(first)
+
+    # two newer snapshots arrive together, the diffs and patches run one after the other and the newest wins
+    await asyncio.gather(search.refresh_search_index(third), search.refresh_search_index(second))
+
+    assert search.get_current_search_index() is search_index
+    assert search_index.version == third.version
+    assert search_index.search("money") == [2]
+    assert search_index.search("over") == []
+    assert len(search_index) == 3
+
+
+@pytest.mark.asyncio
+async def test_search_funds(client, mock_session, monkeypatch):
+    from src.investment.nav_index import NavIndex
+
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "12345"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    index = NavIndex.from_payload(make_search_payload())
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+    monkeypatch.setattr("src.investment.utils.get_cached_nav_index", AsyncMock(return_value=index))
+    monkeypatch.setattr("src.investment.services.get_cached_nav_index", AsyncMock(return_value=index))
+
+    response = await client.get("/api/v1/investment/search?q=axis blue", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["snapshot_version"] == index.version
+    assert response.json()["results"] == [{
+        "scheme_code": 3,
+        "scheme_name": "Axis Bluechip Fund - Direct Growth",
+        "fund_family": "Axis Mutual Fund",
+        "nav": 58.2,
+        "date": "24-Feb-2025"
+    }]
+
+
+"""
+- [ ] Valuation engine related tests
+"""
+
+@pytest.mark.parametrize("lookup_table", [True, False])
+def test_unit_value_holdings(lookup_table):
+    import math
+    from src.investment.nav_index import NavIndex
+    from src.investment.valuation import NavColumns, value_holdings
+
+    index = NavIndex.from_payload([
+        {"Scheme_Code": 119551, "Net_Asset_Value": 103.523, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 100044, "Net_Asset_Value": 163.69437, "Date": "24-Feb-2025"},
+        {"Scheme_Code": 100050, "Net_Asset_Value": "N.A.", "Date": "24-Feb-2025"}
+    ])
+    columns = NavColumns.from_nav_index(index, lookup_table=lookup_table)
+
+    assert columns.codes.tolist() == [100044, 119551]
+
+    valuation = value_holdings(columns, [119551, 100044, 100050, 999999, 1], [10.0, 2.5, 4.0, 1.0, 1.0])
+
+    assert valuation.found.tolist() == [True, True, False, False, False]
+    assert valuation.values[:2].tolist() == [round(103.523 * 10.0, 4), round(163.69437 * 2.5, 4)]
+    assert valuation.navs[1] == 163.6944
+    assert all(math.isnan(value) for value in valuation.values[2:])
+    assert valuation.total_value == round(1035.23 + 409.2359, 4)
+    assert valuation.missing_scheme_codes() == [1, 100050, 999999]
+
+
+"""
+- [ ] Portfolio summary related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_update_portfolio_summary(mock_session):
+    from src.db.models import PortfolioSummary
+    from src.investment.services import InvestmentService
+
+    service = InvestmentService()
+    summary = PortfolioSummary(
+        user_id="d3f865a9-2e1c-45cb-8130-05462f562e69",
+        total_value=1646.94,
+        holding_count=2,
+        family_exposure={
+            "Aditya Birla Sun Life Mutual Fund": {"value": 1636.94, "holdings": 1},
+            "Axis Mutual Fund": {"value": 10.0, "holdings": 1}
+        }
+    )
+    mock_session.execute = AsyncMock()
+    mock_session.get.return_value = summary
+
+    # a revalued holding moves the total and its family, not the counts
+    await service.update_portfolio_summary(summary.user_id, "Aditya Birla Sun Life Mutual Fund", 100.00005, 0, mock_session)
+    assert summary.total_value == 1746.9401
+    assert summary.holding_count == 2
+    assert summary.family_exposure["Aditya Birla Sun Life Mutual Fund"] == {"value": 1736.9401, "holdings": 1}
+
+    # the last holding of a family drops the family
+    await service.update_portfolio_summary(summary.user_id, "Axis Mutual Fund", -10.0, -1, mock_session)
+    assert summary.holding_count == 1
+    assert "Axis Mutual Fund" not in summary.family_exposure
+
+    # the row is created with an upsert that skips existing rows, then locked, never added from python
+    statement = mock_session.execute.await_args.args[0]
+    assert "ON CONFLICT (user_id) DO NOTHING" in str(statement.compile(dialect=postgresql.dialect()))
+    assert mock_session.get.await_args.kwargs["with_for_update"] is True
+    mock_session.add.assert_not_called()
+
+    # the first investment of a user lands on the empty row the upsert created
+    mock_session.get.return_value = PortfolioSummary(user_id=summary.user_id, total_value=0.0, holding_count=0, family_exposure={})
+    created = await service.update_portfolio_summary(summary.user_id, "Axis Mutual Fund", 25.5, 1, mock_session)
+    assert (created.total_value, created.holding_count) == (25.5, 1)
+    assert created.family_exposure == {"Axis Mutual Fund": {"value": 25.5, "holdings": 1}}
+
+
+@pytest.mark.asyncio
+async def test_get_portfolio_summary(client, mock_session, monkeypatch):
+    from src.db.models import PortfolioSummary
+
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "d3f865a9-2e1c-45cb-8130-05462f562e69"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    summary = PortfolioSummary(
+        user_id="d3f865a9-2e1c-45cb-8130-05462f562e69",
+        total_value=1636.94,
+        holding_count=1,
+        family_exposure={"Aditya Birla Sun Life Mutual Fund": {"value": 1636.94, "holdings": 1}}
+    )
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+    monkeypatch.setattr("src.investment.services.InvestmentService.get_portfolio_summary", AsyncMock(return_value=summary))
+
+    response = await client.get("/api/v1/investment/portfolio/summary", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["total_value"] == 1636.94
+    assert response.json()["holding_count"] == 1
+    assert response.json()["family_exposure"] == {"Aditya Birla Sun Life Mutual Fund": {"value": 1636.94, "holdings": 1}}
+
+    # no investments yet, zero totals rather than a 404
+    monkeypatch.setattr("src.investment.services.InvestmentService.get_portfolio_summary", AsyncMock(return_value=None))
+
+    response = await client.get("/api/v1/investment/portfolio/summary", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"total_value": 0.0, "holding_count": 0, "family_exposure": {}, "updated_at": None}
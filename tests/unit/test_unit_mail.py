@@ -0,0 +1,167 @@
+import pytest
+from src.mail import PooledMailer, MailDeliveryError
+from src.outbox import DELIVERY_KEY_TTL
+from tests.utils.smtp_utils import FakeSMTPServer
+
+
+def make_mailer(port: int, **kwargs) -> PooledMailer:
+    options = {"batch_size": 3, "max_reconnects": 2, "timeout": 5, "username": "", "password": ""}
+    options.update(kwargs)
+    return PooledMailer(hostname="127.0.0.1", port=port, start_tls=False, use_tls=False, sender="Broker <noreply@example.com>",
+                        **options)
+
+
+"""
+- [ ] Pooled mailer related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_mailer_sends_batches_over_one_connection():
+    server = await FakeSMTPServer().start()
+    mailer = make_mailer(server.port)
+
+    try:
+        for number in range(7):
+            mailer.enqueue([f"user{number}@example.com"], "Verify Your email", f"<h1>Hello {number}</h1>")
+
+        batches = await mailer.drain()
+
+        # a later drain reuses the same connection
+        mailer.enqueue(["late@example.com"], "Reset Your Password", "<p>reset</p>")
+        await mailer.drain()
+    finally:
+        await mailer.close()
+        await server.stop()
+
+    assert [batch["size"] for batch in batches] == [3, 3, 1]
+    assert all(batch["emails_per_second"] for batch in batches)
+    assert server.connections == 1
+    assert len(server.messages) == 8
+    assert server.messages[0]["recipients"] == ["user0@example.com"]
+    assert "Subject: Verify Your email" in server.messages[0]["data"]
+    assert mailer.stats()["sent"] == 8
+    assert mailer.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unit_mailer_reconnects_without_resending():
+    server = await FakeSMTPServer(drop_after=2, refuse={"gone@example.com"}).start()
+    mailer = make_mailer(server.port, batch_size=10)
+
+    try:
+        for number in range(4):
+            mailer.enqueue([f"user{number}@example.com"], "Verify Your email", "<p>verify</p>")
+        mailer.enqueue(["gone@example.com"], "Verify Your email", "<p>verify</p>")
+
+        batches = await mailer.drain()
+    finally:
+        await mailer.close()
+        await server.stop()
+
+    # the server hangs up after every second message, each email still arrives exactly once
+    assert [message["recipients"] for message in server.messages] == [[f"user{number}@example.com"] for number in range(4)]
+    assert batches[0]["sent"] == 4
+    assert batches[0]["refused"] == 1
+    assert batches[0]["reconnects"] == 2
+    assert server.connections == 3
+
+
+@pytest.mark.asyncio
+async def test_unit_mailer_hands_back_unsent_emails():
+    server = await FakeSMTPServer().start()
+    port = server.port
+    await server.stop()
+
+    mailer = make_mailer(port, max_reconnects=1)
+    mailer.enqueue(["user@example.com"], "Verify Your email", "<p>verify</p>")
+
+    with pytest.raises(MailDeliveryError) as exc_info:
+        await mailer.drain()
+
+    assert exc_info.value.unsent == [{"recipients": ["user@example.com"], "subject": "Verify Your email", "body": "<p>verify</p>"}]
+    assert mailer.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unit_mailer_does_not_count_failed_login_as_refused():
+    server = await FakeSMTPServer(credentials=("broker", "secret")).start()
+    mailer = make_mailer(server.port, username="broker", password="wrong")
+
+    try:
+        for number in range(3):
+            mailer.enqueue([f"user{number}@example.com"], "Verify Your email", "<p>verify</p>")
+
+        with pytest.raises(MailDeliveryError) as exc_info:
+            await mailer.drain()
+    finally:
+        await mailer.close()
+        await server.stop()
+
+    # a bad password is not retried and nothing is dropped as refused
+    assert [email["recipients"] for email in exc_info.value.unsent] == [[f"user{number}@example.com"] for number in range(3)]
+    assert server.auth_failures == 1
+    assert server.messages == []
+    assert mailer.stats()["refused"] == 0
+    assert mailer.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unit_mailer_logs_in_and_hands_back_temporary_failures():
+    server = await FakeSMTPServer(credentials=("broker", "secret"), defer={"busy@example.com"}).start()
+    mailer = make_mailer(server.port, username="broker", password="secret")
+
+    try:
+        mailer.enqueue(["user@example.com"], "Verify Your email", "<p>verify</p>")
+        mailer.enqueue(["busy@example.com"], "Verify Your email", "<p>verify</p>")
+        mailer.enqueue(["later@example.com"], "Verify Your email", "<p>verify</p>")
+
+        with pytest.raises(MailDeliveryError) as exc_info:
+            await mailer.drain()
+    finally:
+        await mailer.close()
+        await server.stop()
+
+    # a 4xx is retried later with everything after it, not counted as refused
+    assert [message["recipients"] for message in server.messages] == [["user@example.com"]]
+    assert [email["recipients"] for email in exc_info.value.unsent] == [["busy@example.com"], ["later@example.com"]]
+    assert mailer.stats()["refused"] == 0
+
+
+def test_unit_send_emails_task_batches_and_skips_delivered(monkeypatch):
+    from types import SimpleNamespace
+    from src.celery_tasks import send_emails
+    from src.worker import WorkerRuntime
+
+    keys = {"outbox-delivered:sent-before": 1}
+
+    def set_key(name, value, nx=False, ex=None):
+        if nx and name in keys:
+            return None
+        keys[name] = ex
+        return True
+
+    runtime = WorkerRuntime()
+    server = runtime.run(FakeSMTPServer().start())
+    mailer = make_mailer(server.port)
+
+    monkeypatch.setattr("src.celery_tasks.worker_runtime", runtime)
+    monkeypatch.setattr("src.celery_tasks.mailer", mailer)
+    monkeypatch.setattr("src.outbox.delivery_store", SimpleNamespace(set=set_key, delete=lambda name: keys.pop(name, None)))
+
+    emails = [{"recipients": [f"user{number}@example.com"], "subject": "Verify Your email", "body": "<p>verify</p>",
+               "delivery_id": f"outbox-{number}"} for number in range(5)]
+    emails.append({"recipients": ["again@example.com"], "subject": "Verify Your email", "body": "<p>verify</p>",
+                   "delivery_id": "sent-before"})
+
+    try:
+        batches = send_emails.apply(args=(emails,)).get()
+    finally:
+        runtime.run(mailer.close())
+        runtime.run(server.stop())
+        runtime.close()
+
+    # five emails over one connection in mailer batches, the one relayed before is not sent again
+    assert [batch["size"] for batch in batches] == [3, 2]
+    assert server.connections == 1
+    assert [message["recipients"] for message in server.messages] == [[f"user{number}@example.com"] for number in range(5)]
+    assert all(keys[f"outbox-delivered:outbox-{number}"] == DELIVERY_KEY_TTL for number in range(5))
@@ -0,0 +1,198 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock
+from redis.exceptions import ConnectionError as RedisConnectionError
+from src.investment.cache import NavSnapshotCache, dump_nav_index, load_nav_index
+from src.investment.nav_index import NavIndex
+from src.investment.utils import SingleFlight
+from tests.utils.redis_utils import FakeRedis
+
+
+def make_index(nav: float = 163.694) -> NavIndex:
+    return NavIndex.from_payload([
+        {"Scheme_Code": 100044, "Net_Asset_Value": nav, "Date": "24-Feb-2025", "Scheme_Name": "Fund A"},
+        {"Scheme_Code": 119551, "Net_Asset_Value": 103.523, "Date": "24-Feb-2025", "Scheme_Name": "Fund B"}
+    ])
+
+
+"""
+- [ ] Nav snapshot cache related tests
+"""
+
+def test_unit_nav_cache_round_trip():
+    index = make_index()
+
+    entry = load_nav_index(dump_nav_index(index, 1700000000.5))
+
+    assert entry.fetched_at == 1700000000.5
+    assert entry.index.version == index.version
+    assert entry.index.get(100044) == index.get(100044)
+
+
+@pytest.mark.asyncio
+async def test_unit_nav_cache_hits_and_misses():
+    redis = FakeRedis()
+    loader = AsyncMock(return_value=make_index())
+    cache = NavSnapshotCache(redis=redis, ttl=60, stale_ttl=60, max_entries=2)
+
+    first = await cache.get("open-schemes", loader)
+    second = await cache.get("open-schemes", loader)
+
+    assert first is second
+    loader.assert_awaited_once()
+    assert cache.counters["misses"] == 1
+    assert cache.counters["local_hits"] == 1
+
+    # a second worker starts with an empty local tier and is served from redis
+    other = NavSnapshotCache(redis=redis, ttl=60, stale_ttl=60, max_entries=2)
+    shared = await other.get("open-schemes", loader)
+
+    loader.assert_awaited_once()
+    assert other.counters["redis_hits"] == 1
+    assert shared.get(119551) == first.get(119551)
+
+
+@pytest.mark.asyncio
+async def test_unit_nav_cache_serves_stale_while_refreshing():
+    loader = AsyncMock(return_value=make_index(nav=170.0))
+    cache = NavSnapshotCache(ttl=60, stale_ttl=600)
+
+    old = make_index()
+    await cache.put("open-schemes", old, fetched_at=time.time() - 120)
+
+    served = await cache.get("open-schemes", loader)
+
+    assert served is old
+    assert cache.counters["stale_hits"] == 1
+
+    # let the background refresh finish
+    await asyncio.gather(*cache._refreshing.values())
+
+    refreshed = await cache.get("open-schemes", loader)
+
+    loader.assert_awaited_once()
+    assert refreshed.get(100044)["Net_Asset_Value"] == 170.0
+    assert cache.counters["refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unit_nav_cache_checks_fetched_at_before_the_entry():
+    redis = FakeRedis()
+    loader = AsyncMock(side_effect=RuntimeError("upstream down"))
+    cache = NavSnapshotCache(redis=redis, ttl=60, stale_ttl=600, check_interval=30)
+    await cache.put("open-schemes", make_index(), fetched_at=time.time() - 120)
+
+    reads = []
+    get = redis.get
+
+    async def counting_get(name):
+        reads.append(name)
+        return await get(name)
+
+    redis.get = counting_get
+
+    # redis holds nothing newer, only the small fetched_at key is read, and only once per check interval
+    for _ in range(3):
+        await cache.get("open-schemes", loader)
+        await asyncio.gather(*cache._refreshing.values())
+
+    assert cache.counters["stale_hits"] == 3
+    assert reads.count("nav-cache:open-schemes:fetched-at") == 1
+    assert reads.count("nav-cache:open-schemes") == 0
+
+    # another worker refreshed the entry, this one picks it up from redis
+    other = NavSnapshotCache(redis=redis, ttl=60, stale_ttl=600)
+    await other.put("open-schemes", make_index(nav=180.0))
+    cache._checked_at.clear()
+
+    assert (await cache.get("open-schemes", loader)).get(100044)["Net_Asset_Value"] == 180.0
+    assert cache.counters["redis_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unit_nav_cache_survives_redis_outage():
+    redis = FakeRedis()
+    redis.get = AsyncMock(side_effect=RedisConnectionError("down"))
+    redis.set = AsyncMock(side_effect=RedisConnectionError("down"))
+    loader = AsyncMock(return_value=make_index())
+    cache = NavSnapshotCache(redis=redis, ttl=60, stale_ttl=60)
+
+    index = await cache.get("open-schemes", loader)
+
+    assert index.get(100044) is not None
+    assert cache.counters["redis_errors"] == 2
+    assert await cache.get("open-schemes", loader) is index
+
+
+"""
+- [ ] Single flight related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return make_index()
+
+    results = await asyncio.gather(*(flight.do("open-schemes", fetch) for _ in range(20)))
+
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert flight.counters["shared"] == 19
+
+    # the key is released once the call finishes
+    await flight.do("open-schemes", fetch)
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_unit_single_flight_shares_exceptions():
+    flight = SingleFlight()
+    fetch = AsyncMock(side_effect=RuntimeError("upstream down"))
+
+    results = await asyncio.gather(*(flight.do("open-schemes", fetch) for _ in range(5)), return_exceptions=True)
+
+    fetch.assert_awaited_once()
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_unit_single_flight_across_workers():
+    redis = FakeRedis()
+    loader = AsyncMock()
+
+    async def slow_fetch():
+        await asyncio.sleep(0.05)
+        return make_index()
+
+    loader.side_effect = slow_fetch
+
+    reads = []
+    get = redis.get
+
+    async def counting_get(name):
+        reads.append(name)
+        return await get(name)
+
+    redis.get = counting_get
+
+    # two api replicas sharing one redis
+    caches = [
+        NavSnapshotCache(redis=redis, ttl=60, stale_ttl=60, flight=SingleFlight(redis=redis, lock_ttl=5, poll_interval=0.01))
+        for _ in range(2)
+    ]
+
+    first, second = await asyncio.gather(*(cache.get("open-schemes", loader) for cache in caches))
+
+    loader.assert_awaited_once()
+    assert first.version == second.version
+    assert sum(cache.stats()["single_flight"]["remote_results"] for cache in caches) == 1
+    assert await redis.exists("single-flight:open-schemes") == 0
+    # the waiter polls the lock and reads the fetched entry once, not on every poll
+    assert reads.count("nav-cache:open-schemes") == 1
@@ -0,0 +1,171 @@
+import uuid
+import pytest
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from src.db.models import OutboxMessage
+from src.outbox import OutboxRelay, add_outbox_task, is_duplicate_delivery, confirm_delivery, release_delivery, MARK_PUBLISHED, \
+    MARK_FAILED, DELIVERY_CLAIM_TTL, DELIVERY_KEY_TTL
+from src.queues import EMAIL_TRANSACTIONAL_QUEUE
+
+
+# publishes into a list, optionally failing on one task
+class FakeApp:
+
+    def __init__(self, fail_on: str = None):
+        self.fail_on = fail_on
+        self.sent = []
+        self.options = []
+
+    @contextmanager
+    def producer_or_acquire(self):
+        yield "producer"
+
+    def send_task(self, name, args=None, kwargs=None, task_id=None, producer=None, **options):
+        if name == self.fail_on:
+            raise ConnectionError("broker down")
+        self.sent.append((name, args, kwargs, task_id))
+        self.options.append(options)
+
+
+def claimed(*rows):
+    result = MagicMock()
+    result.all.return_value = list(rows)
+    return result
+
+
+"""
+- [ ] Outbox related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_relay_publishes_with_outbox_id(mock_session):
+    first, second = uuid.uuid4(), uuid.uuid4()
+    mock_session.execute = AsyncMock(side_effect=[
+        claimed(
+            (first, "src.celery_tasks.send_email", [["user@example.com"], "Verify Your email", "<p>verify</p>"], {}),
+            (second, "src.celery_tasks.handle_domain_event", ["user.created", {"user_id": "42"}], {})
+        ),
+        MagicMock()
+    ])
+    app = FakeApp()
+
+    assert await OutboxRelay(app=app, batch_size=10).relay_once(mock_session) == 2
+
+    assert [(name, task_id) for name, _, _, task_id in app.sent] == [
+        ("src.celery_tasks.send_email", str(first)),
+        ("src.celery_tasks.handle_domain_event", str(second))
+    ]
+    statement, params = mock_session.execute.await_args_list[1].args
+    assert statement is MARK_PUBLISHED
+    assert params == {"outbox_ids": [first, second]}
+    mock_session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_unit_relay_stops_at_first_failure(mock_session):
+    first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    mock_session.execute = AsyncMock(side_effect=[
+        claimed(
+            (first, "src.celery_tasks.send_email", [], {}),
+            (second, "src.celery_tasks.handle_domain_event", [], {}),
+            (third, "src.celery_tasks.send_email", [], {})
+        ),
+        MagicMock(),
+        MagicMock()
+    ])
+    relay = OutboxRelay(app=FakeApp(fail_on="src.celery_tasks.handle_domain_event"), batch_size=10)
+
+    with pytest.raises(ConnectionError):
+        await relay.relay_once(mock_session)
+
+    # the first went out, the failed one and everything after it stay pending
+    assert mock_session.execute.await_args_list[1].args[1] == {"outbox_ids": [first]}
+    statement, params = mock_session.execute.await_args_list[2].args
+    assert statement is MARK_FAILED
+    assert params["outbox_id"] == second
+    mock_session.commit.assert_awaited_once()
+    assert relay.counters["published"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unit_relay_coalesces_consecutive_emails(mock_session):
+    first, second, third, event = uuid.uuid4(), uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    mock_session.execute = AsyncMock(side_effect=[
+        claimed(
+            (first, "src.celery_tasks.send_email", [["one@example.com"], "Verify Your email", "<p>one</p>"], {}),
+            (second, "src.celery_tasks.send_email", [["two@example.com"], "Verify Your email", "<p>two</p>"], {}),
+            (event, "src.celery_tasks.handle_domain_event", ["user.created", {"user_id": "42"}], {}),
+            (third, "src.celery_tasks.send_email", [["three@example.com"], "Verify Your email", "<p>three</p>"], {})
+        ),
+        MagicMock()
+    ])
+    app = FakeApp()
+
+    assert await OutboxRelay(app=app, batch_size=10).relay_once(mock_session) == 4
+
+    # the signup burst goes out as one task on the transactional queue, each email keeps its outbox id
+    assert [name for name, *_ in app.sent] == [
+        "src.celery_tasks.send_emails", "src.celery_tasks.handle_domain_event", "src.celery_tasks.send_email"
+    ]
+    emails = app.sent[0][1][0]
+    assert [email["recipients"] for email in emails] == [["one@example.com"], ["two@example.com"]]
+    assert [email["delivery_id"] for email in emails] == [str(first), str(second)]
+    assert app.options[0] == {"queue": EMAIL_TRANSACTIONAL_QUEUE, "priority": 0}
+    assert app.sent[2][3] == str(third)
+    assert mock_session.execute.await_args_list[1].args[1] == {"outbox_ids": [first, second, event, third]}
+
+
+@pytest.mark.asyncio
+async def test_unit_create_user_writes_event_in_same_transaction(mock_session):
+    from src.auth.services import UserService
+    from src.auth.schemas import UserCreateSchema
+
+    await UserService().create_user(UserCreateSchema(email="testuser@example.com", password="securepassword"), mock_session)
+
+    added = [call.args[0] for call in mock_session.add.call_args_list]
+    events = [message for message in added if isinstance(message, OutboxMessage)]
+
+    assert len(events) == 1
+    assert events[0].args[0] == "user.created"
+    assert events[0].args[1]["email"] == "testuser@example.com"
+    # the event is added before the only commit
+    mock_session.commit.assert_awaited_once()
+
+
+def test_unit_duplicate_delivery_is_dropped(monkeypatch):
+    keys = {}
+
+    def set_key(name, value, nx=False, ex=None):
+        if nx and name in keys:
+            return None
+        keys[name] = ex
+        return True
+
+    monkeypatch.setattr("src.outbox.delivery_store", SimpleNamespace(set=set_key, delete=lambda name: keys.pop(name, None)))
+
+    task = SimpleNamespace(request=SimpleNamespace(id=str(uuid.uuid4()), retries=0))
+    key = f"outbox-delivered:{task.request.id}"
+
+    # the first delivery only claims the id for a short while, a repeat during the run is dropped
+    assert not is_duplicate_delivery(task)
+    assert keys[key] == DELIVERY_CLAIM_TTL
+    assert is_duplicate_delivery(task)
+
+    # a failed run gives the id back, so a redelivery runs it again
+    release_delivery(task)
+    assert not is_duplicate_delivery(task)
+
+    # a successful run keeps the id long enough to drop later repeats
+    confirm_delivery(task)
+    assert keys[key] == DELIVERY_KEY_TTL
+    assert is_duplicate_delivery(task)
+
+    # a celery retry of the same task is not a repeat
+    task.request.retries = 1
+    assert not is_duplicate_delivery(task)
+
+    session = MagicMock()
+    message = add_outbox_task(session, "src.celery_tasks.send_email", ["user@example.com"], "Subject", "<p>body</p>")
+    session.add.assert_called_once_with(message)
+    assert message.args == [["user@example.com"], "Subject", "<p>body</p>"]
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import pytest
+from contextlib import contextmanager
+from src.errors import PublisherBusy
+from src.publisher import AsyncTaskPublisher
+
+
+class FakeResult:
+
+    def __init__(self, task_id: str):
+        self.id = task_id
+
+
+# records what apply_async was called with, on which thread and over which producer
+class FakeTask:
+
+    name = "src.celery_tasks.send_email"
+
+    def __init__(self, release: threading.Event = None, fail_on: set = None):
+        self.release = release
+        self.fail_on = fail_on or set()
+        self.calls = []
+
+    def apply_async(self, args, kwargs, producer=None):
+        if self.release is not None:
+            self.release.wait(5)
+
+        if args[0] in self.fail_on:
+            raise ConnectionError("broker down")
+
+        self.calls.append((args, producer, threading.get_ident()))
+        return FakeResult(f"task-{len(self.calls)}")
+
+
+class FakeApp:
+
+    def __init__(self):
+        self.producers = 0
+
+    @contextmanager
+    def producer_or_acquire(self):
+        self.producers += 1
+        yield f"producer-{self.producers}"
+
+
+"""
+- [ ] Async task publisher related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_publisher_batches_off_the_event_loop():
+    app = FakeApp()
+    task = FakeTask()
+    publisher = AsyncTaskPublisher(app=app, max_buffer=10, batch_size=10, linger=0.05, enqueue_timeout=0.1)
+
+    futures = [await publisher.publish(task, f"user{number}@example.com", "Verify Your email", "<p>verify</p>") for number in range(5)]
+    task_ids = await asyncio.gather(*futures)
+    await publisher.stop()
+
+    assert task_ids == [f"task-{number}" for number in range(1, 6)]
+    # published in order, as one batch over one producer, on the publisher thread
+    assert [call[0][0] for call in task.calls] == [f"user{number}@example.com" for number in range(5)]
+    assert {call[1] for call in task.calls} == {"producer-1"}
+    assert threading.get_ident() not in {call[2] for call in task.calls}
+    assert publisher.stats()["batches"] == 1
+    assert publisher.stats()["published"] == 5
+
+
+@pytest.mark.asyncio
+async def test_unit_publisher_applies_backpressure():
+    release = threading.Event()
+    task = FakeTask(release=release)
+    publisher = AsyncTaskPublisher(app=FakeApp(), max_buffer=2, batch_size=1, linger=0, enqueue_timeout=0.05)
+
+    # the first task holds the publisher thread, two more fill the buffer
+    await publisher.publish(task, "first@example.com")
+    await asyncio.sleep(0.01)
+    await publisher.publish(task, "second@example.com")
+    await publisher.publish(task, "third@example.com")
+
+    with pytest.raises(PublisherBusy):
+        await publisher.publish(task, "fourth@example.com")
+
+    assert publisher.stats()["buffered"] == 2
+    assert publisher.stats()["rejected_full"] == 1
+
+    # stopping publishes what was buffered
+    release.set()
+    await publisher.stop()
+
+    assert [call[0][0] for call in task.calls] == ["first@example.com", "second@example.com", "third@example.com"]
+
+
+@pytest.mark.asyncio
+async def test_unit_publisher_reports_failed_publishes():
+    task = FakeTask(fail_on={"down@example.com"})
+    publisher = AsyncTaskPublisher(app=FakeApp(), max_buffer=10, batch_size=10, linger=0.02, enqueue_timeout=0.1)
+
+    failing = await publisher.publish(task, "down@example.com")
+    working = await publisher.publish(task, "up@example.com")
+
+    with pytest.raises(ConnectionError):
+        await failing
+    assert await working == "task-1"
+
+    await publisher.stop()
+    assert publisher.stats()["failed"] == 1
+    assert publisher.stats()["published"] == 1
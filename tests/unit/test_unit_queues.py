@@ -0,0 +1,92 @@
+import json
+import time
+import pytest
+from src.celery import c_app, stamp_published_at
+from src.queues import get_queue_stats, prefetch_for_queues, priority_keys, EMAIL_TRANSACTIONAL_QUEUE, EMAIL_BULK_QUEUE, \
+    NAV_QUEUE, EVENTS_QUEUE, DEFAULT_QUEUE
+import src.celery_tasks
+
+
+# answers the pipelined llen and lindex calls from in-memory lists
+class FakeBroker:
+
+    def __init__(self, lists):
+        self.lists = lists
+        self.calls = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    async def __aenter__(self):
+        self.calls = []
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def llen(self, key):
+        self.calls.append(len(self.lists.get(key, [])))
+
+    def lindex(self, key, index):
+        items = self.lists.get(key, [])
+        self.calls.append(items[index] if items else None)
+
+    async def execute(self):
+        return self.calls
+
+
+"""
+- [ ] Celery queue routing related tests
+"""
+
+def test_unit_tasks_are_routed_to_their_queues():
+    router = c_app.amqp.router
+
+    def route(name):
+        options = router.route({}, name)
+        return options["queue"].name, options.get("priority")
+
+    assert route("src.celery_tasks.send_email") == (EMAIL_TRANSACTIONAL_QUEUE, 0)
+    assert route("src.celery_tasks.send_emails") == (EMAIL_BULK_QUEUE, 6)
+    assert route("src.celery_tasks.check_investments")[0] == NAV_QUEUE
+    assert route("src.celery_tasks.revalue_nav_shard")[0] == NAV_QUEUE
+    # domain events relayed from the outbox have a queue and a worker of their own
+    assert route("src.celery_tasks.handle_domain_event") == (EVENTS_QUEUE, 4)
+    assert route("src.celery_tasks.unrouted")[0] == DEFAULT_QUEUE
+
+
+def test_unit_prefetch_follows_worker_queues():
+    assert prefetch_for_queues([NAV_QUEUE]) == 1
+    assert prefetch_for_queues([EMAIL_BULK_QUEUE]) == 8
+    # a worker sharing nav work takes one task at a time
+    assert prefetch_for_queues([EMAIL_TRANSACTIONAL_QUEUE, NAV_QUEUE]) == 1
+    assert prefetch_for_queues([EVENTS_QUEUE, DEFAULT_QUEUE]) == 4
+    assert prefetch_for_queues(["reports"]) is None
+
+    headers = {}
+    stamp_published_at(headers=headers)
+    assert time.time() - headers["published_at"] < 1
+
+
+@pytest.mark.asyncio
+async def test_unit_queue_stats_depth_and_latency():
+    now = time.time()
+
+    def message(age):
+        return json.dumps({"body": "", "headers": {"published_at": now - age}, "properties": {}})
+
+    keys = priority_keys(EMAIL_TRANSACTIONAL_QUEUE)
+    broker = FakeBroker({
+        keys[0]: [message(1), message(4)],
+        keys[6]: [message(12)],
+        priority_keys(NAV_QUEUE)[0]: ["not json"]
+    })
+
+    stats = await get_queue_stats(broker)
+
+    assert stats[EMAIL_TRANSACTIONAL_QUEUE]["depth"] == 3
+    assert stats[EMAIL_TRANSACTIONAL_QUEUE]["depth_by_priority"] == {0: 2, 6: 1}
+    assert 12 <= stats[EMAIL_TRANSACTIONAL_QUEUE]["oldest_wait_seconds"] < 13
+    assert stats[NAV_QUEUE]["depth"] == 1
+    assert stats[NAV_QUEUE]["oldest_wait_seconds"] == 0.0
+    assert stats[EMAIL_BULK_QUEUE]["depth"] == 0
@@ -0,0 +1,332 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import HTTPException
+from unittest.mock import AsyncMock
+from src.errors import ProviderUnavailable
+from src.investment.resilience import CircuitBreaker, ProviderClient, ProviderStatusError, CLOSED, OPEN, HALF_OPEN
+from src.config import config_obj
+from datetime import datetime, timedelta
+import jwt
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_client(clock=None, **kwargs) -> ProviderClient:
+    breaker = CircuitBreaker(failure_threshold=kwargs.pop("failure_threshold", 3), recovery_timeout=30, clock=clock or FakeClock())
+    options = {"max_concurrency": 2, "max_pending": 8, "acquire_timeout": 1, "max_attempts": 3, "backoff_base": 0, "backoff_max": 0}
+    options.update(kwargs)
+    return ProviderClient(breaker=breaker, **options)
+
+
+"""
+- [ ] Nav provider client related tests
+"""
+
+@pytest.mark.asyncio
+async def test_unit_provider_retries_transient_failures():
+    client = make_client()
+    attempt = AsyncMock(side_effect=[httpx.ConnectTimeout("slow"), ProviderStatusError(503, "busy"), "snapshot"])
+
+    assert await client.call(attempt) == "snapshot"
+    assert attempt.await_count == 3
+    assert client.counters["retries"] == 2
+    assert client.breaker.state == CLOSED
+    assert client.breaker.consecutive_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_unit_provider_does_not_retry_refusals():
+    client = make_client()
+    attempt = AsyncMock(side_effect=ProviderStatusError(401, "bad key"))
+
+    with pytest.raises(ProviderStatusError):
+        await client.call(attempt)
+
+    assert attempt.await_count == 1
+    assert client.breaker.consecutive_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_unit_provider_circuit_opens_and_recovers():
+    clock = FakeClock()
+    client = make_client(clock=clock, failure_threshold=3)
+    failing = AsyncMock(side_effect=httpx.ReadTimeout("slow"))
+
+    with pytest.raises(ProviderUnavailable):
+        await client.call(failing)
+
+    assert failing.await_count == 3
+    assert client.breaker.state == OPEN
+
+    # open, callers fail fast without reaching the provider
+    with pytest.raises(ProviderUnavailable):
+        await client.call(failing)
+
+    assert failing.await_count == 3
+    assert client.counters["rejected_open"] == 1
+
+    # after the cool down a single probe goes out, a failed probe opens the circuit again
+    clock.now = 31
+    with pytest.raises(ProviderUnavailable):
+        await client.call(failing)
+
+    assert failing.await_count == 4
+    assert client.breaker.state == OPEN
+
+    clock.now = 62
+    assert await client.call(AsyncMock(return_value="snapshot")) == "snapshot"
+    assert client.breaker.state == CLOSED
+    assert client.stats()["circuit"]["opened"] == 2
+
+
+def test_unit_circuit_half_open_admits_one_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    # a probe cancelled before it answered frees the slot
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_unit_provider_bounds_concurrency():
+    client = make_client(max_concurrency=2, max_pending=1)
+    release = asyncio.Event()
+    peak = 0
+
+    async def attempt():
+        nonlocal peak
+        peak = max(peak, client.in_flight)
+        await release.wait()
+        return "snapshot"
+
+    calls = [asyncio.ensure_future(client.call(attempt)) for _ in range(4)]
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+    # two in flight, one waiting, the fourth is shed instead of queueing
+    assert (client.in_flight, client.waiting) == (2, 1)
+    with pytest.raises(ProviderUnavailable):
+        await calls[3]
+
+    release.set()
+    assert await asyncio.gather(*calls[:3]) == ["snapshot"] * 3
+    assert peak == 2
+    assert client.counters["rejected_busy"] == 1
+    assert (client.in_flight, client.waiting) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_unit_fetch_nav_snapshot_through_provider(monkeypatch):
+    from src.investment.utils import fetch_nav_snapshot
+
+    responses = [httpx.Response(502, text="bad gateway"), httpx.Response(200, json=[{"Scheme_Code": 100044, "Net_Asset_Value": 163.694}])]
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+
+    monkeypatch.setattr("src.investment.utils.get_http_client", lambda: http_client)
+    monkeypatch.setattr("src.investment.utils.nav_provider", make_client())
+
+    snapshot = await fetch_nav_snapshot()
+    assert snapshot.index.get(100044)["Net_Asset_Value"] == 163.694
+
+    # a refusal keeps its status code
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(403, text="quota")))
+    with pytest.raises(HTTPException) as exc_info:
+        await fetch_nav_snapshot()
+    assert exc_info.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_provider_unavailable_returns_503(client, monkeypatch):
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "12345"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+    monkeypatch.setattr("src.investment.services.get_cached_nav_index", AsyncMock(side_effect=ProviderUnavailable()))
+
+    response = await client.get("/api/v1/investment/search?q=axis", headers=headers)
+
+    assert response.status_code == 503
+    assert response.json()["error_code"] == "provider_unavailable"
+
+    response = await client.get("/api/v1/metrics/nav-provider", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["circuit"]["state"] == CLOSED
+
+
+"""
+- [ ] Provider rate limiter related tests
+"""
+
+# answers the token script with canned results, the script itself runs in redis
+class ScriptedRedis:
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.hashes = {}
+        self.strings = {}
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def hset(self, name, mapping):
+        self.hashes.setdefault(name, {}).update(mapping)
+
+    async def hmget(self, name, *fields):
+        return [self.hashes.get(name, {}).get(field) for field in fields]
+
+    async def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    async def mget(self, *names):
+        return [self.strings.get(name) for name in names]
+
+
+@pytest.mark.asyncio
+async def test_unit_rate_limiter_waits_for_tokens(monkeypatch):
+    from src.investment.quota import ProviderRateLimiter
+
+    sleep = AsyncMock()
+    monkeypatch.setattr("src.investment.quota.asyncio.sleep", sleep)
+
+    limiter = ProviderRateLimiter(redis=ScriptedRedis([[0, 200, 3, 3], [1, 0, 4, 4]]), rate=5, burst=5, daily_quota=10, monthly_quota=100, max_wait=1)
+    await limiter.acquire()
+
+    assert 0.2 <= sleep.await_args.args[0] <= 0.22
+    assert limiter.counters["throttled"] == 1
+    assert limiter.counters["granted"] == 1
+
+    # a wait longer than max_wait sheds the call
+    limiter = ProviderRateLimiter(redis=ScriptedRedis([[0, 5000, 3, 3]]), rate=0.2, burst=1, daily_quota=10, monthly_quota=100, max_wait=1)
+    with pytest.raises(ProviderUnavailable):
+        await limiter.acquire()
+
+
+@pytest.mark.asyncio
+async def test_unit_rate_limiter_quota_and_redis_outage():
+    from redis.exceptions import ConnectionError as RedisConnectionError
+    from src.errors import QuotaExceeded
+    from src.investment.quota import ProviderRateLimiter
+
+    limiter = ProviderRateLimiter(redis=ScriptedRedis([[-1, 0, 10, 40], RedisConnectionError("down")]), rate=5, burst=5, daily_quota=10, monthly_quota=100)
+
+    with pytest.raises(QuotaExceeded):
+        await limiter.acquire()
+
+    # without redis the call goes out uncounted
+    await limiter.acquire()
+    assert limiter.counters["quota_rejections"] == 1
+    assert limiter.counters["redis_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unit_provider_spends_a_token_per_attempt():
+    from src.errors import QuotaExceeded
+
+    limiter = AsyncMock()
+    limiter.acquire.side_effect = [None, None, QuotaExceeded()]
+    client = make_client(limiter=limiter)
+    attempt = AsyncMock(side_effect=[httpx.ConnectTimeout("slow"), "snapshot"])
+
+    assert await client.call(attempt) == "snapshot"
+    assert limiter.acquire.await_count == 2
+
+    # a spent quota is not a provider failure
+    with pytest.raises(QuotaExceeded):
+        await client.call(attempt)
+    assert client.breaker.consecutive_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_nav_provider_quota_report(client, monkeypatch):
+    from src.investment.quota import ProviderRateLimiter
+
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "12345"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    redis = ScriptedRedis([])
+    limiter = ProviderRateLimiter(redis=redis, rate=5, burst=5, daily_quota=1000, monthly_quota=30000)
+    _, day_key, month_key = limiter.keys()
+    redis.strings = {day_key: "12", month_key: "340"}
+    await limiter.record_response(httpx.Headers({"x-ratelimit-requests-remaining": "29650", "x-ratelimit-requests-limit": "30000"}))
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+    monkeypatch.setattr("src.metrics.routes.nav_rate_limiter", limiter)
+
+    response = await client.get("/api/v1/metrics/nav-provider/quota", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["tokens"] == 5
+    assert response.json()["day"] == {"used": 12, "limit": 1000, "remaining": 988}
+    assert response.json()["month"] == {"used": 340, "limit": 30000, "remaining": 29660}
+    assert response.json()["provider_reported"]["remaining"] == "29650"
+
+
+@pytest.mark.asyncio
+async def test_unit_throttled_call_does_not_hold_a_slot():
+    client = make_client(max_concurrency=1)
+    release = asyncio.Event()
+    limiter = AsyncMock()
+    limiter.acquire.side_effect = release.wait
+    client.limiter = limiter
+
+    throttled = asyncio.ensure_future(client.call(AsyncMock(return_value="throttled")))
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+    # the first call waits for a token outside the slot, a call that gets one straight away is not stuck behind it
+    assert (client.in_flight, client.waiting) == (0, 0)
+    limiter.acquire.side_effect = None
+    assert await client.call(AsyncMock(return_value="snapshot")) == "snapshot"
+
+    release.set()
+    assert await throttled == "throttled"
+
+
+def test_unit_rate_limiter_refuses_zero_rate(monkeypatch):
+    from pydantic import ValidationError
+    from src.config import Settings
+    from src.investment.quota import ProviderRateLimiter
+
+    with pytest.raises(ValueError):
+        ProviderRateLimiter(rate=0, burst=5)
+
+    monkeypatch.setenv("NAV_PROVIDER_RATE_PER_SECOND", "0")
+    with pytest.raises(ValidationError):
+        Settings()
@@ -161,6 +161,36 @@ async def test_logout_success(client, monkeypatch):
     assert response.json()["message"] == "Logout successful!!."
 
 
+@pytest.mark.asyncio
+async def test_send_mail_publishes_one_bulk_task(client, monkeypatch):
+    from src.celery_tasks import send_emails
+
+    fake_payload = {
+        "user": {"email": "test@example.com", "user_id": "12345"},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+
+    publish = AsyncMock()
+    monkeypatch.setattr("src.auth.routes.task_publisher.publish", publish)
+
+    response = await client.post("/api/v1/auth/send_mail", headers=headers,
+                                 json={"addresses": ["one@example.com", "two@example.com"]})
+
+    assert response.status_code == 200
+    publish.assert_awaited_once()
+    task, emails = publish.await_args.args
+    assert task is send_emails
+    assert [email["recipients"] for email in emails] == [["one@example.com"], ["two@example.com"]]
+
+
 @pytest.mark.asyncio
 async def test_logout_without_token(client):
     response = await client.post("/api/v1/auth/logout")
@@ -236,6 +266,58 @@ async def test_get_current_user(client, monkeypatch):
     assert response.json()["user_id"] == mock_user_investments.user_id
 
 
+@pytest.mark.asyncio
+async def test_get_current_user_portfolio_summary(client, monkeypatch):
+    from src.db.models import PortfolioSummary
+
+    user_id = "d3f865a9-2e1c-45cb-8130-05462f562e69"
+    user = User(
+        user_id=user_id,
+        email="testuser@example.com",
+        password_hash=bcrypt.hash("securepassword"),
+        is_verified=True,
+        created_at=faker.date_time(),
+        updated_at=faker.date_time()
+    )
+    user.portfolio_summary = PortfolioSummary(
+        user_id=user_id,
+        total_value=1636.94,
+        holding_count=1,
+        family_exposure={"Aditya Birla Sun Life Mutual Fund": {"value": 1636.94, "holdings": 1}},
+        updated_at=faker.date_time()
+    )
+
+    fake_payload = {
+        "user": {"email": "testuser@example.com", "user_id": user_id},
+        "exp": datetime.now() + timedelta(minutes=30),
+        "jti": "fake-uid",
+        "refresh": False
+    }
+
+    fake_token = jwt.encode(fake_payload, config_obj.JWT_SECRET_KEY, algorithm=config_obj.JWT_ALGORITHM)
+
+    headers = {"Authorization": f"Bearer {fake_token}"}
+
+    monkeypatch.setattr("src.auth.dependencies.check_jti_in_blocklist", AsyncMock(return_value=False))
+    monkeypatch.setattr("src.auth.services.UserService.get_user_by_email", AsyncMock(return_value=user))
+
+    response = await client.get("/api/v1/auth/me", headers=headers)
+
+    assert response.status_code == 200
+    assert "password_hash" not in response.json()
+    assert response.json()["portfolio_summary"]["total_value"] == 1636.94
+    assert response.json()["portfolio_summary"]["holding_count"] == 1
+    assert response.json()["portfolio_summary"]["family_exposure"] == {"Aditya Birla Sun Life Mutual Fund": {"value": 1636.94, "holdings": 1}}
+
+    # a user without investments has no summary yet
+    user.portfolio_summary = None
+
+    response = await client.get("/api/v1/auth/me", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["portfolio_summary"] is None
+
+
 @pytest.mark.asyncio
 async def test_get_current_user_no_token(client):
     """Test case when no token is provided Should return 403 Unauthorized."""
@@ -0,0 +1,58 @@
+import time
+
+
+# in-memory stand-in for the few redis commands the caches and locks use
+class FakeRedis:
+
+    def __init__(self):
+        self.store = {}
+        self.expiry = {}
+
+    def _alive(self, name) -> bool:
+        expires_at = self.expiry.get(name)
+
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.store.pop(name, None)
+            self.expiry.pop(name, None)
+
+        return name in self.store
+
+    async def get(self, name):
+        return self.store.get(name) if self._alive(name) else None
+
+    async def set(self, name, value, ex=None, px=None, nx=False):
+        if nx and self._alive(name):
+            return None
+
+        self.store[name] = value
+        self.expiry.pop(name, None)
+
+        if ex is not None:
+            self.expiry[name] = time.monotonic() + ex
+        elif px is not None:
+            self.expiry[name] = time.monotonic() + px / 1000
+
+        return True
+
+    async def exists(self, *names) -> int:
+        return sum(1 for name in names if self._alive(name))
+
+    async def delete(self, *names) -> int:
+        deleted = 0
+
+        for name in names:
+            if self._alive(name):
+                del self.store[name]
+                self.expiry.pop(name, None)
+                deleted += 1
+
+        return deleted
+
+    # only the compare and delete lock release script is supported
+    async def eval(self, script, numkeys, *keys_and_args):
+        name, token = keys_and_args[0], keys_and_args[1]
+
+        if await self.get(name) == token:
+            return await self.delete(name)
+
+        return 0
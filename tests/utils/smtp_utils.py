@@ -0,0 +1,107 @@
+import asyncio
+import base64
+
+
+# minimal smtp server on localhost for the mailer tests, no tls; AUTH PLAIN only when credentials are given
+class FakeSMTPServer:
+
+    def __init__(self, drop_after: int = None, refuse: set = None, defer: set = None, credentials: tuple = None):
+        # close the connection after this many accepted messages, to exercise reconnects
+        self.drop_after = drop_after
+        self.refuse = refuse or set()
+        # messages to these addresses get a temporary 451 after DATA
+        self.defer = defer or set()
+        # (username, password) the server accepts, anything else gets a 535
+        self.credentials = credentials
+        self.auth_failures = 0
+        self.messages = []
+        self.connections = 0
+        self.server = None
+        self.port = None
+
+    async def start(self) -> "FakeSMTPServer":
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        accepted = 0
+        recipients = []
+
+        async def reply(line: str) -> None:
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 localhost fake smtp ready")
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                command = line.decode().strip()
+                verb = command[:4].upper()
+
+                if verb == "EHLO":
+                    await reply("250-localhost")
+                    if self.credentials is not None:
+                        await reply("250-AUTH PLAIN")
+                    await reply("250 8BITMIME")
+                elif verb == "HELO":
+                    await reply("250 localhost")
+                elif verb == "MAIL":
+                    recipients = []
+                    await reply("250 OK")
+                elif verb == "RCPT":
+                    address = command.split(":", 1)[1].strip().strip("<>")
+                    if address in self.refuse:
+                        await reply("550 no such user")
+                    else:
+                        recipients.append(address)
+                        await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 end with <CRLF>.<CRLF>")
+                    data = []
+                    while True:
+                        data_line = await reader.readline()
+                        if data_line in (b".\r\n", b".\n", b""):
+                            break
+                        data.append(data_line)
+
+                    if self.defer.intersection(recipients):
+                        await reply("451 try again later")
+                        continue
+
+                    self.messages.append({"recipients": recipients, "data": b"".join(data).decode()})
+                    accepted += 1
+                    await reply("250 queued")
+
+                    if self.drop_after is not None and accepted >= self.drop_after:
+                        break
+                elif verb == "AUTH" and self.credentials is not None:
+                    parts = command.split()
+                    if len(parts) < 3:
+                        await reply("334 ")
+                        parts.append((await reader.readline()).decode().strip())
+
+                    _, username, password = base64.b64decode(parts[2]).decode().split("\0")
+                    if (username, password) == self.credentials:
+                        await reply("235 authenticated")
+                    else:
+                        self.auth_failures += 1
+                        await reply("535 authentication failed")
+                elif verb in ("RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "QUIT":
+                    await reply("221 bye")
+                    break
+                else:
+                    await reply("502 not implemented")
+        finally:
+            writer.close()